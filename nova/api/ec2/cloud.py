@@ -1054,12 +1054,18 @@ class CloudController(object):
         return {'instancesSet': instances_set}
 
     def _format_instance_bdm(self, context, instance_uuid, root_device_name,
-                             result):
-        """Format InstanceBlockDeviceMappingResponseItemType."""
+                             result, bdms=None):
+        """Format InstanceBlockDeviceMappingResponseItemType.
+
+        The block device mappings of the instance are looked up unless
+        they are passed in as bdms.
+        """
         root_device_type = 'instance-store'
         mapping = []
-        for bdm in db.block_device_mapping_get_all_by_instance(context,
-                                                               instance_uuid):
+        if bdms is None:
+            bdms = db.block_device_mapping_get_all_by_instance(context,
+                                                               instance_uuid)
+        for bdm in bdms:
             volume_id = bdm['volume_id']
             if (volume_id is None or bdm['no_device']):
                 continue
@@ -1132,19 +1138,44 @@ class CloudController(object):
             try:
                 # always filter out deleted instances
                 search_opts['deleted'] = False
+                # NOTE: tags are read by get_all_instance_metadata below,
+                # so skip the metadata join.
                 instances = self.compute_api.get_all(context,
-                                                     search_opts=search_opts,
-                                                     sort_dir='asc')
+                        search_opts=search_opts, sort_dir='asc',
+                        columns_to_join=['info_cache', 'security_groups',
+                                         'system_metadata'])
             except exception.NotFound:
                 instances = []
 
+        if not context.is_admin:
+            instances = [instance for instance in instances
+                         if not pipelib.is_vpn_image(instance['image_ref'])]
+
+        # NOTE: load the ec2 ids, block device mappings and availability
+        # zones of all the instances up front rather than one at a time.
+        instance_uuids = [instance['uuid'] for instance in instances]
+        ec2_int_ids = ec2utils.get_int_ids_from_instance_uuids(
+                context.elevated(), instance_uuids)
+        bdms = dict((instance_uuid, []) for instance_uuid in instance_uuids)
+        for bdm in db.block_device_mapping_get_all_by_instance_uuids(
+                context, instance_uuids):
+            bdms[bdm['instance_uuid']].append(bdm)
+        zones = ec2utils.get_availability_zones_by_host(
+                set(instance['host'] for instance in instances))
+        metadata = dict((instance_uuid, {})
+                        for instance_uuid in instance_uuids)
+        if instance_uuids:
+            # NOTE: the instances were already checked against policy when
+            # they were listed, so their tags are read from the db without
+            # another check, whose target would be this list of filters.
+            for tag in db.instance_metadata_get_all(context,
+                    [{'resource_id': instance_uuids}]):
+                metadata[tag['instance_id']][tag['key']] = tag['value']
+
         for instance in instances:
-            if not context.is_admin:
-                if pipelib.is_vpn_image(instance['image_ref']):
-                    continue
             i = {}
             instance_uuid = instance['uuid']
-            ec2_id = ec2utils.id_to_ec2_inst_id(instance_uuid)
+            ec2_id = ec2utils.id_to_ec2_id(ec2_int_ids[instance_uuid])
             i['instanceId'] = ec2_id
             image_uuid = instance['image_ref']
             i['imageId'] = ec2utils.glance_id_to_ec2_id(context, image_uuid)
@@ -1172,8 +1203,7 @@ class CloudController(object):
             i['dnsName'] = i['publicDnsName'] or i['privateDnsName']
             i['keyName'] = instance['key_name']
             i['tagSet'] = []
-            for k, v in self.compute_api.get_instance_metadata(
-                    context, instance).iteritems():
+            for k, v in metadata[instance_uuid].iteritems():
                 i['tagSet'].append({'key': k, 'value': v})
 
             if context.is_admin:
@@ -1187,10 +1217,9 @@ class CloudController(object):
             i['amiLaunchIndex'] = instance['launch_index']
             self._format_instance_root_device_name(instance, i)
             self._format_instance_bdm(context, instance['uuid'],
-                                      i['rootDeviceName'], i)
-            host = instance['host']
-            zone = ec2utils.get_availability_zone_by_host(host)
-            i['placement'] = {'availabilityZone': zone}
+                                      i['rootDeviceName'], i,
+                                      bdms=bdms[instance['uuid']])
+            i['placement'] = {'availabilityZone': zones[instance['host']]}
             if instance['reservation_id'] not in reservations:
                 r = {}
                 r['reservationId'] = instance['reservation_id']
@@ -20,12 +20,12 @@ import functools
 import re
 
 from nova import availability_zones
+from nova import cache_utils
 from nova import context
 from nova import db
 from nova import exception
 from nova.network import model as network_model
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
 from nova.openstack.common import timeutils
 from nova.openstack.common import uuidutils
 
@@ -40,9 +40,8 @@ def memoize(func):
     def memoizer(context, reqid):
         global _CACHE
         if not _CACHE:
-            _CACHE = memorycache.get_client()
-        key = "%s:%s" % (func.__name__, reqid)
-        key = str(key)
+            _CACHE = cache_utils.get_client()
+        key = _memoize_key(func.__name__, reqid)
         value = _CACHE.get(key)
         if value is None:
             value = func(context, reqid)
@@ -51,6 +50,10 @@ def memoize(func):
     return memoizer
 
 
+def _memoize_key(func_name, reqid):
+    return str("%s:%s" % (func_name, reqid))
+
+
 def reset_cache():
     global _CACHE
     _CACHE = None
@@ -168,6 +171,12 @@ def get_availability_zone_by_host(host, conductor_api=None):
         context.get_admin_context(), host, conductor_api)
 
 
+def get_availability_zones_by_host(hosts):
+    """Return a dict of host to availability zone for the given hosts."""
+    return availability_zones.get_host_availability_zones(
+        context.get_admin_context(), hosts)
+
+
 def id_to_ec2_id(instance_id, template='i-%08x'):
     """Convert an instance ID (int) to an ec2 ID (i-[base 16 number])."""
     return template % int(instance_id)
@@ -278,6 +287,37 @@ def get_int_id_from_instance_uuid(context, instance_uuid):
         return db.ec2_instance_create(context, instance_uuid)['id']
 
 
+def get_int_ids_from_instance_uuids(context, instance_uuids):
+    """Get or create the ec2 int ids of several instances at once.
+
+    Returns a dict of instance uuid to int id, the cache used by
+    get_int_id_from_instance_uuid is consulted and filled in.
+    """
+    global _CACHE
+    if not _CACHE:
+        _CACHE = cache_utils.get_client()
+
+    int_ids = {}
+    missing = []
+    for instance_uuid in set(instance_uuids):
+        key = _memoize_key('get_int_id_from_instance_uuid', instance_uuid)
+        int_id = _CACHE.get(key)
+        if int_id is None:
+            missing.append(instance_uuid)
+        else:
+            int_ids[instance_uuid] = int_id
+
+    found = db.get_ec2_instance_ids_by_uuids(context, missing)
+    for instance_uuid in missing:
+        int_id = found.get(instance_uuid)
+        if int_id is None:
+            int_id = db.ec2_instance_create(context, instance_uuid)['id']
+        key = _memoize_key('get_int_id_from_instance_uuid', instance_uuid)
+        _CACHE.set(key, int_id, time=_CACHE_TIME)
+        int_ids[instance_uuid] = int_id
+    return int_ids
+
+
 @memoize
 def get_int_id_from_volume_uuid(context, volume_uuid):
     if volume_uuid is None:
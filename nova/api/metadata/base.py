@@ -19,6 +19,7 @@
 """Instance Metadata information."""
 
 import base64
+import copy
 import json
 import os
 import posixpath
@@ -138,6 +139,10 @@ class InstanceMetadata():
         self.content = {}
         self.files = []
 
+        # rendered metadata trees, keyed by version
+        self._ec2_metadata = {}
+        self._openstack_metadata = {}
+
         # get network info, and the rendered network template
         network_info = network.API().get_instance_nw_info(ctxt, instance,
                                                           conductor_api=capi)
@@ -168,6 +173,11 @@ class InstanceMetadata():
         if version not in VERSIONS:
             raise InvalidMetadataVersion(version)
 
+        if version not in self._ec2_metadata:
+            self._ec2_metadata[version] = self._render_ec2_metadata(version)
+        return self._ec2_metadata[version]
+
+    def _render_ec2_metadata(self, version):
         hostname = self._get_hostname()
 
         floating_ips = self.ip_info['floating_ips']
@@ -279,6 +289,24 @@ class InstanceMetadata():
             raise KeyError(path)
 
         # right now, the only valid path is metadata.json
+        metadata = self._get_openstack_metadata(version)
+
+        # the random seed has to differ between requests, so it is never
+        # part of the rendered tree.
+        if self._check_os_version(GRIZZLY, version):
+            metadata = dict(metadata,
+                            random_seed=base64.b64encode(os.urandom(512)))
+
+        data = {
+            MD_JSON_NAME: json.dumps(metadata),
+        }
+
+        return data[path]
+
+    def _get_openstack_metadata(self, version):
+        if version in self._openstack_metadata:
+            return self._openstack_metadata[version]
+
         metadata = {}
         metadata['uuid'] = self.uuid
 
@@ -308,14 +336,8 @@ class InstanceMetadata():
         metadata['launch_index'] = self.instance['launch_index']
         metadata['availability_zone'] = self.availability_zone
 
-        if self._check_os_version(GRIZZLY, version):
-            metadata['random_seed'] = base64.b64encode(os.urandom(512))
-
-        data = {
-            MD_JSON_NAME: json.dumps(metadata),
-        }
-
-        return data[path]
+        self._openstack_metadata[version] = metadata
+        return metadata
 
     def _check_version(self, required, requested, versions=VERSIONS):
         return versions.index(requested) >= versions.index(required)
@@ -367,6 +389,17 @@ class InstanceMetadata():
 
         return data
 
+    def prerender(self):
+        """Renders the ec2 and openstack trees of every version.
+
+        Lookups after this only walk the rendered trees, which matters
+        when the object is cached and shared by many requests.
+        """
+        for version in VERSIONS:
+            self.get_ec2_metadata(version)
+        for version in OPENSTACK_VERSIONS:
+            self._get_openstack_metadata(version)
+
     def metadata_for_config_drive(self):
         """Yields (path, value) tuples for metadata elements."""
         # EC2 style metadata
@@ -374,7 +407,7 @@ class InstanceMetadata():
             if version in CONF.config_drive_skip_versions.split(' '):
                 continue
 
-            data = self.get_ec2_metadata(version)
+            data = copy.deepcopy(self.get_ec2_metadata(version))
             if 'user-data' in data:
                 filepath = os.path.join('ec2', version, 'user-data')
                 yield (filepath, data['user-data'])
@@ -26,14 +26,12 @@ import webob.dec
 import webob.exc
 
 from nova.api.metadata import base
+from nova import cache_utils
 from nova import conductor
 from nova import exception
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
 from nova import wsgi
 
-CACHE_EXPIRATION = 15  # in seconds
-
 CONF = cfg.CONF
 CONF.import_opt('use_forwarded_for', 'nova.api.auth')
 
@@ -49,7 +47,15 @@ metadata_proxy_opts = [
          help='Shared secret to validate proxies Quantum metadata requests')
 ]
 
+metadata_cache_opts = [
+    cfg.IntOpt('metadata_cache_expiration',
+               default=15,
+               help='Time in seconds to cache rendered instance metadata, '
+                    '0 disables the cache.'),
+]
+
 CONF.register_opts(metadata_proxy_opts)
+CONF.register_opts(metadata_cache_opts)
 
 LOG = logging.getLogger(__name__)
 
@@ -58,30 +64,62 @@ class MetadataRequestHandler(wsgi.Application):
     """Serve metadata."""
 
     def __init__(self):
-        self._cache = memorycache.get_client()
+        self._cache = cache_utils.get_metadata_client()
         self.conductor_api = conductor.API()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _get_cached_metadata(self, instance_uuid, address):
+        if CONF.metadata_cache_expiration <= 0:
+            return None
+
+        cache_key = cache_utils.metadata_instance_key(instance_uuid)
+        entries = self._cache.get(cache_key)
+        data = entries and entries.get(address)
+        if data:
+            self.cache_hits += 1
+        return data
+
+    def _cache_metadata(self, data, address):
+        self.cache_misses += 1
+        if CONF.metadata_cache_expiration <= 0:
+            return
+
+        data.prerender()
+        cache_key = cache_utils.metadata_instance_key(data.uuid)
+        entries = self._cache.get(cache_key) or {}
+        entries[address] = data
+        self._cache.set(cache_key, entries, CONF.metadata_cache_expiration)
+
+    def get_cache_stats(self):
+        """Returns the metadata cache hit and miss counters."""
+        return {'hits': self.cache_hits, 'misses': self.cache_misses}
 
     def get_metadata_by_remote_address(self, address):
         if not address:
             raise exception.FixedIpNotFoundForAddress(address=address)
 
-        cache_key = 'metadata-%s' % address
-        data = self._cache.get(cache_key)
-        if data:
-            return data
+        cache_key = cache_utils.metadata_address_key(address)
+        instance_uuid = self._cache.get(cache_key)
+        if instance_uuid:
+            data = self._get_cached_metadata(instance_uuid, address)
+            if data:
+                return data
 
         try:
             data = base.get_metadata_by_address(self.conductor_api, address)
         except exception.NotFound:
             return None
 
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
+        self._cache_metadata(data, address)
+        if CONF.metadata_cache_expiration > 0:
+            self._cache.set(cache_key, data.uuid,
+                            CONF.metadata_cache_expiration)
 
         return data
 
     def get_metadata_by_instance_id(self, instance_id, address):
-        cache_key = 'metadata-%s' % instance_id
-        data = self._cache.get(cache_key)
+        data = self._get_cached_metadata(instance_id, address)
         if data:
             return data
 
@@ -91,7 +129,7 @@ class MetadataRequestHandler(wsgi.Application):
         except exception.NotFound:
             return None
 
-        self._cache.set(cache_key, data, CACHE_EXPIRATION)
+        self._cache_metadata(data, address)
 
         return data
 
@@ -21,7 +21,7 @@ from nova.api.openstack import extensions
 from nova.api.openstack import wsgi
 from nova.api.openstack import xmlutil
 from nova import availability_zones
-from nova.openstack.common import memorycache
+from nova import cache_utils
 
 # NOTE(vish): azs don't change that often, so cache them for an hour to
 #             avoid hitting the db multiple times on every request.
@@ -32,7 +32,7 @@ authorize = extensions.soft_extension_authorizer('compute',
 
 class ExtendedAZController(wsgi.Controller):
     def __init__(self):
-        self.mc = memorycache.get_client()
+        self.mc = cache_utils.get_client()
 
     def _get_host_az(self, context, instance):
         host = str(instance.get('host'))
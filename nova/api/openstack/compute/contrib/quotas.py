@@ -116,6 +116,7 @@ class QuotaSetsController(object):
                 db.quota_create(context, project_id, key, value)
             except exception.AdminRequired:
                 raise webob.exc.HTTPForbidden()
+        QUOTAS.invalidate_limits(project_id=project_id)
         return {'quota_set': self._get_quotas(context, id)}
 
     @wsgi.serializers(xml=QuotaTemplate)
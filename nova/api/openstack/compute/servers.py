@@ -544,12 +544,19 @@ class Controller(wsgi.Controller):
             else:
                 search_opts['user_id'] = context.user_id
 
+        # NOTE: the basic view only renders the uuid and name, so don't
+        # load the other columns, joins and metadata of every instance.
+        if is_detail:
+            columns_to_join = columns = None
+        else:
+            columns_to_join = []
+            columns = ['uuid', 'display_name']
+
         limit, marker = common.get_limit_and_marker(req)
         try:
             instance_list = self.compute_api.get_all(context,
-                                                     search_opts=search_opts,
-                                                     limit=limit,
-                                                     marker=marker)
+                    search_opts=search_opts, limit=limit, marker=marker,
+                    columns_to_join=columns_to_join, columns=columns)
         except exception.MarkerNotFound as e:
             msg = _('marker [%s] not found') % marker
             raise exc.HTTPBadRequest(explanation=msg)
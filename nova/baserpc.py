@@ -33,6 +33,7 @@ class BaseAPI(rpc_proxy.RpcProxy):
 
         1.0 - Initial version.
         1.1 - Add get_backdoor_port
+        1.2 - Add get_periodic_task_stats
     """
 
     #
@@ -61,16 +62,25 @@ class BaseAPI(rpc_proxy.RpcProxy):
                          topic=rpc.queue_get_for(context, self.topic, host),
                          version='1.1')
 
+    def get_periodic_task_stats(self, context, host):
+        msg = self.make_namespaced_msg('get_periodic_task_stats',
+                                       self.namespace)
+        return self.call(context, msg,
+                         topic=rpc.queue_get_for(context, self.topic, host),
+                         version='1.2')
+
 
 class BaseRPCAPI(object):
     """Server side of the base RPC API."""
 
     RPC_API_NAMESPACE = _NAMESPACE
-    RPC_API_VERSION = '1.1'
+    RPC_API_VERSION = '1.2'
 
-    def __init__(self, service_name, backdoor_port):
+    def __init__(self, service_name, backdoor_port,
+                 get_periodic_task_stats=None):
         self.service_name = service_name
         self.backdoor_port = backdoor_port
+        self._get_periodic_task_stats = get_periodic_task_stats
 
     def ping(self, context, arg):
         resp = {'service': self.service_name, 'arg': arg}
@@ -78,3 +88,8 @@ class BaseRPCAPI(object):
 
     def get_backdoor_port(self, context):
         return self.backdoor_port
+
+    def get_periodic_task_stats(self, context):
+        if self._get_periodic_task_stats is None:
+            return {}
+        return jsonutils.to_primitive(self._get_periodic_task_stats())
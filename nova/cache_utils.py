@@ -0,0 +1,237 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Memcache client helpers.
+
+get_client() returns a memcache.Client when memcached_servers is set and
+the in process Client below otherwise.  Unlike the fake client in
+nova.openstack.common.memorycache it does not walk every key on each get:
+keys are kept in least recently used order and expiry times in a heap.
+
+The metadata API caches rendered instance metadata in a client shared
+through get_metadata_client(), one entry per instance uuid mapping each
+address the instance was looked up from to its InstanceMetadata, and a
+pointer from every address to the uuid.  Code that changes what the
+metadata service serves calls invalidate_metadata() so the next request
+renders it again.  The in process cache is only shared by the services
+of a single process, so use memcached_servers when the metadata API runs
+on its own; otherwise entries only go away when metadata_cache_expiration
+runs out.
+"""
+
+import heapq
+
+from oslo.config import cfg
+
+from nova.openstack.common import timeutils
+
+cache_opts = [
+    cfg.IntOpt('memorycache_max_entries',
+               default=0,
+               help='Maximum number of keys kept by the in process cache, '
+                    'the least recently used keys are evicted first. '
+                    '0 means unlimited.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(cache_opts)
+CONF.import_opt('memcached_servers', 'nova.openstack.common.memorycache')
+
+# Indexes into the [prev, next, key, timeout, value] linked list nodes.
+_PREV, _NEXT, _KEY, _TIMEOUT, _VALUE = range(5)
+
+# Instance fields the metadata service serves, updates touching none of
+# them leave the cached metadata alone.
+METADATA_FIELDS = frozenset(['host', 'metadata', 'system_metadata',
+                             'root_device_name', 'default_ephemeral_device',
+                             'default_swap_device', 'display_name',
+                             'hostname', 'key_name', 'key_data',
+                             'user_data', 'security_groups', 'image_ref',
+                             'kernel_id', 'ramdisk_id', 'launch_index',
+                             'reservation_id', 'instance_type_id'])
+
+# Block device mapping fields rendered in block-device-mapping.
+BDM_METADATA_FIELDS = frozenset(['device_name', 'virtual_name', 'volume_id',
+                                 'snapshot_id', 'no_device'])
+
+_METADATA_CLIENT = None
+
+
+def get_client(memcached_servers=None):
+    if not memcached_servers:
+        memcached_servers = CONF.memcached_servers
+    if memcached_servers:
+        try:
+            import memcache
+            return memcache.Client(memcached_servers, debug=0)
+        except ImportError:
+            pass
+    return Client()
+
+
+def get_metadata_client():
+    global _METADATA_CLIENT
+    if _METADATA_CLIENT is None:
+        _METADATA_CLIENT = get_client()
+    return _METADATA_CLIENT
+
+
+def reset_metadata_client():
+    """Drops the shared metadata client, used by tests."""
+    global _METADATA_CLIENT
+    _METADATA_CLIENT = None
+
+
+def metadata_instance_key(instance_uuid):
+    return 'metadata-%s' % instance_uuid
+
+
+def metadata_address_key(address):
+    return 'metadata-address-%s' % address
+
+
+def invalidate_metadata(instance_uuid, updates=None,
+                        fields=METADATA_FIELDS):
+    """Drops the cached metadata of an instance.
+
+    When the updated fields are passed in, the entry is only dropped if
+    one of them is among fields, the ones served by the metadata service.
+    """
+    if updates is not None and not fields.intersection(updates):
+        return
+    get_metadata_client().delete(metadata_instance_key(instance_uuid))
+
+
+class Client(object):
+    """Replicates a tiny subset of memcached client interface.
+
+    Entries live in a circular doubly linked list, most recently used
+    last, so lookups, moves and evictions are O(1) without relying on
+    collections.OrderedDict, which python 2.6 lacks.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Ignores the passed in args."""
+        self.cache = {}
+        self._root = root = []
+        root[:] = [root, root, None, 0, None]
+        self.max_entries = CONF.memorycache_max_entries
+        # (timeout, key) pairs, entries whose key has since been deleted
+        # or set again are skipped when they reach the top.
+        self._expiry = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _unlink(self, node):
+        node[_PREV][_NEXT] = node[_NEXT]
+        node[_NEXT][_PREV] = node[_PREV]
+
+    def _append(self, node):
+        root = self._root
+        last = root[_PREV]
+        node[_PREV] = last
+        node[_NEXT] = root
+        last[_NEXT] = root[_PREV] = node
+
+    def _remove(self, key):
+        node = self.cache.pop(key)
+        self._unlink(node)
+        return node
+
+    def _expire(self, now=None):
+        if now is None:
+            now = timeutils.utcnow_ts()
+        while self._expiry and now >= self._expiry[0][0]:
+            timeout, key = heapq.heappop(self._expiry)
+            node = self.cache.get(key)
+            if node is not None and node[_TIMEOUT] == timeout:
+                self._remove(key)
+                self.expirations += 1
+
+    def _compact_expiry(self):
+        """Drop the stale entries once they outnumber the live keys."""
+        if len(self._expiry) > 2 * len(self.cache) + 64:
+            self._expiry = [(node[_TIMEOUT], key)
+                            for key, node in self.cache.iteritems()
+                            if node[_TIMEOUT]]
+            heapq.heapify(self._expiry)
+
+    def get(self, key):
+        """Retrieves the value for a key or None.
+
+        this expunges expired keys during each get"""
+
+        self._expire()
+        node = self.cache.get(key)
+        if node is None:
+            self.misses += 1
+            return None
+        self._unlink(node)
+        self._append(node)
+        self.hits += 1
+        return node[_VALUE]
+
+    def set(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key."""
+        timeout = 0
+        if time != 0:
+            now = timeutils.utcnow_ts()
+            self._expire(now)
+            timeout = now + time
+            heapq.heappush(self._expiry, (timeout, key))
+        if key in self.cache:
+            self._remove(key)
+        node = [None, None, key, timeout, value]
+        self._append(node)
+        self.cache[key] = node
+        while self.max_entries and len(self.cache) > self.max_entries:
+            self._remove(self._root[_NEXT][_KEY])
+            self.evictions += 1
+        self._compact_expiry()
+        return True
+
+    def add(self, key, value, time=0, min_compress_len=0):
+        """Sets the value for a key if it doesn't exist."""
+        self._expire()
+        if key in self.cache:
+            return False
+        return self.set(key, value, time, min_compress_len)
+
+    def incr(self, key, delta=1):
+        """Increments the value for a key."""
+        value = self.get(key)
+        if value is None:
+            return None
+        new_value = int(value) + delta
+        self.cache[key][_VALUE] = str(new_value)
+        return new_value
+
+    def delete(self, key, time=0):
+        """Deletes the value associated with a key."""
+        if key in self.cache:
+            self._remove(key)
+
+    def get_stats(self):
+        """Returns the counters in the same shape as memcache.Client."""
+        self._expire()
+        return [('memorycache', {'curr_items': len(self.cache),
+                                 'get_hits': self.hits,
+                                 'get_misses': self.misses,
+                                 'evictions': self.evictions,
+                                 'expirations': self.expirations})]
@@ -0,0 +1,38 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Capacity filter.  Skip the cells which reported that the requested
+instances do not fit in them.
+"""
+
+from nova.cells import filters
+
+
+class CapacityFilter(filters.BaseCellFilter):
+    """Filter out the cells whose capacities say they can't build all of
+    the requested instances.  Cells which did not report capacities for
+    the instance type pass.
+    """
+
+    def cell_passes(self, cell, filter_properties):
+        request_spec = filter_properties['request_spec']
+        instance_type = request_spec.get('instance_type')
+        if not instance_type:
+            return True
+        free_units = cell.get_free_units(instance_type)
+        if free_units is None:
+            return True
+        return free_units >= len(request_spec['instance_uuids'])
@@ -22,8 +22,11 @@ reached.
 
 The interface into this module is the MessageRunner class.
 """
+import base64
 import sys
+import zlib
 
+from eventlet import greenthread
 from eventlet import queue
 from oslo.config import cfg
 
@@ -52,7 +55,22 @@ cell_messaging_opts = [
             help='Maximum number of hops for cells routing.'),
     cfg.StrOpt('scheduler',
             default='nova.cells.scheduler.CellsScheduler',
-            help='Cells scheduler to use')]
+            help='Cells scheduler to use'),
+    cfg.FloatOpt('message_batch_window',
+            default=0.0,
+            help='Number of seconds during which instance, fault and '
+                 'bandwidth updates for the top level cell are gathered '
+                 'and sent up as one message.  0 sends each update on its '
+                 'own.  Parent cells have to be upgraded before batching '
+                 'is enabled in their children.'),
+    cfg.IntOpt('message_batch_max_size',
+            default=100,
+            help='Number of updates after which a batch is sent without '
+                 'waiting for the end of message_batch_window'),
+    cfg.IntOpt('message_compress_threshold',
+            default=4096,
+            help='Size in bytes above which the updates of a batch are '
+                 'compressed.  0 disables compression.')]
 
 CONF = cfg.CONF
 CONF.import_opt('name', 'nova.cells.opts', group='cells')
@@ -65,6 +83,12 @@ LOG = logging.getLogger(__name__)
 # path.
 _PATH_CELL_SEP = cells_utils._PATH_CELL_SEP
 
+# Broadcast methods which can be sent up in a batch
+_BATCHED_METHODS = ['instance_update_at_top',
+                    'instance_destroy_at_top',
+                    'instance_fault_create_at_top',
+                    'bw_usage_update_at_top']
+
 
 def _reverse_path(path):
     """Reverse a path.  Used for sending responses upstream."""
@@ -875,6 +899,30 @@ class _BroadcastMessageMethods(_BaseMessageMethods):
             return
         self.db.bw_usage_update(message.ctxt, **bw_update_info)
 
+    def batch_at_top(self, message, updates=None, compressed_updates=None,
+                     **kwargs):
+        """Process a batch of updates sent up by a child cell, if we're a
+        top level cell.  The updates are (method_name, method_kwargs)
+        pairs of the broadcast methods in _BATCHED_METHODS.
+        """
+        if not self._at_the_top():
+            return
+        if compressed_updates is not None:
+            updates = jsonutils.loads(zlib.decompress(
+                    base64.b64decode(compressed_updates)))
+        LOG.debug(_("Got batch of %d updates"), len(updates))
+        for method_name, method_kwargs in updates:
+            if method_name not in _BATCHED_METHODS:
+                LOG.error(_("Ignoring %s which can't be batched"),
+                          method_name)
+                continue
+            try:
+                getattr(self, method_name)(message, **method_kwargs)
+            except Exception:
+                # Don't lose the rest of the batch
+                LOG.exception(_("Error processing %s from a batch"),
+                              method_name)
+
     def _sync_instance(self, ctxt, instance):
         if instance['deleted']:
             self.msg_runner.instance_destroy_at_top(ctxt, instance)
@@ -975,6 +1023,16 @@ class MessageRunner(object):
         self.our_name = CONF.cells.name
         for msg_type, cls in _CELL_MESSAGE_TYPE_TO_METHODS_CLS.iteritems():
             self.methods_by_type[msg_type] = cls(self)
+        # Updates waiting to be sent up in a batch.  An update replaced
+        # by a later one with the same key is set to None.
+        self._batch = []
+        self._batch_keys = {}
+        self._batch_timer = None
+        self.batch_stats = {'messages': 0,
+                            'deduplicated': 0,
+                            'batches': 0,
+                            'bytes': 0,
+                            'bytes_sent': 0}
 
     def _process_message_locally(self, message):
         """Message processing will call this when its determined that
@@ -1028,6 +1086,85 @@ class MessageRunner(object):
                                 response_kwargs, direction, target_cell,
                                 response_uuid, **kwargs)
 
+    def _send_up(self, ctxt, method_name, method_kwargs, key=None):
+        """Broadcast a method to call in the top level cell.
+
+        If message_batch_window is set, the call is queued and sent with
+        the others queued during the window instead, and replaces the
+        call with the same key still in the queue, if any.
+        """
+        if CONF.cells.message_batch_window <= 0:
+            message = _BroadcastMessage(self, ctxt, method_name,
+                                        method_kwargs, 'up',
+                                        run_locally=False)
+            message.process()
+            return
+
+        self.batch_stats['messages'] += 1
+        if key is not None:
+            index = self._batch_keys.get(key)
+            if index is not None:
+                self._batch[index] = None
+                self.batch_stats['deduplicated'] += 1
+            self._batch_keys[key] = len(self._batch)
+        self._batch.append((method_name, method_kwargs))
+
+        if len(self._batch) >= CONF.cells.message_batch_max_size:
+            self._flush_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = greenthread.spawn_after(
+                    CONF.cells.message_batch_window,
+                    self._flush_batch_after_window)
+
+    def _flush_batch_after_window(self):
+        self._batch_timer = None
+        try:
+            self._flush_batch()
+        except Exception:
+            LOG.exception(_("Error sending batch of updates to parent "
+                            "cells"))
+
+    def _flush_batch(self):
+        """Send the queued updates up as a single 'batch_at_top' message,
+        compressed if they are large.
+        """
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        updates = [update for update in self._batch if update is not None]
+        self._batch = []
+        self._batch_keys = {}
+        if not updates:
+            return
+
+        method_kwargs = dict(updates=updates)
+        json_updates = jsonutils.dumps(updates)
+        size = sent = len(json_updates)
+        threshold = CONF.cells.message_compress_threshold
+        if threshold > 0 and size >= threshold:
+            compressed = base64.b64encode(zlib.compress(json_updates))
+            if len(compressed) < size:
+                method_kwargs = dict(compressed_updates=compressed)
+                sent = len(compressed)
+
+        stats = self.batch_stats
+        stats['batches'] += 1
+        stats['bytes'] += size
+        stats['bytes_sent'] += sent
+        LOG.debug(_("Sending batch of %(updates)d updates in %(sent)d "
+                    "bytes, %(saved_messages)d messages and "
+                    "%(saved_bytes)d bytes saved so far"),
+                  {'updates': len(updates), 'sent': sent,
+                   'saved_messages': stats['messages'] - stats['batches'],
+                   'saved_bytes': stats['bytes'] - stats['bytes_sent']})
+
+        # NOTE: The updates may come from several requests, so the batch
+        # is sent on behalf of the cells service.
+        message = _BroadcastMessage(self, context.get_admin_context(),
+                                    'batch_at_top', method_kwargs, 'up',
+                                    run_locally=False)
+        message.process()
+
     def message_from_json(self, json_message):
         """Turns a message in JSON format into an appropriate Message
         instance.  This is called when cells receive a message from
@@ -1117,17 +1254,15 @@ class MessageRunner(object):
 
     def instance_update_at_top(self, ctxt, instance):
         """Update an instance at the top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'instance_update_at_top',
-                                    dict(instance=instance), 'up',
-                                    run_locally=False)
-        message.process()
+        self._send_up(ctxt, 'instance_update_at_top',
+                      dict(instance=instance),
+                      key=('instance', instance['uuid']))
 
     def instance_destroy_at_top(self, ctxt, instance):
         """Destroy an instance at the top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'instance_destroy_at_top',
-                                    dict(instance=instance), 'up',
-                                    run_locally=False)
-        message.process()
+        self._send_up(ctxt, 'instance_destroy_at_top',
+                      dict(instance=instance),
+                      key=('instance', instance['uuid']))
 
     def instance_delete_everywhere(self, ctxt, instance, delete_type):
         """This is used by API cell when it didn't know what cell
@@ -1143,18 +1278,15 @@ class MessageRunner(object):
 
     def instance_fault_create_at_top(self, ctxt, instance_fault):
         """Create an instance fault at the top level cell."""
-        message = _BroadcastMessage(self, ctxt,
-                                    'instance_fault_create_at_top',
-                                    dict(instance_fault=instance_fault),
-                                    'up', run_locally=False)
-        message.process()
+        self._send_up(ctxt, 'instance_fault_create_at_top',
+                      dict(instance_fault=instance_fault))
 
     def bw_usage_update_at_top(self, ctxt, bw_update_info):
         """Update bandwidth usage at top level cell."""
-        message = _BroadcastMessage(self, ctxt, 'bw_usage_update_at_top',
-                                    dict(bw_update_info=bw_update_info),
-                                    'up', run_locally=False)
-        message.process()
+        key = ('bw_usage', bw_update_info['uuid'], bw_update_info['mac'],
+               bw_update_info['start_period'])
+        self._send_up(ctxt, 'bw_usage_update_at_top',
+                      dict(bw_update_info=bw_update_info), key=key)
 
     def sync_instances(self, ctxt, project_id, updated_since, deleted):
         """Force a sync of all instances, potentially by project_id,
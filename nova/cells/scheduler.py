@@ -21,6 +21,8 @@ import time
 
 from oslo.config import cfg
 
+from nova.cells import filters
+from nova.cells import weights
 from nova import compute
 from nova.compute import instance_actions
 from nova.compute import utils as compute_utils
@@ -37,7 +39,17 @@ cell_scheduler_opts = [
         cfg.IntOpt('scheduler_retry_delay',
                 default=2,
                 help='How often to retry in seconds when no cells are '
-                        'available.')
+                        'available.'),
+        cfg.ListOpt('scheduler_filter_classes',
+                default=['nova.cells.filters.all_filters'],
+                help='Filter classes the cells scheduler should use.  '
+                        'An entry of "nova.cells.filters.all_filters" '
+                        'maps to all cells filters included with nova.'),
+        cfg.ListOpt('scheduler_weight_classes',
+                default=['nova.cells.weights.all_weighers'],
+                help='Weigher classes the cells scheduler should use.  '
+                        'An entry of "nova.cells.weights.all_weighers" '
+                        'maps to all cell weighers included with nova.')
 ]
 
 LOG = logging.getLogger(__name__)
@@ -55,6 +67,12 @@ class CellsScheduler(base.Base):
         self.state_manager = msg_runner.state_manager
         self.compute_api = compute.API()
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
+        self.filter_handler = filters.CellFilterHandler()
+        self.filter_classes = self.filter_handler.get_matching_classes(
+                CONF.cells.scheduler_filter_classes)
+        self.weight_handler = weights.CellWeightHandler()
+        self.weight_classes = self.weight_handler.get_matching_classes(
+                CONF.cells.scheduler_weight_classes)
 
     def _create_instances_here(self, ctxt, request_spec):
         instance_values = request_spec['instance_properties']
@@ -99,12 +117,29 @@ class CellsScheduler(base.Base):
             raise exception.NoCellsAvailable()
         cells = list(cells)
 
-        # Random selection for now
+        # Pick randomly among the cells which weigh the same
         random.shuffle(cells)
-        target_cell = cells[0]
+
+        filter_properties = {'request_spec': request_spec,
+                             'context': ctxt,
+                             'scheduler': self,
+                             'routing_path': message.routing_path}
+        cells = self.filter_handler.get_filtered_objects(self.filter_classes,
+                cells, filter_properties)
+        if not cells:
+            raise exception.NoCellsAvailable()
+        weighed_cells = self.weight_handler.get_weighed_objects(
+                self.weight_classes, cells, filter_properties)
+        LOG.debug(_("Weighed cells: %s"), weighed_cells)
+        target_cell = weighed_cells[0].obj
+
+        # Until the cell reports its capacities again, account for what
+        # we send it so that the next requests don't all go there too.
+        target_cell.consume_capacities(request_spec.get('instance_type'),
+                len(request_spec['instance_uuids']))
 
         LOG.debug(_("Scheduling with routing_path=%(routing_path)s"),
-                locals())
+                {'routing_path': message.routing_path})
 
         if target_cell.is_me:
             # Need to create instance DB entries as the host scheduler
@@ -19,6 +19,7 @@ CellState Manager
 import copy
 import datetime
 import functools
+import math
 
 from oslo.config import cfg
 
@@ -33,6 +34,17 @@ cell_state_manager_opts = [
         cfg.IntOpt('db_check_interval',
                 default=60,
                 help='Seconds between getting fresh cell info from db.'),
+        cfg.BoolOpt('incremental_capacity_sync',
+                default=False,
+                help='Keep the capacity of each compute node of this cell '
+                     'cached and only reload the compute nodes that '
+                     'changed since the last update, instead of reloading '
+                     'all of them and every instance type each time'),
+        cfg.IntOpt('full_capacity_sync_interval',
+                default=300,
+                help='Interval in seconds between full reloads of the '
+                     'compute nodes and instance types when '
+                     'incremental_capacity_sync is enabled'),
 ]
 
 
@@ -75,6 +87,52 @@ class CellState(object):
         self.last_seen = timeutils.utcnow()
         self.capacities = capacities
 
+    def _instance_type_sizes(self, instance_type):
+        """Return the keys of the 'ram_free' and 'disk_free' units for an
+        instance type, with the MB it takes of each.
+        """
+        disk_mb = (instance_type['root_gb'] +
+                   instance_type['ephemeral_gb']) * 1024
+        return [('ram_free', instance_type['memory_mb']),
+                ('disk_free', disk_mb)]
+
+    def get_free_units(self, instance_type):
+        """Return the number of instances of an instance type which fit
+        in the cell according to its capacities, or None if it did not
+        report them.
+        """
+        free_units = []
+        for resource, size_mb in self._instance_type_sizes(instance_type):
+            if not size_mb:
+                continue
+            units_by_mb = self.capacities.get(resource, {}).get(
+                    'units_by_mb', {})
+            units = units_by_mb.get(str(size_mb))
+            if units is not None:
+                free_units.append(units)
+        if not free_units:
+            return None
+        return min(free_units)
+
+    def consume_capacities(self, instance_type, num_instances):
+        """Take instances just scheduled to the cell out of its
+        capacities, so that the next requests see them until the cell
+        reports its capacities again.
+        """
+        if not self.capacities or not instance_type:
+            return
+        for resource, size_mb in self._instance_type_sizes(instance_type):
+            capacity = self.capacities.get(resource)
+            used_mb = size_mb * num_instances
+            if not capacity or not used_mb:
+                continue
+            capacity['total_mb'] -= used_mb
+            units_by_mb = capacity['units_by_mb']
+            for size, units in units_by_mb.items():
+                if int(size):
+                    used_units = int(math.ceil(float(used_mb) / int(size)))
+                    units_by_mb[size] = max(0, units - used_units)
+
     def get_cell_info(self):
         """Return subset of cell information for OS API use."""
         db_fields_to_return = ['is_parent', 'weight_scale', 'weight_offset',
@@ -118,6 +176,13 @@ class CellStateManager(base.Base):
         self.parent_cells = {}
         self.child_cells = {}
         self.last_cell_db_check = datetime.datetime.min
+        # Capacities of each compute host and their sum, kept between
+        # updates when incremental_capacity_sync is enabled
+        self._host_capacities = {}
+        self._capacity_totals = None
+        self._instance_types = []
+        self.last_capacity_sync = None
+        self.last_full_capacity_sync = None
         self._cell_db_sync()
         my_cell_capabs = {}
         for cap in CONF.cells.capabilities:
@@ -193,35 +258,68 @@ class CellStateManager(base.Base):
 
         Units are in MB, so 122880 = (10 + 100) * 1024.
 
+        With incremental_capacity_sync enabled, only the compute nodes
+        whose record changed since the last update are reloaded, and
+        their old capacities are swapped for the new ones in the totals.
+        The compute nodes and instance types are all reloaded every
+        full_capacity_sync_interval seconds.
+
         NOTE(comstud): Perhaps we should only report a single number
         available per instance_type.
         """
-
-        reserve_level = CONF.cells.reserve_percent / 100.0
-        compute_hosts = {}
-
-        def _get_compute_hosts():
+        sync_started = timeutils.utcnow()
+        if self._full_capacity_sync_needed():
             compute_nodes = self.db.compute_node_get_all(context)
-            for compute in compute_nodes:
-                service = compute['service']
-                if not service or service['disabled']:
-                    continue
-                host = service['host']
-                compute_hosts[host] = {
-                        'free_ram_mb': compute['free_ram_mb'],
-                        'free_disk_mb': compute['free_disk_gb'] * 1024,
-                        'total_ram_mb': compute['memory_mb'],
-                        'total_disk_mb': compute['local_gb'] * 1024}
-
-        _get_compute_hosts()
-        if not compute_hosts:
+            self._instance_types = self.db.instance_type_get_all(context)
+            self._host_capacities = {}
+            self._capacity_totals = self._host_capacity(None)
+            self.last_full_capacity_sync = sync_started
+        else:
+            compute_nodes = self.db.compute_node_get_all_changed_since(
+                    context, self.last_capacity_sync)
+        self.last_capacity_sync = sync_started
+
+        for compute in compute_nodes:
+            service = compute['service']
+            if not service:
+                continue
+            host = service['host']
+            host_capacity = self._host_capacities.pop(host, None)
+            if host_capacity is not None:
+                self._add_host_capacity(host_capacity, -1)
+            if service['disabled']:
+                continue
+            host_capacity = self._host_capacity(compute)
+            self._host_capacities[host] = host_capacity
+            self._add_host_capacity(host_capacity, 1)
+
+        if not self._host_capacities:
             self.my_cell_state.update_capacities({})
             return
-
+        self.my_cell_state.update_capacities(
+                copy.deepcopy(self._capacity_totals))
+
+    def _full_capacity_sync_needed(self):
+        """Return True if all compute nodes have to be reloaded."""
+        if not CONF.cells.incremental_capacity_sync:
+            return True
+        if self.last_full_capacity_sync is None:
+            return True
+        return timeutils.is_older_than(self.last_full_capacity_sync,
+                                       CONF.cells.full_capacity_sync_interval)
+
+    def _host_capacity(self, compute):
+        """Return the capacities of a compute node, in the format of
+        CellState.capacities.  Without a compute node, the capacities
+        are all 0.
+        """
+        reserve_level = CONF.cells.reserve_percent / 100.0
         ram_mb_free_units = {}
         disk_mb_free_units = {}
-        total_ram_mb_free = 0
-        total_disk_mb_free = 0
+        capacity = {'ram_free': {'total_mb': 0,
+                                 'units_by_mb': ram_mb_free_units},
+                    'disk_free': {'total_mb': 0,
+                                  'units_by_mb': disk_mb_free_units}}
 
         def _free_units(total, free, per_inst):
             if per_inst:
@@ -231,32 +329,36 @@ class CellStateManager(base.Base):
             else:
                 return 0
 
-        def _update_from_values(values, instance_type):
+        if compute is not None:
+            free_ram_mb = compute['free_ram_mb']
+            free_disk_mb = compute['free_disk_gb'] * 1024
+            capacity['ram_free']['total_mb'] = free_ram_mb
+            capacity['disk_free']['total_mb'] = free_disk_mb
+
+        for instance_type in self._instance_types:
             memory_mb = instance_type['memory_mb']
             disk_mb = (instance_type['root_gb'] +
                     instance_type['ephemeral_gb']) * 1024
             ram_mb_free_units.setdefault(str(memory_mb), 0)
             disk_mb_free_units.setdefault(str(disk_mb), 0)
-            ram_free_units = _free_units(compute_values['total_ram_mb'],
-                    compute_values['free_ram_mb'], memory_mb)
-            disk_free_units = _free_units(compute_values['total_disk_mb'],
-                    compute_values['free_disk_mb'], disk_mb)
-            ram_mb_free_units[str(memory_mb)] += ram_free_units
-            disk_mb_free_units[str(disk_mb)] += disk_free_units
-
-        instance_types = self.db.instance_type_get_all(context)
-
-        for compute_values in compute_hosts.values():
-            total_ram_mb_free += compute_values['free_ram_mb']
-            total_disk_mb_free += compute_values['free_disk_mb']
-            for instance_type in instance_types:
-                _update_from_values(compute_values, instance_type)
-
-        capacities = {'ram_free': {'total_mb': total_ram_mb_free,
-                                   'units_by_mb': ram_mb_free_units},
-                      'disk_free': {'total_mb': total_disk_mb_free,
-                                    'units_by_mb': disk_mb_free_units}}
-        self.my_cell_state.update_capacities(capacities)
+            if compute is None:
+                continue
+            ram_mb_free_units[str(memory_mb)] += _free_units(
+                    compute['memory_mb'], free_ram_mb, memory_mb)
+            disk_mb_free_units[str(disk_mb)] += _free_units(
+                    compute['local_gb'] * 1024, free_disk_mb, disk_mb)
+        return capacity
+
+    def _add_host_capacity(self, host_capacity, sign):
+        """Add the capacities of a compute node to the totals of the
+        cell, or take them out of the totals if sign is -1.
+        """
+        for resource, capacity in host_capacity.iteritems():
+            totals = self._capacity_totals[resource]
+            totals['total_mb'] += sign * capacity['total_mb']
+            units_by_mb = totals['units_by_mb']
+            for size, units in capacity['units_by_mb'].iteritems():
+                units_by_mb[size] = units_by_mb.get(size, 0) + sign * units
 
     @lockutils.synchronized('cell-db-sync', 'nova-')
     def _cell_db_sync(self):
@@ -0,0 +1,55 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Weigh cells by the number of instances of the requested instance type
+their free RAM can hold.
+
+The default is to spread instances across cells.  Set the
+'ram_weight_multiplier' option of the cells group to a negative number
+to stack them instead.
+"""
+
+from oslo.config import cfg
+
+from nova.cells import weights
+
+ram_weigher_opts = [
+        cfg.FloatOpt('ram_weight_multiplier',
+                default=10.0,
+                help='Multiplier used for weighing ram.  Negative '
+                     'numbers mean to stack vs spread.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(ram_weigher_opts, group='cells')
+
+
+class RamByInstanceTypeWeigher(weights.BaseCellWeigher):
+    def _weight_multiplier(self):
+        """Override the weight multiplier."""
+        return CONF.cells.ram_weight_multiplier
+
+    def _weigh_object(self, cell, weight_properties):
+        """Use the 'ram_free' capacities of the cell for the requested
+        instance type.  Higher weights win.
+        """
+        request_spec = weight_properties['request_spec']
+        instance_type = request_spec.get('instance_type')
+        if not instance_type:
+            return 0
+        units_by_mb = cell.capacities.get('ram_free', {}).get(
+                'units_by_mb', {})
+        return units_by_mb.get(str(instance_type['memory_mb']), 0)
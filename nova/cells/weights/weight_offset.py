@@ -0,0 +1,45 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Weigh cells by the weight_offset of their record in the cells table.
+Operators can use it to prefer some cells over the others, or to stop
+scheduling to a cell by giving it a very low offset.
+"""
+
+from oslo.config import cfg
+
+from nova.cells import weights
+
+weigher_opts = [
+        cfg.FloatOpt('offset_weight_multiplier',
+                default=1.0,
+                help='Multiplier used to weigh offsets.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(weigher_opts, group='cells')
+
+
+class WeightOffsetWeigher(weights.BaseCellWeigher):
+    def _weight_multiplier(self):
+        """Override the weight multiplier."""
+        return CONF.cells.offset_weight_multiplier
+
+    def _weigh_object(self, cell, weight_properties):
+        """Returns the weight_offset of the cell.  Our own cell has no
+        record in the cells table, so its offset is 0.
+        """
+        return cell.db_info.get('weight_offset') or 0
@@ -32,6 +32,7 @@ from oslo.config import cfg
 
 from nova import availability_zones
 from nova import block_device
+from nova import cache_utils
 from nova.compute import instance_actions
 from nova.compute import instance_types
 from nova.compute import power_state
@@ -205,6 +206,7 @@ class API(base.Base):
         (old_ref, instance_ref) = self.db.instance_update_and_get_original(
                 context, instance_uuid, kwargs)
         notifications.send_update(context, old_ref, instance_ref, 'api')
+        cache_utils.invalidate_metadata(instance_uuid, kwargs)
 
         return instance_ref
 
@@ -1346,7 +1348,8 @@ class API(base.Base):
         return inst
 
     def get_all(self, context, search_opts=None, sort_key='created_at',
-                sort_dir='desc', limit=None, marker=None):
+                sort_dir='desc', limit=None, marker=None,
+                columns_to_join=None, columns=None):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retrieve
@@ -1358,6 +1361,10 @@ class API(base.Base):
         The results will be returned sorted in the order specified by the
         'sort_dir' parameter using the key specified in the 'sort_key'
         parameter.
+
+        Callers that only render some fields can pass the relations to
+        load in 'columns_to_join' and the instance columns to load in
+        'columns'.
         """
 
         #TODO(bcwaldon): determine the best argument for target here
@@ -1422,17 +1429,18 @@ class API(base.Base):
                     except ValueError:
                         return []
 
-        inst_models = self._get_instances_by_filters(context, filters,
-                                                     sort_key, sort_dir,
-                                                     limit=limit,
-                                                     marker=marker)
+        inst_models = self._get_instances_by_filters(
+                context, filters, sort_key, sort_dir, limit=limit,
+                marker=marker, columns_to_join=columns_to_join,
+                columns=columns)
 
         # Convert the models to dictionaries
         instances = []
         for inst_model in inst_models:
             instance = dict(inst_model.iteritems())
             # NOTE(comstud): Doesn't get returned by iteritems
-            instance['name'] = inst_model['name']
+            if columns is None:
+                instance['name'] = inst_model['name']
             instances.append(instance)
 
         return instances
@@ -1440,7 +1448,9 @@ class API(base.Base):
     def _get_instances_by_filters(self, context, filters,
                                   sort_key, sort_dir,
                                   limit=None,
-                                  marker=None):
+                                  marker=None,
+                                  columns_to_join=None,
+                                  columns=None):
         if 'ip6' in filters or 'ip' in filters:
             res = self.network_api.get_instance_uuids_by_ip_filter(context,
                                                                    filters)
@@ -1449,9 +1459,10 @@ class API(base.Base):
             uuids = set([r['instance_uuid'] for r in res])
             filters['uuid'] = uuids
 
-        return self.db.instance_get_all_by_filters(context, filters,
-                                                   sort_key, sort_dir,
-                                                   limit=limit, marker=marker)
+        return self.db.instance_get_all_by_filters(
+                context, filters, sort_key, sort_dir, limit=limit,
+                marker=marker, columns_to_join=columns_to_join,
+                columns=columns)
 
     @wrap_check_policy
     @check_instance_state(vm_state=[vm_states.ACTIVE, vm_states.STOPPED])
@@ -2313,6 +2324,7 @@ class API(base.Base):
             with excutils.save_and_reraise_exception():
                 self.db.block_device_mapping_destroy_by_instance_and_device(
                         context, instance['uuid'], device)
+                cache_utils.invalidate_metadata(instance['uuid'])
 
         return device
 
@@ -2377,6 +2389,7 @@ class API(base.Base):
         self.db.instance_metadata_delete(context, instance['uuid'], key)
         instance['metadata'] = {}
         notifications.send_update(context, instance, instance)
+        cache_utils.invalidate_metadata(instance['uuid'])
         self.compute_rpcapi.change_instance_metadata(context,
                                                      instance=instance,
                                                      diff={key: ['-']})
@@ -2406,6 +2419,7 @@ class API(base.Base):
                                          _metadata, True)
         instance['metadata'] = metadata
         notifications.send_update(context, instance, instance)
+        cache_utils.invalidate_metadata(instance['uuid'])
         diff = utils.diff_dict(orig, _metadata)
         self.compute_rpcapi.change_instance_metadata(context,
                                                      instance=instance,
@@ -2993,6 +3007,7 @@ class SecurityGroupAPI(base.Base, security_group_base.SecurityGroupBase):
         self.db.instance_add_security_group(context.elevated(),
                                             instance_uuid,
                                             security_group['id'])
+        cache_utils.invalidate_metadata(instance_uuid)
         # NOTE(comstud): No instance_uuid argument to this compute manager
         # call
         self.security_group_rpcapi.refresh_security_group_rules(context,
@@ -3019,6 +3034,7 @@ class SecurityGroupAPI(base.Base, security_group_base.SecurityGroupBase):
         self.db.instance_remove_security_group(context.elevated(),
                                                instance_uuid,
                                                security_group['id'])
+        cache_utils.invalidate_metadata(instance_uuid)
         # NOTE(comstud): No instance_uuid argument to this compute manager
         # call
         self.security_group_rpcapi.refresh_security_group_rules(context,
@@ -17,6 +17,7 @@
 
 from nova import availability_zones
 from nova import block_device
+from nova import cache_utils
 from nova.cells import rpcapi as cells_rpcapi
 from nova.cells import utils as cells_utils
 from nova.compute import api as compute_api
@@ -517,6 +518,7 @@ class ComputeCellsAPI(compute_api.API):
             with excutils.save_and_reraise_exception():
                 self.db.block_device_mapping_destroy_by_instance_and_device(
                         context, instance['uuid'], device)
+                cache_utils.invalidate_metadata(instance['uuid'])
         self._cast_to_cells(context, instance, 'attach_volume',
                 volume_id, device)
 
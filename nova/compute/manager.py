@@ -119,6 +119,16 @@ interval_opts = [
                default=60,
                help="Number of seconds between instance info_cache self "
                         "healing updates"),
+    cfg.IntOpt("heal_instance_info_cache_batch_size",
+               default=50,
+               help="Number of instances whose network info is fetched "
+                        "with a single network API call when healing "
+                        "info_caches"),
+    cfg.IntOpt("heal_instance_info_cache_max_per_pass",
+               default=50,
+               help="Maximum number of instances whose info_cache is "
+                        "healed on each healing update, 0 for all the "
+                        "instances of the host"),
     cfg.IntOpt('host_state_interval',
                default=120,
                help='Interval in seconds for querying the host status'),
@@ -340,6 +350,8 @@ class ComputeManager(manager.SchedulerDependentManager):
         self._last_bw_usage_poll = 0
         self._last_vol_usage_poll = 0
         self._last_info_cache_heal = 0
+        self._instance_uuids_to_heal = []
+        self._stale_info_cache_uuids = set()
         self.compute_api = compute.API()
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
         self.conductor_api = conductor.API()
@@ -3397,6 +3409,7 @@ class ComputeManager(manager.SchedulerDependentManager):
 
         # NOTE(vish): this is necessary to update dhcp
         self.network_api.setup_networks_on_host(context, instance, self.host)
+        self._mark_info_cache_stale(instance)
 
     def _rollback_live_migration(self, context, instance,
                                  dest, block_migration, migrate_data=None):
@@ -3419,6 +3432,7 @@ class ComputeManager(manager.SchedulerDependentManager):
 
         # NOTE(tr3buchet): setup networks on source host (really it's re-setup)
         self.network_api.setup_networks_on_host(context, instance, self.host)
+        self._mark_info_cache_stale(instance)
 
         for bdm in self._get_instance_volume_bdms(context, instance):
             volume_id = bdm['volume_id']
@@ -3459,16 +3473,56 @@ class ComputeManager(manager.SchedulerDependentManager):
         self.driver.destroy(instance, self._legacy_nw_info(network_info),
                             block_device_info)
 
+    def _mark_info_cache_stale(self, instance):
+        """Have the next _heal_instance_info_cache run heal the info_cache
+        of an instance whose network setup changed.
+        """
+        self._stale_info_cache_uuids.add(instance['uuid'])
+
+    def _instance_uuids_to_heal_next(self, context):
+        """Return the uuids of the instances to heal in this pass.
+
+        Instances marked stale come first, then the others in turn.
+        """
+        max_per_pass = CONF.heal_instance_info_cache_max_per_pass
+        uuids = []
+        while self._stale_info_cache_uuids and (
+                max_per_pass <= 0 or len(uuids) < max_per_pass):
+            uuids.append(self._stale_info_cache_uuids.pop())
+
+        if not self._instance_uuids_to_heal:
+            # No more in our copy of uuids.  Pull from the DB.
+            db_instances = self.conductor_api.instance_get_all_by_host(
+                    context, self.host, columns_to_join=['info_cache'])
+            for instance in db_instances:
+                info_cache = instance['info_cache'] or {}
+                if info_cache.get('network_info') in (None, '', '[]'):
+                    # NOTE: an empty cache is healed first, it is most
+                    # likely the result of a failed refresh
+                    self._instance_uuids_to_heal.insert(0, instance['uuid'])
+                else:
+                    self._instance_uuids_to_heal.append(instance['uuid'])
+
+        while self._instance_uuids_to_heal and (
+                max_per_pass <= 0 or len(uuids) < max_per_pass):
+            uuid = self._instance_uuids_to_heal.pop(0)
+            if uuid not in uuids:
+                uuids.append(uuid)
+        return uuids
+
     @periodic_task.periodic_task
     def _heal_instance_info_cache(self, context):
         """Called periodically.  On every call, try to update the
-        info_cache's network information for another instance by
-        calling to the network manager.
+        info_cache's network information for more instances by
+        calling to the network API.
 
         This is implemented by keeping a cache of uuids of instances
-        that live on this host.  On each call, we pop one off of a
-        list, pull the DB record, and try the call to the network API.
-        If anything errors, we don't care.  It's possible the instance
+        that live on this host.  On each call, we take up to
+        heal_instance_info_cache_max_per_pass of them, instances whose
+        network setup recently changed first, pull their DB records with
+        a single query and ask the network API for the network info of
+        heal_instance_info_cache_batch_size instances at a time.
+        If anything errors, we don't care.  It's possible an instance
         has been deleted, etc.
         """
         heal_interval = CONF.heal_instance_info_cache_interval
@@ -3479,38 +3533,30 @@ class ComputeManager(manager.SchedulerDependentManager):
             return
         self._last_info_cache_heal = curr_time
 
-        instance_uuids = getattr(self, '_instance_uuids_to_heal', None)
-        instance = None
+        instance_uuids = self._instance_uuids_to_heal_next(context)
+        if not instance_uuids:
+            return
 
-        while not instance or instance['host'] != self.host:
-            if instance_uuids:
-                try:
-                    instance = self.conductor_api.instance_get_by_uuid(context,
-                        instance_uuids.pop(0))
-                except exception.InstanceNotFound:
-                    # Instance is gone.  Try to grab another.
-                    continue
-            else:
-                # No more in our copy of uuids.  Pull from the DB.
-                db_instances = self.conductor_api.instance_get_all_by_host(
-                        context, self.host, columns_to_join=[])
-                if not db_instances:
-                    # None.. just return.
-                    return
-                instance = db_instances.pop(0)
-                instance_uuids = [inst['uuid'] for inst in db_instances]
-                self._instance_uuids_to_heal = instance_uuids
+        # NOTE: filtering on the host skips instances that moved away
+        # since their uuid was queued.
+        instances = self.conductor_api.instance_get_all_by_filters(
+                context, {'uuid': instance_uuids, 'host': self.host,
+                          'deleted': False},
+                columns_to_join=['system_metadata'])
 
-        # We have an instance now and it's ours
-        try:
-            # Call to network API to get instance info.. this will
-            # force an update to the instance's info_cache
-            self._get_instance_nw_info(context, instance)
-            LOG.debug(_('Updated the info_cache for instance'),
-                      instance=instance)
-        except Exception:
-            # We don't care about any failures
-            pass
+        batch_size = max(CONF.heal_instance_info_cache_batch_size, 1)
+        for i in xrange(0, len(instances), batch_size):
+            batch = instances[i:i + batch_size]
+            try:
+                # Call to network API to get instance info.. this will
+                # force an update to the instances' info_caches
+                self.network_api.get_instance_nw_info_batch(context, batch,
+                        conductor_api=self.conductor_api)
+                LOG.debug(_('Updated the info_cache for %d instances'),
+                          len(batch))
+            except Exception:
+                # We don't care about any failures
+                pass
 
     @periodic_task.periodic_task
     def _poll_rebooting_instances(self, context):
@@ -3806,11 +3852,20 @@ class ComputeManager(manager.SchedulerDependentManager):
         number of virtual machines known by the database, we proceed in a lazy
         loop, one database record at a time, checking if the hypervisor has the
         same power state as is in the database.
+
+        If the driver can list the power states of all its instances at once,
+        the states are compared in memory and only the instances whose states
+        differ are synced.
         """
         db_instances = self.conductor_api.instance_get_all_by_host(
             context, self.host, columns_to_join=[])
 
-        num_vm_instances = self.driver.get_num_instances()
+        try:
+            vm_power_states = self.driver.get_power_states()
+            num_vm_instances = len(vm_power_states)
+        except NotImplementedError:
+            vm_power_states = None
+            num_vm_instances = self.driver.get_num_instances()
         num_db_instances = len(db_instances)
 
         if num_vm_instances != num_db_instances:
@@ -3823,17 +3878,42 @@ class ComputeManager(manager.SchedulerDependentManager):
                            "pending task. Skip."), instance=db_instance)
                 continue
             # No pending tasks. Now try to figure out the real vm_power_state.
-            try:
-                vm_instance = self.driver.get_info(db_instance)
-                vm_power_state = vm_instance['state']
-            except exception.InstanceNotFound:
-                vm_power_state = power_state.NOSTATE
+            if vm_power_states is not None:
+                vm_power_state = vm_power_states.get(db_instance['name'],
+                                                     power_state.NOSTATE)
+                if (vm_power_state == db_instance['power_state'] and
+                        self._power_state_matches_vm_state(
+                            db_instance['vm_state'], vm_power_state)):
+                    continue
+            else:
+                try:
+                    vm_instance = self.driver.get_info(db_instance)
+                    vm_power_state = vm_instance['state']
+                except exception.InstanceNotFound:
+                    vm_power_state = power_state.NOSTATE
             # Note(maoy): the above get_info call might take a long time,
             # for example, because of a broken libvirt driver.
             self._sync_instance_power_state(context,
                                             db_instance,
                                             vm_power_state)
 
+    @staticmethod
+    def _power_state_matches_vm_state(vm_state, vm_power_state):
+        """Whether _sync_instance_power_state has nothing to do about the
+        vm_state of an instance with an up to date power_state.
+        """
+        if vm_state == vm_states.ACTIVE:
+            return vm_power_state == power_state.RUNNING
+        elif vm_state == vm_states.STOPPED:
+            return vm_power_state in (power_state.NOSTATE,
+                                      power_state.SHUTDOWN,
+                                      power_state.CRASHED)
+        elif vm_state in (vm_states.SOFT_DELETED,
+                          vm_states.DELETED):
+            return vm_power_state in (power_state.NOSTATE,
+                                      power_state.SHUTDOWN)
+        return True
+
     def _sync_instance_power_state(self, context, db_instance, vm_power_state):
         """Align instance power state between the database and hypervisor.
 
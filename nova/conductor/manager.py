@@ -15,6 +15,7 @@
 """Handles database requests from other nova services."""
 
 from nova.api.ec2 import ec2utils
+from nova import cache_utils
 from nova.compute import api as compute_api
 from nova.compute import utils as compute_utils
 from nova import exception
@@ -97,6 +98,7 @@ class ConductorManager(manager.Manager):
         old_ref, instance_ref = self.db.instance_update_and_get_original(
             context, instance_uuid, updates)
         notifications.send_update(context, old_ref, instance_ref, service)
+        cache_utils.invalidate_metadata(instance_uuid, updates)
         return jsonutils.to_primitive(instance_ref)
 
     @rpc_common.client_exceptions(exception.InstanceNotFound)
@@ -235,10 +237,17 @@ class ConductorManager(manager.Manager):
                                               create=None):
         if create is None:
             self.db.block_device_mapping_update_or_create(context, values)
+            instance_uuid = values.get('instance_uuid')
         elif create is True:
             self.db.block_device_mapping_create(context, values)
+            instance_uuid = values.get('instance_uuid')
         else:
-            self.db.block_device_mapping_update(context, values['id'], values)
+            bdm = self.db.block_device_mapping_update(context, values['id'],
+                                                      values)
+            instance_uuid = bdm and bdm['instance_uuid']
+        if instance_uuid:
+            cache_utils.invalidate_metadata(
+                instance_uuid, values, fields=cache_utils.BDM_METADATA_FIELDS)
 
     def block_device_mapping_get_all_by_instance(self, context, instance):
         bdms = self.db.block_device_mapping_get_all_by_instance(
@@ -251,12 +260,17 @@ class ConductorManager(manager.Manager):
         if bdms is not None:
             for bdm in bdms:
                 self.db.block_device_mapping_destroy(context, bdm['id'])
+            for instance_uuid in set(bdm.get('instance_uuid') for bdm in bdms):
+                if instance_uuid:
+                    cache_utils.invalidate_metadata(instance_uuid)
         elif instance is not None and volume_id is not None:
             self.db.block_device_mapping_destroy_by_instance_and_volume(
                 context, instance['uuid'], volume_id)
+            cache_utils.invalidate_metadata(instance['uuid'])
         elif instance is not None and device_name is not None:
             self.db.block_device_mapping_destroy_by_instance_and_device(
                 context, instance['uuid'], device_name)
+            cache_utils.invalidate_metadata(instance['uuid'])
         else:
             # NOTE(danms): This shouldn't happen
             raise exception.Invalid(_("Invalid block_device_mapping_destroy"
@@ -288,6 +302,7 @@ class ConductorManager(manager.Manager):
 
     def instance_destroy(self, context, instance):
         self.db.instance_destroy(context, instance['uuid'])
+        cache_utils.invalidate_metadata(instance['uuid'])
 
     def instance_info_cache_delete(self, context, instance):
         self.db.instance_info_cache_delete(context, instance['uuid'])
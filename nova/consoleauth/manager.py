@@ -22,13 +22,14 @@ import time
 
 from oslo.config import cfg
 
+from nova import cache_utils
 from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import rpcapi as compute_rpcapi
 from nova.conductor import api as conductor_api
 from nova import manager
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
-from nova.openstack.common import memorycache
+from nova.openstack.common import timeutils
 
 
 LOG = logging.getLogger(__name__)
@@ -37,6 +38,11 @@ consoleauth_opts = [
     cfg.IntOpt('console_token_ttl',
                default=600,
                help='How many seconds before deleting tokens'),
+    cfg.IntOpt('console_tokens_per_instance',
+               default=100,
+               help='Maximum number of console tokens kept for an instance, '
+                    'the oldest tokens are deleted first. 0 means '
+                    'unlimited'),
     cfg.StrOpt('consoleauth_manager',
                default='nova.consoleauth.manager.ConsoleAuthManager',
                help='Manager for console auth'),
@@ -55,17 +61,22 @@ class ConsoleAuthManager(manager.Manager):
     def __init__(self, scheduler_driver=None, *args, **kwargs):
         super(ConsoleAuthManager, self).__init__(service_name='consoleauth',
                                                  *args, **kwargs)
-        self.mc = memorycache.get_client()
+        self.mc = cache_utils.get_client()
         self.conductor_api = conductor_api.API()
         self.compute_rpcapi = compute_rpcapi.ComputeAPI()
         self.cells_rpcapi = cells_rpcapi.CellsAPI()
 
     def _get_tokens_for_instance(self, instance_uuid):
-        tokens_str = self.mc.get(instance_uuid.encode('UTF-8'))
-        if not tokens_str:
-            tokens = []
-        else:
-            tokens = jsonutils.loads(tokens_str)
+        """Returns (token, expires_at) pairs for an instance."""
+        tokens = self.mc.get(instance_uuid.encode('UTF-8'))
+        if not tokens:
+            return []
+        if isinstance(tokens, basestring):
+            # NOTE: lists written before tokens carried their expiry time
+            # were json encoded, assume they live for a full ttl.
+            expires_at = timeutils.utcnow_ts() + CONF.console_token_ttl
+            tokens = [(token, expires_at)
+                      for token in jsonutils.loads(tokens)]
         return tokens
 
     def authorize_console(self, context, token, console_type, host, port,
@@ -78,13 +89,23 @@ class ConsoleAuthManager(manager.Manager):
                       'port': port,
                       'internal_access_path': internal_access_path,
                       'last_activity_at': time.time()}
-        data = jsonutils.dumps(token_dict)
-        self.mc.set(token.encode('UTF-8'), data, CONF.console_token_ttl)
+        self.mc.set(token.encode('UTF-8'), token_dict, CONF.console_token_ttl)
         if instance_uuid is not None:
-            tokens = self._get_tokens_for_instance(instance_uuid)
-            tokens.append(token)
-            self.mc.set(instance_uuid.encode('UTF-8'),
-                        jsonutils.dumps(tokens))
+            now = timeutils.utcnow_ts()
+            tokens = [(tok, expires_at) for (tok, expires_at)
+                      in self._get_tokens_for_instance(instance_uuid)
+                      if expires_at > now]
+            tokens.append((token, now + CONF.console_token_ttl))
+
+            overflow = len(tokens) - CONF.console_tokens_per_instance
+            if CONF.console_tokens_per_instance > 0 and overflow > 0:
+                for (tok, _expires_at) in tokens[:overflow]:
+                    self.mc.delete(tok.encode('UTF-8'))
+                tokens = tokens[overflow:]
+
+            # NOTE: the list expires together with the newest token in it
+            self.mc.set(instance_uuid.encode('UTF-8'), tokens,
+                        CONF.console_token_ttl)
 
         LOG.audit(_("Received Token: %(token)s, %(token_dict)s)"), locals())
 
@@ -108,17 +129,19 @@ class ConsoleAuthManager(manager.Manager):
                                             token['console_type'])
 
     def check_token(self, context, token):
-        token_str = self.mc.get(token.encode('UTF-8'))
-        token_valid = (token_str is not None)
+        token_data = self.mc.get(token.encode('UTF-8'))
+        token_valid = (token_data is not None)
         LOG.audit(_("Checking Token: %(token)s, %(token_valid)s)"), locals())
         if token_valid:
-            token = jsonutils.loads(token_str)
-            if self._validate_token(context, token):
-                return token
+            if isinstance(token_data, basestring):
+                # NOTE: tokens written by older versions are json encoded
+                token_data = jsonutils.loads(token_data)
+            if self._validate_token(context, token_data):
+                return token_data
 
     def delete_tokens_for_instance(self, context, instance_uuid):
         tokens = self._get_tokens_for_instance(instance_uuid)
-        for token in tokens:
+        for (token, _expires_at) in tokens:
             self.mc.delete(token.encode('UTF-8'))
         self.mc.delete(instance_uuid.encode('UTF-8'))
 
@@ -182,6 +182,13 @@ def compute_node_get_all(context):
     return IMPL.compute_node_get_all(context)
 
 
+def compute_node_get_all_changed_since(context, changes_since):
+    """Get all computeNodes whose record or service record has changed
+    since the given time.
+    """
+    return IMPL.compute_node_get_all_changed_since(context, changes_since)
+
+
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     """Get computeNodes given a hypervisor hostname match string."""
     return IMPL.compute_node_search_by_hypervisor(context, hypervisor_match)
@@ -549,6 +556,12 @@ def virtual_interface_get_by_instance(context, instance_id):
     return IMPL.virtual_interface_get_by_instance(context, instance_id)
 
 
+def virtual_interface_get_by_instance_uuids(context, instance_uuids):
+    """Gets all virtual_interfaces for a list of instances."""
+    return IMPL.virtual_interface_get_by_instance_uuids(context,
+                                                        instance_uuids)
+
+
 def virtual_interface_get_by_instance_and_network(context, instance_id,
                                                            network_id):
     """Gets all virtual interfaces for instance."""
@@ -610,12 +623,16 @@ def instance_get_all(context, columns_to_join=None):
 
 def instance_get_all_by_filters(context, filters, sort_key='created_at',
                                 sort_dir='desc', limit=None, marker=None,
-                                columns_to_join=None):
-    """Get all instances that match all filters."""
+                                columns_to_join=None, columns=None):
+    """Get all instances that match all filters.
+
+    If columns is given only those instance columns are loaded.
+    """
     return IMPL.instance_get_all_by_filters(context, filters, sort_key,
                                             sort_dir, limit=limit,
                                             marker=marker,
-                                            columns_to_join=columns_to_join)
+                                            columns_to_join=columns_to_join,
+                                            columns=columns)
 
 
 def instance_get_active_by_window_joined(context, begin, end=None,
@@ -1022,7 +1039,7 @@ def block_device_mapping_create(context, values):
 
 
 def block_device_mapping_update(context, bdm_id, values):
-    """Update an entry of block device mapping."""
+    """Update an entry of block device mapping and return it."""
     return IMPL.block_device_mapping_update(context, bdm_id, values)
 
 
@@ -1038,6 +1055,12 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid):
                                                          instance_uuid)
 
 
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids):
+    """Get all block device mapping belonging to a list of instances."""
+    return IMPL.block_device_mapping_get_all_by_instance_uuids(context,
+                                                               instance_uuids)
+
+
 def block_device_mapping_destroy(context, bdm_id):
     """Destroy the block device mapping."""
     return IMPL.block_device_mapping_destroy(context, bdm_id)
@@ -1522,6 +1545,17 @@ def aggregate_metadata_get_by_host(context, host, key=None):
     return IMPL.aggregate_metadata_get_by_host(context, host, key)
 
 
+def aggregate_host_metadata_get_all(context):
+    """Get aggregate metadata for every host that belongs to an aggregate.
+
+    Loads all aggregate membership and metadata in a single query.
+    Returns a dictionary where each key is a hostname and each value is
+    a dictionary of sets, as returned by aggregate_metadata_get_by_host.
+    return value:  {machine: {key: set( value1, value2 )}}
+    """
+    return IMPL.aggregate_host_metadata_get_all(context)
+
+
 def aggregate_host_get_by_metadata_key(context, key):
     """Get hosts with a specific metadata key metadata for all aggregates.
 
@@ -1647,6 +1681,11 @@ def get_ec2_instance_id_by_uuid(context, instance_id):
     return IMPL.get_ec2_instance_id_by_uuid(context, instance_id)
 
 
+def get_ec2_instance_ids_by_uuids(context, instance_uuids):
+    """Get a dict of instance uuid to ec2 id for the mapped instances."""
+    return IMPL.get_ec2_instance_ids_by_uuids(context, instance_uuids)
+
+
 def get_instance_uuid_by_ec2_id(context, ec2_id):
     """Get uuid through ec2 id from instance_id_mappings table."""
     return IMPL.get_instance_uuid_by_ec2_id(context, ec2_id)
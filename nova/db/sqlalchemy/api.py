@@ -36,6 +36,7 @@ from sqlalchemy.exc import NoSuchTableError
 from sqlalchemy import Integer
 from sqlalchemy import MetaData
 from sqlalchemy import or_
+from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
 from sqlalchemy.orm import noload
@@ -466,6 +467,18 @@ def compute_node_get_all(context):
             all()
 
 
+@require_admin_context
+def compute_node_get_all_changed_since(context, changes_since):
+    return model_query(context, models.ComputeNode).\
+            join('service').\
+            options(contains_eager('service')).\
+            options(joinedload('stats')).\
+            filter(or_(models.ComputeNode.created_at >= changes_since,
+                       models.ComputeNode.updated_at >= changes_since,
+                       models.Service.updated_at >= changes_since)).\
+            all()
+
+
 @require_admin_context
 def compute_node_search_by_hypervisor(context, hypervisor_match):
     field = models.ComputeNode.hypervisor_hostname
@@ -1359,6 +1372,21 @@ def virtual_interface_get_by_instance(context, instance_uuid):
     return vif_refs
 
 
+@require_context
+def virtual_interface_get_by_instance_uuids(context, instance_uuids):
+    """Gets all virtual interfaces for a list of instances, oldest first.
+
+    :param instance_uuids: = uuids of the instances to retrieve vifs for
+    """
+    if not instance_uuids:
+        return []
+    return _virtual_interface_query(context).\
+                filter(models.VirtualInterface.instance_uuid.in_(
+                       instance_uuids)).\
+                order_by(models.VirtualInterface.id).\
+                all()
+
+
 @require_context
 def virtual_interface_get_by_instance_and_network(context, instance_uuid,
                                                   network_id):
@@ -1645,17 +1673,29 @@ def instance_get_all(context, columns_to_join=None):
 @require_context
 def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                                 limit=None, marker=None, columns_to_join=None,
-                                session=None):
+                                session=None, columns=None):
     """Return instances that match all filters.  Deleted instances
     will be returned by default, unless there's a filter that says
-    otherwise"""
+    otherwise
+
+    If columns is given, only those instance columns (and the uuid) are
+    selected.  Only 'metadata' and 'system_metadata' can be joined to
+    such a query, and nothing is joined unless columns_to_join says so.
+    """
 
     sort_fn = {'desc': desc, 'asc': asc}
 
     if not session:
         session = get_session()
 
-    if columns_to_join is None:
+    if columns is not None:
+        manual_joins, columns_to_join = _manual_join_columns(
+                list(columns_to_join or []))
+        if columns_to_join:
+            raise exception.InvalidInput(
+                    reason=_("Cannot join %s to a column query") %
+                    ', '.join(columns_to_join))
+    elif columns_to_join is None:
         columns_to_join = ['info_cache', 'security_groups']
         manual_joins = ['metadata', 'system_metadata']
     else:
@@ -1699,8 +1739,8 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
     # Filters for exact matches that we can do along with the SQL query...
     # For other filters that don't match this, we will do regexp matching
     exact_match_filter_names = ['project_id', 'user_id', 'image_ref',
-                                'vm_state', 'instance_type_id', 'uuid',
-                                'metadata']
+                                'vm_state', 'task_state', 'host', 'node',
+                                'instance_type_id', 'uuid', 'metadata']
 
     # Filter the query
     query_prefix = exact_filter(query_prefix, models.Instance,
@@ -1724,7 +1764,15 @@ def instance_get_all_by_filters(context, filters, sort_key, sort_dir,
                            marker=marker,
                            sort_dir=sort_dir)
 
-    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
+    if columns is not None:
+        columns = set(columns) | set(['uuid'])
+        query_prefix = query_prefix.with_entities(
+                *[getattr(models.Instance, column) for column in columns])
+        instances = [dict(zip(row.keys(), row)) for row in query_prefix]
+    else:
+        instances = query_prefix.all()
+
+    return _instances_fill_metadata(context, instances, manual_joins)
 
 
 def tag_filter(query, model, tag_model, tag_model_col, filters):
@@ -1803,6 +1851,10 @@ def tag_filter(query, model, tag_model, tag_model_col, filters):
     return query
 
 
+# characters with a meaning in regular expressions or LIKE patterns
+_REGEX_SPECIAL_CHARS = frozenset('.^$*+?{}[]\\|()%_')
+
+
 def regex_filter(query, model, filters):
     """Applies regular expression filtering to a query.
 
@@ -1828,11 +1880,33 @@ def regex_filter(query, model, filters):
             continue
         if 'property' == type(column_attr).__name__:
             continue
-        query = query.filter(column_attr.op(db_regexp_op)(
-                                    str(filters[filter_name])))
+        value = str(filters[filter_name])
+        # NOTE: anchored literals like '^web-' or '^web-1$' become LIKE
+        # and equality tests, which unlike REGEXP can use an index.
+        literal = _regex_anchored_literal(value)
+        if literal is None:
+            query = query.filter(column_attr.op(db_regexp_op)(value))
+        elif value.endswith('$'):
+            query = query.filter(column_attr == literal)
+        else:
+            query = query.filter(column_attr.like(literal + '%'))
     return query
 
 
+def _regex_anchored_literal(value):
+    """Return the literal text of a regex that only anchors plain text
+    at the start ('^abc' or '^abc$'), or None for any other regex.
+    """
+    if not value.startswith('^'):
+        return None
+    literal = value[1:]
+    if literal.endswith('$'):
+        literal = literal[:-1]
+    if not literal or any(char in _REGEX_SPECIAL_CHARS for char in literal):
+        return None
+    return literal
+
+
 @require_context
 def instance_get_active_by_window_joined(context, begin, end=None,
                                          project_id=None, host=None):
@@ -2703,6 +2777,12 @@ def reservation_create(context, uuid, usage, project_id, resource, delta,
     return reservation_ref
 
 
+def _reservation_create_all(session, reservations):
+    """Inserts a list of reservation value dicts in a single statement."""
+    if reservations:
+        session.execute(models.Reservation.__table__.insert(), reservations)
+
+
 ###################
 
 
@@ -2735,6 +2815,9 @@ def quota_reserve(context, resources, quotas, deltas, expire,
         # Get the current usages
         usages = _get_quota_usages(context, session, project_id)
 
+        # Resources whose usage row has to be written back
+        changed = set()
+
         # Handle usage refresh
         work = set(deltas.keys())
         while work:
@@ -2756,6 +2839,7 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                 refresh = True
             elif usages[resource].until_refresh is not None:
                 usages[resource].until_refresh -= 1
+                changed.add(resource)
                 if usages[resource].until_refresh <= 0:
                     refresh = True
             elif max_age and (usages[resource].updated_at -
@@ -2781,6 +2865,7 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                     # Update the usage
                     usages[res].in_use = in_use
                     usages[res].until_refresh = until_refresh or None
+                    changed.add(res)
 
                     # Because more than one resource may be refreshed
                     # by the call to the sync routine, and we don't
@@ -2818,14 +2903,16 @@ def quota_reserve(context, resources, quotas, deltas, expire,
         # Create the reservations
         if not overs:
             reservations = []
+            reservation_values = []
             for resource, delta in deltas.items():
-                reservation = reservation_create(elevated,
-                                                 str(uuid.uuid4()),
-                                                 usages[resource],
-                                                 project_id,
-                                                 resource, delta, expire,
-                                                 session=session)
-                reservations.append(reservation.uuid)
+                reservation_uuid = str(uuid.uuid4())
+                reservation_values.append({'uuid': reservation_uuid,
+                                           'usage_id': usages[resource].id,
+                                           'project_id': project_id,
+                                           'resource': resource,
+                                           'delta': delta,
+                                           'expire': expire})
+                reservations.append(reservation_uuid)
 
                 # Also update the reserved quantity
                 # NOTE(Vek): Again, we are only concerned here about
@@ -2841,10 +2928,14 @@ def quota_reserve(context, resources, quotas, deltas, expire,
                 #            reserved value if the delta is positive.
                 if delta > 0:
                     usages[resource].reserved += delta
+                    changed.add(resource)
+
+            _reservation_create_all(session, reservation_values)
 
-        # Apply updates to the usages table
-        for usage_ref in usages.values():
-            usage_ref.save(session=session)
+        # Apply updates to the usages table, rows that did not change are
+        # left alone so they are not rewritten under the lock.
+        for resource in changed:
+            usages[resource].save(session=session)
 
     if unders:
         LOG.warning(_("Change will make usage less than 0 for the following "
@@ -3040,9 +3131,12 @@ def block_device_mapping_create(context, values):
 
 @require_context
 def block_device_mapping_update(context, bdm_id, values):
-    _block_device_mapping_get_query(context).\
-            filter_by(id=bdm_id).\
-            update(values)
+    session = get_session()
+    with session.begin():
+        query = _block_device_mapping_get_query(context, session=session).\
+                filter_by(id=bdm_id)
+        query.update(values)
+        return query.first()
 
 
 @require_context
@@ -3081,6 +3175,16 @@ def block_device_mapping_get_all_by_instance(context, instance_uuid):
                  all()
 
 
+@require_context
+def block_device_mapping_get_all_by_instance_uuids(context, instance_uuids):
+    if not instance_uuids:
+        return []
+    return _block_device_mapping_get_query(context).\
+                 filter(models.BlockDeviceMapping.instance_uuid.in_(
+                        instance_uuids)).\
+                 all()
+
+
 @require_context
 def block_device_mapping_destroy(context, bdm_id):
     _block_device_mapping_get_query(context).\
@@ -4496,6 +4600,23 @@ def aggregate_metadata_get_by_host(context, host, key=None):
     return dict(metadata)
 
 
+@require_admin_context
+def aggregate_host_metadata_get_all(context):
+    rows = model_query(context, models.Aggregate).\
+                       options(joinedload('_hosts')).\
+                       options(joinedload('_metadata')).\
+                       all()
+    metadata = {}
+    for agg in rows:
+        for agghost in agg._hosts:
+            host_metadata = metadata.setdefault(agghost.host,
+                    collections.defaultdict(set))
+            for kv in agg._metadata:
+                host_metadata[kv['key']].add(kv['value'])
+    return dict((host, dict(host_metadata))
+                for host, host_metadata in metadata.iteritems())
+
+
 @require_admin_context
 def aggregate_host_get_by_metadata_key(context, key):
     query = model_query(context, models.Aggregate).join(
@@ -4503,8 +4624,9 @@ def aggregate_host_get_by_metadata_key(context, key):
     rows = query.all()
     metadata = collections.defaultdict(set)
     for agg in rows:
+        values = [kv['value'] for kv in agg._metadata if kv['key'] == key]
         for agghost in agg._hosts:
-            metadata[agghost.host].add(agg._metadata[0]['value'])
+            metadata[agghost.host].update(values)
     return dict(metadata)
 
 
@@ -4864,6 +4986,17 @@ def get_ec2_instance_id_by_uuid(context, instance_id, session=None):
     return result['id']
 
 
+@require_context
+def get_ec2_instance_ids_by_uuids(context, instance_uuids, session=None):
+    if not instance_uuids:
+        return {}
+    rows = _ec2_instance_get_query(context, session=session).\
+                    filter(models.InstanceIdMapping.uuid.in_(
+                           instance_uuids)).\
+                    all()
+    return dict((row['uuid'], row['id']) for row in rows)
+
+
 @require_context
 def get_instance_uuid_by_ec2_id(context, ec2_id, session=None):
     result = _ec2_instance_get_query(context,
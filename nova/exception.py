@@ -436,6 +436,11 @@ class ImageUnacceptable(Invalid):
     message = _("Image %(image_id)s is unacceptable: %(reason)s")
 
 
+class ImageFetchTimeout(NovaException):
+    message = _("Timed out after %(timeout)d seconds waiting for image "
+                "%(target)s to be fetched")
+
+
 class InstanceUnacceptable(Invalid):
     message = _("Instance %(instance_id)s is unacceptable: %(reason)s")
 
@@ -21,6 +21,7 @@ from __future__ import absolute_import
 
 import copy
 import itertools
+import os
 import random
 import shutil
 import sys
@@ -35,6 +36,7 @@ from nova import exception
 from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
+from nova import utils
 
 glance_opts = [
     cfg.StrOpt('glance_host',
@@ -64,6 +66,15 @@ glance_opts = [
                 help='A list of url scheme that can be downloaded directly '
                      'via the direct_url.  Currently supported schemes: '
                      '[file].'),
+    cfg.ListOpt('image_file_transfer_methods',
+                default=['reflink', 'copy'],
+                help='Ways to put an image with a file direct_url in place, '
+                     'tried in order: "hardlink" links the file of glance '
+                     '(only safe when glance and nova-compute never modify '
+                     'the file, its owner or its times), "reflink" makes a '
+                     'copy on write clone of it, and "copy" copies it with '
+                     'cp, which still reads and writes all of the data, '
+                     'but outside of nova-compute and without blocking it'),
     ]
 
 LOG = logging.getLogger(__name__)
@@ -195,6 +206,47 @@ class GlanceClientWrapper(object):
                 time.sleep(1)
 
 
+def _link_file(src, dst):
+    os.link(src, dst)
+
+
+def _reflink_file(src, dst):
+    utils.execute('cp', '--reflink=always', src, dst)
+
+
+def _copy_file(src, dst):
+    utils.execute('cp', src, dst)
+
+
+_FILE_TRANSFER_METHODS = {'hardlink': _link_file,
+                          'reflink': _reflink_file,
+                          'copy': _copy_file}
+
+
+def _transfer_file(src, dst):
+    """Put the file src in place at dst, with the first of the
+    image_file_transfer_methods which works.
+
+    Returns False if none of them did.
+    """
+    for method in CONF.image_file_transfer_methods:
+        transfer = _FILE_TRANSFER_METHODS.get(method)
+        if transfer is None:
+            LOG.warn(_('Unknown image file transfer method %s'), method)
+            continue
+        try:
+            transfer(src, dst)
+        except (OSError, exception.ProcessExecutionError) as e:
+            LOG.debug(_('Image file transfer method %(method)s failed for '
+                        '%(src)s: %(e)s'), locals())
+            utils.delete_if_exists(dst)
+            continue
+        LOG.debug(_('Transferred image file %(src)s to %(dst)s with '
+                    '%(method)s'), locals())
+        return True
+    return False
+
+
 class GlanceImageService(object):
     """Provides storage and retrieval of disk image objects within Glance."""
 
@@ -258,17 +310,20 @@ class GlanceImageService(object):
 
         return getattr(image_meta, 'direct_url', None)
 
-    def download(self, context, image_id, data=None):
-        """Calls out to Glance for data and writes data."""
+    def download(self, context, image_id, data=None, dst_path=None):
+        """Calls out to Glance for data and writes data.
+
+        When dst_path is given and the image has a file direct_url, the
+        image is put in place at dst_path directly if possible, and data
+        is not written to.
+        """
         if 'file' in CONF.allowed_direct_url_schemes:
             location = self.get_location(context, image_id)
             o = urlparse.urlparse(location)
             if o.scheme == "file":
+                if dst_path is not None and _transfer_file(o.path, dst_path):
+                    return
                 with open(o.path, "r") as f:
-                    # FIXME(jbresnah) a system call to cp could have
-                    # significant performance advantages, however we
-                    # do not have the path to files at this point in
-                    # the abstraction.
                     shutil.copyfileobj(f, data)
                 return
 
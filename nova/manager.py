@@ -61,6 +61,7 @@ from nova.openstack.common import log as logging
 from nova.openstack.common import periodic_task
 from nova.openstack.common.plugin import pluginmanager
 from nova.openstack.common.rpc import dispatcher as rpc_dispatcher
+from nova import periodic_runner
 from nova.scheduler import rpcapi as scheduler_rpcapi
 
 
@@ -80,6 +81,7 @@ class Manager(base.Base, periodic_task.PeriodicTasks):
         self.load_plugins()
         self.backdoor_port = None
         self.service_name = service_name
+        self._periodic_runner = None
         super(Manager, self).__init__(db_driver)
 
     def load_plugins(self):
@@ -92,13 +94,29 @@ class Manager(base.Base, periodic_task.PeriodicTasks):
         If a manager would like to set an rpc API version, or support more than
         one class as the target of rpc messages, override this method.
         '''
-        base_rpc = baserpc.BaseRPCAPI(self.service_name, backdoor_port)
+        base_rpc = baserpc.BaseRPCAPI(self.service_name, backdoor_port,
+                                      self.get_periodic_task_stats)
         return rpc_dispatcher.RpcDispatcher([self, base_rpc])
 
     def periodic_tasks(self, context, raise_on_error=False):
         """Tasks to be run at a periodic interval."""
+        if CONF.periodic_task_workers > 0:
+            if self._periodic_runner is None:
+                self._periodic_runner = periodic_runner.PeriodicTaskRunner(
+                    self, CONF.periodic_task_workers)
+            return self._periodic_runner.run_periodic_tasks(
+                context, raise_on_error=raise_on_error)
         return self.run_periodic_tasks(context, raise_on_error=raise_on_error)
 
+    def get_periodic_task_stats(self):
+        """Return the run statistics of the periodic tasks.
+
+        Only kept when the tasks run concurrently, see periodic_task_workers.
+        """
+        if self._periodic_runner is None:
+            return {}
+        return self._periodic_runner.get_stats()
+
     def init_host(self):
         """Hook to do additional manager initialization when one requests
         the service be started.  This is called before any service record
@@ -21,6 +21,7 @@
 import functools
 import inspect
 
+from nova import cache_utils
 from nova.compute import instance_types
 from nova.db import base
 from nova import exception
@@ -76,6 +77,9 @@ def update_instance_cache_with_nw_info(api, context, instance,
             conductor_api.instance_info_cache_update(context, instance, cache)
         else:
             api.db.instance_info_cache_update(context, instance['uuid'], cache)
+        info_cache = instance.get('info_cache') or {}
+        if info_cache.get('network_info') != cache['network_info']:
+            cache_utils.invalidate_metadata(instance['uuid'])
     except Exception:
         LOG.exception(_('Failed storing info cache'), instance=instance)
 
@@ -383,6 +387,32 @@ class API(base.Base):
 
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    @wrap_check_policy
+    def get_instance_nw_info_batch(self, context, instances,
+                                   conductor_api=None):
+        """Returns the network info of several instances, by uuid.
+
+        The info caches of the instances are updated like with
+        get_instance_nw_info.
+        """
+        args = []
+        for instance in instances:
+            instance_type = instance_types.extract_instance_type(instance)
+            args.append({'instance_id': instance['uuid'],
+                         'rxtx_factor': instance_type['rxtx_factor'],
+                         'host': instance['host']})
+        nw_infos = self.network_rpcapi.get_instance_nw_info_batch(context,
+                                                                  args)
+
+        result = {}
+        for instance in instances:
+            nw_info = network_model.NetworkInfo.hydrate(
+                    nw_infos[instance['uuid']])
+            update_instance_cache_with_nw_info(self, context, instance,
+                                               nw_info, conductor_api)
+            result[instance['uuid']] = nw_info
+        return result
+
     @wrap_check_policy
     def validate_networks(self, context, requested_networks):
         """validate the networks passed at the time of creating
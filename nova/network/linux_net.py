@@ -25,6 +25,8 @@ import netaddr
 import os
 import re
 
+from eventlet import event
+from eventlet import greenthread
 from oslo.config import cfg
 
 from nova import db
@@ -122,6 +124,22 @@ linux_net_opts = [
                default='DROP',
                help=('The table that iptables to jump to when a packet is '
                      'to be dropped.')),
+    cfg.BoolOpt('iptables_incremental_apply',
+                default=False,
+                help='Only restore the wrapped iptables chains that changed '
+                     'since the last apply, instead of rewriting every '
+                     'table'),
+    cfg.FloatOpt('iptables_apply_coalesce_interval',
+                 default=0.0,
+                 help='Seconds to collect iptables changes for before '
+                      'applying them all at once. 0 applies every change '
+                      'right away'),
+    cfg.IntOpt('iptables_full_apply_interval',
+               default=20,
+               help='With iptables_incremental_apply set, still rewrite '
+                    'every table on every Nth apply, so nova chains that '
+                    'were flushed or changed outside of nova are put back. '
+                    '0 only rewrites the tables when nova needs to'),
     ]
 
 CONF = cfg.CONF
@@ -229,15 +247,17 @@ class IptablesTable(object):
             self.remove_rules += filter(lambda r: r.chain == name, self.rules)
         self.rules = filter(lambda r: r.chain != name, self.rules)
 
+        # NOTE: the trailing space keeps a jump to 'inst-10' from matching
+        # when removing 'inst-1'
         if wrap:
-            jump_snippet = '-j %s-%s' % (binary_name, name)
+            jump_snippet = '-j %s-%s ' % (binary_name, name)
         else:
-            jump_snippet = '-j %s' % (name,)
+            jump_snippet = '-j %s ' % (name,)
 
+        jumps = lambda r: jump_snippet in '%s ' % (r.rule,)
         if not wrap:
-            self.remove_rules += filter(lambda r: jump_snippet in r.rule,
-                                        self.rules)
-        self.rules = filter(lambda r: jump_snippet not in r.rule, self.rules)
+            self.remove_rules += filter(jumps, self.rules)
+        self.rules = filter(lambda r: not jumps(r), self.rules)
 
     def add_rule(self, chain, rule, wrap=True, top=False):
         """Add a rule to the table.
@@ -291,10 +311,8 @@ class IptablesTable(object):
 
     def empty_chain(self, chain, wrap=True):
         """Remove all rules from a chain."""
-        chained_rules = [rule for rule in self.rules
-                              if rule.chain == chain and rule.wrap == wrap]
-        for rule in chained_rules:
-            self.rules.remove(rule)
+        self.rules = [rule for rule in self.rules
+                      if rule.chain != chain or rule.wrap != wrap]
 
 
 class IptablesManager(object):
@@ -333,6 +351,18 @@ class IptablesManager(object):
 
         self.iptables_apply_deferred = False
 
+        # NOTE: snapshots of the tables as last applied by each command,
+        # used to only restore the chains that changed since then.
+        self._applied = {}
+
+        # NOTE: incremental applies done by each command since it last
+        # rewrote every table.
+        self._incremental_applies = {}
+
+        # NOTE: event sent when the apply scheduled to pick up the
+        # latest changes is done, None if no apply is scheduled.
+        self._pending_apply = None
+
         # Add a nova-filter-top chain. It's intended to be shared
         # among the various nova components. It sits at the very top
         # of FORWARD and OUTPUT.
@@ -390,11 +420,41 @@ class IptablesManager(object):
         self.iptables_apply_deferred = False
         self._apply()
 
-    def apply(self):
+    def apply(self, wait=False):
+        """Apply the in-memory rules.
+
+        With iptables_apply_coalesce_interval set, the rules are applied
+        by a greenthread once the interval has passed, together with any
+        other change made in the meantime.  Pass wait=True to return only
+        after the rules have been applied.
+
+        """
         if self.iptables_apply_deferred:
             return
 
-        self._apply()
+        if CONF.iptables_apply_coalesce_interval <= 0:
+            self._apply()
+            return
+
+        pending = self._pending_apply
+        if pending is None:
+            pending = self._pending_apply = event.Event()
+            greenthread.spawn_after(CONF.iptables_apply_coalesce_interval,
+                                    self._coalesced_apply)
+        if wait:
+            pending.wait()
+
+    def _coalesced_apply(self):
+        # NOTE: changes made from here on are applied by the next apply
+        done = self._pending_apply
+        self._pending_apply = None
+        try:
+            self._apply()
+        except Exception as e:
+            LOG.exception(_('Failed to apply iptables rules'))
+            done.send_exception(e)
+        else:
+            done.send()
 
     @lockutils.synchronized('iptables', 'nova-', external=True)
     def _apply(self):
@@ -404,25 +464,128 @@ class IptablesManager(object):
         same component of Nova, and replace them with our current set of
         rules. This happens atomically, thanks to iptables-restore.
 
+        With iptables_incremental_apply set, only the wrapped chains that
+        changed since the last apply are restored, as long as nothing else
+        in the tables changed.
+
         """
         s = [('iptables', self.ipv4)]
         if CONF.use_ipv6:
             s += [('ip6tables', self.ipv6)]
 
         for cmd, tables in s:
-            all_tables, _err = self.execute('%s-save' % (cmd,), '-c',
-                                                run_as_root=True,
-                                                attempts=5)
-            all_lines = all_tables.split('\n')
-            for table_name, table in tables.iteritems():
-                start, end = self._find_table(all_lines, table_name)
-                all_lines[start:end] = self._modify_rules(
-                        all_lines[start:end], table, table_name)
-            self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
-                         process_input='\n'.join(all_lines),
-                         attempts=5)
+            snapshots = dict((table_name, self._snapshot_table(table))
+                             for table_name, table in tables.iteritems())
+            if CONF.iptables_incremental_apply:
+                try:
+                    if self._apply_changed_chains(cmd, tables, snapshots):
+                        continue
+                except exception.ProcessExecutionError:
+                    LOG.exception(_('Failed to restore changed %s chains, '
+                                    'rewriting all tables'), cmd)
+            self._applied.pop(cmd, None)
+            self._apply_tables(cmd, tables)
+            self._applied[cmd] = snapshots
+            self._incremental_applies[cmd] = 0
         LOG.debug(_("IPTablesManager.apply completed with success"))
 
+    def _apply_tables(self, cmd, tables):
+        all_tables, _err = self.execute('%s-save' % (cmd,), '-c',
+                                            run_as_root=True,
+                                            attempts=5)
+        all_lines = all_tables.split('\n')
+        for table_name, table in tables.iteritems():
+            start, end = self._find_table(all_lines, table_name)
+            all_lines[start:end] = self._modify_rules(
+                    all_lines[start:end], table, table_name)
+        self.execute('%s-restore' % (cmd,), '-c', run_as_root=True,
+                     process_input='\n'.join(all_lines),
+                     attempts=5)
+
+    def _apply_changed_chains(self, cmd, tables, snapshots):
+        """Restore the wrapped chains changed since the last apply.
+
+        Returns False, without touching iptables, when there is no record
+        of the last apply, something besides the wrapped chains changed or
+        the tables are due to be rewritten.
+
+        """
+        applied = self._applied.get(cmd)
+        if applied is None:
+            return False
+
+        # NOTE: the snapshots only record what nova applied, so chains
+        # flushed or changed by something else are only put back by
+        # rewriting every table.
+        count = self._incremental_applies.get(cmd, 0)
+        interval = CONF.iptables_full_apply_interval
+        if interval > 0 and count >= interval - 1:
+            return False
+
+        lines = []
+        for table_name, table in tables.iteritems():
+            if table.remove_rules or table.remove_chains:
+                return False
+            old_unwrapped_chains, old_unwrapped, old_chains = \
+                    applied[table_name]
+            unwrapped_chains, unwrapped, chains = snapshots[table_name]
+            if (unwrapped_chains != old_unwrapped_chains or
+                    unwrapped != old_unwrapped):
+                return False
+
+            changed = sorted(chain for chain in chains
+                             if chains[chain] != old_chains.get(chain))
+            removed = sorted(chain for chain in old_chains
+                             if chain not in chains)
+            if not changed and not removed:
+                continue
+
+            # NOTE: with --noflush, declaring an existing chain flushes it
+            lines.append('*%s' % table_name)
+            lines += [':%s-%s - [0:0]' % (binary_name, chain)
+                      for chain in changed + removed]
+            for chain in changed:
+                lines += chains[chain]
+            lines += ['-X %s-%s' % (binary_name, chain) for chain in removed]
+            lines.append('COMMIT')
+
+        if lines:
+            self.execute('%s-restore' % (cmd,), '-c', '--noflush',
+                         run_as_root=True, process_input='\n'.join(lines),
+                         attempts=5)
+        self._applied[cmd] = snapshots
+        self._incremental_applies[cmd] = count + 1
+        return True
+
+    @staticmethod
+    def _snapshot_table(table):
+        """Returns the unwrapped chains and rules of a table, and the
+        lines of each wrapped chain in the order they are restored in.
+        """
+        unwrapped = []
+        top_rules = dict((chain, []) for chain in table.chains)
+        bottom_rules = dict((chain, []) for chain in table.chains)
+        for rule in table.rules:
+            if not rule.wrap:
+                unwrapped.append((str(rule), rule.top))
+            elif rule.top:
+                top_rules[rule.chain].append(str(rule))
+            else:
+                bottom_rules[rule.chain].append(str(rule))
+
+        chains = {}
+        for chain in table.chains:
+            # duplicates are dropped, the last occurrence wins
+            seen_lines = set()
+            lines = []
+            for line in reversed(top_rules[chain] + bottom_rules[chain]):
+                if line not in seen_lines:
+                    seen_lines.add(line)
+                    lines.append(line)
+            lines.reverse()
+            chains[chain] = lines
+        return set(table.unwrapped_chains), unwrapped, chains
+
     def _find_table(self, lines, table_name):
         if len(lines) < 3:
             # length only <2 when fake iptables
@@ -435,6 +598,23 @@ class IptablesManager(object):
         end = lines[start:].index('COMMIT') + start + 2
         return (start, end)
 
+    @staticmethod
+    def _strip_counts(line):
+        """Strips the [packet:byte] counts from the beginning of a line."""
+        if line.startswith('['):
+            line = line.split(']', 1)[1]
+        return line.strip()
+
+    @staticmethod
+    def _split_lines(regex, lines):
+        """Splits off the lines matching regex, along with any other line
+        that is identical to one of them.
+        """
+        matched = [line for line in lines if regex.search(line)]
+        matched_lines = set(line.strip() for line in matched)
+        rest = [line for line in lines if line.strip() not in matched_lines]
+        return matched, rest
+
     def _modify_rules(self, current_lines, table, table_name):
         unwrapped_chains = table.unwrapped_chains
         chains = table.chains
@@ -449,27 +629,19 @@ class IptablesManager(object):
             current_lines = fake_table
 
         # Remove any trace of our rules
-        new_filter = filter(lambda line: binary_name not in line,
-                            current_lines)
+        new_filter = [line for line in current_lines
+                      if binary_name not in line]
 
         top_rules = []
         bottom_rules = []
 
         if CONF.iptables_top_regex:
             regex = re.compile(CONF.iptables_top_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                                    new_filter)
-            top_rules = temp_filter
+            top_rules, new_filter = self._split_lines(regex, new_filter)
 
         if CONF.iptables_bottom_regex:
             regex = re.compile(CONF.iptables_bottom_regex)
-            temp_filter = filter(lambda line: regex.search(line), new_filter)
-            for rule_str in temp_filter:
-                new_filter = filter(lambda s: s.strip() != rule_str.strip(),
-                    new_filter)
-            bottom_rules = temp_filter
+            bottom_rules, new_filter = self._split_lines(regex, new_filter)
 
         seen_chains = False
         rules_index = 0
@@ -484,41 +656,36 @@ class IptablesManager(object):
         if not seen_chains:
             rules_index = 2
 
+        # rule.top == True means we want this rule to be at the top.
+        # Further down, we weed out duplicates from the bottom of the
+        # list, so here we take the dupes out ahead of time.  Only exact
+        # copies of the rule, ignoring [packet:byte] counts, are dupes.
+        #
+        # We don't want to remove an entry if it has non-zero
+        # [packet:byte] counts and replace it with [0:0], so the last
+        # duplicate found, if any, takes the place of our table rule.
+        dups = dict((self._strip_counts(str(rule)), None)
+                    for rule in rules if rule.top)
+        if dups:
+            other_lines = []
+            for line in new_filter:
+                line_key = self._strip_counts(line)
+                if line_key in dups:
+                    dups[line_key] = line
+                else:
+                    other_lines.append(line)
+            new_filter = other_lines
+
         our_rules = top_rules
         bot_rules = []
         for rule in rules:
             rule_str = str(rule)
             if rule.top:
-                # rule.top == True means we want this rule to be at the top.
-                # Further down, we weed out duplicates from the bottom of the
-                # list, so here we remove the dupes ahead of time.
-
-                # We don't want to remove an entry if it has non-zero
-                # [packet:byte] counts and replace it with [0:0], so let's
-                # go look for a duplicate, and over-ride our table rule if
-                # found.
-
-                # ignore [packet:byte] counts at beginning of line
-                if rule_str.startswith('['):
-                    rule_str = rule_str.split(']', 1)[1]
-                dup_filter = filter(lambda s: rule_str.strip() in s.strip(),
-                                    new_filter)
-
-                new_filter = filter(lambda s:
-                                    rule_str.strip() not in s.strip(),
-                                    new_filter)
-                # if no duplicates, use original rule
-                if dup_filter:
-                    # grab the last entry, if there is one
-                    dup = dup_filter[-1]
-                    rule_str = str(dup)
-                else:
-                    rule_str = str(rule)
-                rule_str.strip()
-
-                our_rules += [rule_str]
+                rule_key = self._strip_counts(rule_str)
+                our_rules.append(dups[rule_key] or rule_str)
+                dups[rule_key] = None
             else:
-                bot_rules += [rule_str]
+                bot_rules.append(rule_str)
 
         our_rules += bot_rules
 
@@ -536,15 +703,20 @@ class IptablesManager(object):
 
         def _weed_out_duplicates(line):
             # ignore [packet:byte] counts at beginning of lines
-            if line.startswith('['):
-                line = line.split(']', 1)[1]
-            line = line.strip()
+            line = self._strip_counts(line)
             if line in seen_lines:
                 return False
             else:
                 seen_lines.add(line)
                 return True
 
+        # rules to remove, ignoring [packet:byte] counts, and how many
+        # times each should be removed
+        remove_counts = {}
+        for rule in remove_rules:
+            rule_str = str(rule).split(' ', 1)[1].strip()
+            remove_counts[rule_str] = remove_counts.get(rule_str, 0) + 1
+
         def _weed_out_removes(line):
             # We need to find exact matches here
             if line.startswith(':'):
@@ -553,23 +725,15 @@ class IptablesManager(object):
                 line = line.split(':')[1]
                 line = line.split('- [')[0]
                 line = line.strip()
-                for chain in remove_chains:
-                    if chain == line:
-                        remove_chains.remove(chain)
-                        return False
+                if line in remove_chains:
+                    remove_chains.remove(line)
+                    return False
             elif line.startswith('['):
                 # it's a rule
-                # ignore [packet:byte] counts at beginning of lines
-                line = line.split(']', 1)[1]
-                line = line.strip()
-                for rule in remove_rules:
-                    # ignore [packet:byte] counts at beginning of rules
-                    rule_str = str(rule)
-                    rule_str = rule_str.split(' ', 1)[1]
-                    rule_str = rule_str.strip()
-                    if rule_str == line:
-                        remove_rules.remove(rule)
-                        return False
+                line = self._strip_counts(line)
+                if remove_counts.get(line):
+                    remove_counts[line] -= 1
+                    return False
 
             # Leave it alone
             return True
@@ -584,8 +748,7 @@ class IptablesManager(object):
 
         # flush lists, just in case we didn't find something
         remove_chains.clear()
-        for rule in remove_rules:
-            remove_rules.remove(rule)
+        del remove_rules[:]
 
         return new_filter
 
@@ -844,16 +1007,73 @@ def get_dhcp_leases(context, network_ref):
     return '\n'.join(hosts)
 
 
+# NOTE: fixed ips this host hands out over DHCP, by network id, as lists
+#       of network_get_associated_fixed_ips rows.  A network's list is
+#       loaded from the database the first time it is needed and after
+#       clear_dhcp_hosts(); the network manager keeps it up to date by
+#       calling add_dhcp_host() and remove_dhcp_host() as it allocates and
+#       deallocates fixed ips.
+_dhcp_hosts = {}
+
+
+def _get_dhcp_host_data(context, network_ref):
+    data = _dhcp_hosts.get(network_ref['id'])
+    if data is None:
+        host = None
+        if network_ref['multi_host']:
+            host = CONF.host
+        data = db.network_get_associated_fixed_ips(context,
+                                                   network_ref['id'],
+                                                   host=host)
+        _dhcp_hosts[network_ref['id']] = data
+    return data
+
+
+def add_dhcp_host(network_ref, address, instance, vif):
+    """Add a newly allocated fixed ip to the network's DHCP hosts."""
+    data = _dhcp_hosts.get(network_ref['id'])
+    if data is None:
+        # NOTE: not loaded yet, it will be read from the database
+        return
+    if network_ref['multi_host'] and instance['host'] != CONF.host:
+        return
+    remove_dhcp_host(network_ref['id'], address)
+    data.append({'address': address,
+                 'instance_uuid': instance['uuid'],
+                 'network_id': network_ref['id'],
+                 'vif_id': vif['id'],
+                 'vif_address': vif['address'],
+                 'instance_hostname': instance['hostname'],
+                 'instance_updated': instance['updated_at'],
+                 'instance_created': instance['created_at'],
+                 'allocated': True,
+                 'leased': False})
+
+
+def remove_dhcp_host(network_id, address):
+    """Remove a deallocated fixed ip from the network's DHCP hosts."""
+    data = _dhcp_hosts.get(network_id)
+    if data is not None:
+        data[:] = [datum for datum in data if datum['address'] != address]
+
+
+def clear_dhcp_hosts(network_id=None):
+    """Reload a network's DHCP hosts, or all of them, from the database.
+
+    Used when fixed ips move between hosts without going through
+    allocate_fixed_ip and deallocate_fixed_ip, e.g. on migration.
+    """
+    if network_id is None:
+        _dhcp_hosts.clear()
+    else:
+        _dhcp_hosts.pop(network_id, None)
+
+
 def get_dhcp_hosts(context, network_ref):
     """Get network's hosts config in dhcp-host format."""
     hosts = []
-    host = None
-    if network_ref['multi_host']:
-        host = CONF.host
     macs = set()
-    for data in db.network_get_associated_fixed_ips(context,
-                                                    network_ref['id'],
-                                                    host=host):
+    for data in _get_dhcp_host_data(context, network_ref):
         if data['vif_address'] not in macs:
             hosts.append(_host_dhcp(data))
             macs.add(data['vif_address'])
@@ -914,22 +1134,16 @@ def _remove_dhcp_mangle_rule(dev):
 def get_dhcp_opts(context, network_ref):
     """Get network's hosts config in dhcp-opts format."""
     hosts = []
-    host = None
-    if network_ref['multi_host']:
-        host = CONF.host
-    data = db.network_get_associated_fixed_ips(context,
-                                               network_ref['id'],
-                                               host=host)
+    data = _get_dhcp_host_data(context, network_ref)
 
     if data:
         instance_set = set([datum['instance_uuid'] for datum in data])
         default_gw_vif = {}
-        for instance_uuid in instance_set:
-            vifs = db.virtual_interface_get_by_instance(context,
-                                                        instance_uuid)
-            if vifs:
-                #offer a default gateway to the first virtual interface
-                default_gw_vif[instance_uuid] = vifs[0]['id']
+        vifs = db.virtual_interface_get_by_instance_uuids(context,
+                                                          list(instance_set))
+        for vif in vifs:
+            #offer a default gateway to the first virtual interface
+            default_gw_vif.setdefault(vif['instance_uuid'], vif['id'])
 
         for datum in data:
             instance_uuid = datum['instance_uuid']
@@ -944,10 +1158,49 @@ def release_dhcp(dev, address, mac_address):
     utils.execute('dhcp_release', dev, address, mac_address, run_as_root=True)
 
 
+# NOTE: contents of the dnsmasq hosts and opts files as last written by
+#       this process, by path.
+_dhcp_file_contents = {}
+
+
 def update_dhcp(context, dev, network_ref):
     conffile = _dhcp_file(dev, 'conf')
-    write_to_file(conffile, get_dhcp_hosts(context, network_ref))
-    restart_dhcp(context, dev, network_ref)
+    changed = _update_dhcp_file(conffile, get_dhcp_hosts(context, network_ref))
+    if CONF.use_single_default_gateway:
+        changed = _update_dhcp_opts(context, dev, network_ref) or changed
+
+    # NOTE: dnsmasq only needs a HUP to reload the files, so there is
+    #       nothing to do if they did not change and it is running.
+    if not changed and _dnsmasq_running(dev):
+        LOG.debug(_('DHCP hosts of %s unchanged, not reloading dnsmasq'),
+                  dev)
+        return
+    restart_dhcp(context, dev, network_ref, update_opts=False)
+
+
+def _update_dhcp_opts(context, dev, network_ref):
+    optsfile = _dhcp_file(dev, 'opts')
+    return _update_dhcp_file(optsfile, get_dhcp_opts(context, network_ref))
+
+
+def _update_dhcp_file(path, data):
+    """Replace a dnsmasq file with data, unless it already holds it.
+
+    The contents last written are kept in memory, so an unchanged file is
+    neither read nor written.  The new file is renamed into place, so
+    dnsmasq never reads a partially written one.  Returns whether the
+    file was written.
+
+    """
+    if _dhcp_file_contents.get(path) == data:
+        return False
+    tmpfile = '%s.tmp' % path
+    write_to_file(tmpfile, data)
+    # Make sure dnsmasq can actually read it (it setuid()s to "nobody")
+    os.chmod(tmpfile, 0644)
+    os.rename(tmpfile, path)
+    _dhcp_file_contents[path] = data
+    return True
 
 
 def update_dns(context, dev, network_ref):
@@ -958,7 +1211,7 @@ def update_dns(context, dev, network_ref):
 
 def update_dhcp_hostfile_with_text(dev, hosts_text):
     conffile = _dhcp_file(dev, 'conf')
-    write_to_file(conffile, hosts_text)
+    _update_dhcp_file(conffile, hosts_text)
 
 
 def kill_dhcp(dev):
@@ -980,21 +1233,18 @@ def kill_dhcp(dev):
 #           configuration options (like dchp-range, vlan, ...)
 #           aren't reloaded.
 @lockutils.synchronized('dnsmasq_start', 'nova-')
-def restart_dhcp(context, dev, network_ref):
+def restart_dhcp(context, dev, network_ref, update_opts=True):
     """(Re)starts a dnsmasq server for a given network.
 
     If a dnsmasq instance is already running then send a HUP
     signal causing it to reload, otherwise spawn a new instance.
+    Pass update_opts=False if the opts file was just updated.
 
     """
     conffile = _dhcp_file(dev, 'conf')
 
-    if CONF.use_single_default_gateway:
-        # NOTE(vish): this will have serious performance implications if we
-        #             are not in multi_host mode.
-        optsfile = _dhcp_file(dev, 'opts')
-        write_to_file(optsfile, get_dhcp_opts(context, network_ref))
-        os.chmod(optsfile, 0644)
+    if CONF.use_single_default_gateway and update_opts:
+        _update_dhcp_opts(context, dev, network_ref)
 
     if network_ref['multi_host']:
         _add_dhcp_mangle_rule(dev)
@@ -1199,6 +1449,16 @@ def _dnsmasq_pid_for(dev):
             return None
 
 
+def _dnsmasq_running(dev):
+    """Check whether the dnsmasq of a bridge/device is running."""
+    pid = _dnsmasq_pid_for(dev)
+    if not pid:
+        return False
+    out, _err = _execute('cat', '/proc/%d/cmdline' % pid,
+                         check_exit_code=False)
+    return _dhcp_file(dev, 'conf').split('/')[-1] in out
+
+
 def _ra_pid_for(dev):
     """Returns the pid for prior radvd instance for a bridge/device.
 
@@ -271,7 +271,7 @@ class NetworkManager(manager.Manager):
         The one at a time part is to flatten the layout to help scale
     """
 
-    RPC_API_VERSION = '1.9'
+    RPC_API_VERSION = '1.10'
 
     # If True, this manager requires VIF to create a bridge.
     SHOULD_CREATE_BRIDGE = False
@@ -590,6 +590,42 @@ class NetworkManager(manager.Manager):
                                                          rxtx_factor, host)
         return nw_info
 
+    def get_instance_nw_info_batch(self, context, instances):
+        """Creates the network info lists of several instances.
+
+        :param instances: list of dicts with the instance_id, rxtx_factor
+                          and host arguments of get_instance_nw_info
+        :returns: dict of network info list by instance uuid
+
+        The virtual interfaces of all the instances are fetched with a
+        single query, and each network is looked up only once.
+        """
+        instance_uuids = [instance['instance_id'] for instance in instances]
+        vifs_by_instance = dict((uuid, []) for uuid in instance_uuids)
+        vifs = self.db.virtual_interface_get_by_instance_uuids(
+                context, instance_uuids)
+        for vif in vifs:
+            vifs_by_instance[vif['instance_uuid']].append(vif)
+
+        networks_by_id = {}
+        nw_infos = {}
+        for instance in instances:
+            instance_uuid = instance['instance_id']
+            networks = {}
+            for vif in vifs_by_instance[instance_uuid]:
+                network_id = vif.get('network_id')
+                if network_id is None:
+                    continue
+                if network_id not in networks_by_id:
+                    networks_by_id[network_id] = self._get_network_by_id(
+                            context, network_id)
+                networks[vif['uuid']] = networks_by_id[network_id]
+
+            nw_infos[instance_uuid] = self.build_network_info_model(
+                    context, vifs_by_instance[instance_uuid], networks,
+                    instance['rxtx_factor'], instance.get('host'))
+        return nw_infos
+
     def build_network_info_model(self, context, vifs, networks,
                                  rxtx_factor, instance_host):
         """Builds a NetworkInfo object containing all network information
@@ -868,6 +904,8 @@ class NetworkManager(manager.Manager):
             #            (or the whole instance object).
             instance = self.db.instance_get_by_uuid(context, instance_id)
             name = instance['display_name']
+            if address:
+                self.driver.add_dhcp_host(network, address, instance, vif)
 
             if self._validate_instance_zone_for_dns_domain(context, instance):
                 self.instance_dns_manager.create_entry(
@@ -916,6 +954,7 @@ class NetworkManager(manager.Manager):
         self.db.fixed_ip_update(context, address,
                                 {'allocated': False,
                                  'virtual_interface_id': None})
+        self.driver.remove_dhcp_host(fixed_ip_ref['network_id'], address)
 
         if teardown:
             network = self._get_network_by_id(context,
@@ -1275,6 +1314,9 @@ class NetworkManager(manager.Manager):
             if self.host == host or host is None:
                 # at this point i am the correct host, or host doesn't
                 # matter -> FlatManager
+                # NOTE: the instance may have moved to or from this host
+                #       without allocating its fixed ips here.
+                self.driver.clear_dhcp_hosts(network['id'])
                 call_func(context, network)
             else:
                 # i'm not the right host, run call on correct host
@@ -1293,6 +1335,7 @@ class NetworkManager(manager.Manager):
 
         # subcall from original setup_networks_on_host
         network = self.db.network_get(context, network_id)
+        self.driver.clear_dhcp_hosts(network['id'])
         call_func(context, network)
 
     def _setup_network_on_host(self, context, network):
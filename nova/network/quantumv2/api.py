@@ -383,6 +383,20 @@ class API(base.Base):
         nw_info = self._build_network_info_model(context, instance, networks)
         return network_model.NetworkInfo.hydrate(nw_info)
 
+    def get_instance_nw_info_batch(self, context, instances,
+                                   conductor_api=None):
+        """Return network information of several instances, by uuid,
+           and update their caches.
+        """
+        # NOTE: quantum has no call returning the ports of several devices
+        # with their networks and subnets, so this is not any cheaper than
+        # calling get_instance_nw_info for each instance.
+        result = {}
+        for instance in instances:
+            result[instance['uuid']] = self.get_instance_nw_info(
+                    context, instance, conductor_api=conductor_api)
+        return result
+
     @refresh_cache
     def add_fixed_ip_to_instance(self, context, instance, network_id,
                                  conductor_api=None):
@@ -0,0 +1,211 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Concurrent runner for the periodic tasks of a manager.
+
+PeriodicTasks.run_periodic_tasks runs the due tasks one after another, so a
+slow task delays every task behind it.  The runner below starts each due task
+in its own greenthread instead, and:
+
+* never starts a task again while its previous run is still going,
+* delays each run by a random part of the task spacing, so the hosts of a
+  fleet drift apart instead of all running a task at the same time,
+* cancels a run that exceeds the time budget of the task,
+* keeps a histogram of the run durations of each task.
+
+"""
+
+import datetime
+import random
+import time
+
+from eventlet import greenpool
+from eventlet import timeout
+from oslo.config import cfg
+
+from nova.openstack.common import log as logging
+from nova.openstack.common import periodic_task
+from nova.openstack.common import timeutils
+
+
+periodic_runner_opts = [
+    cfg.IntOpt('periodic_task_workers',
+               default=0,
+               help='Number of periodic tasks of a service that may run '
+                    'at the same time, each in its own greenthread. 0 runs '
+                    'them one after another in the service greenthread'),
+    cfg.FloatOpt('periodic_task_jitter',
+                 default=0.0,
+                 help='Delay each run of a periodic task by a random part '
+                      'of its spacing, up to this fraction of it. Only used '
+                      'when periodic_task_workers is set'),
+    cfg.IntOpt('periodic_task_time_budget',
+               default=0,
+               help='Seconds a periodic task may run before it is cancelled, '
+                    '0 for no limit. Only used when periodic_task_workers '
+                    'is set'),
+    cfg.ListOpt('periodic_task_time_budgets',
+                default=[],
+                help='Time budgets of specific periodic tasks, overriding '
+                     'periodic_task_time_budget, as a list of '
+                     '<task name>:<seconds>'),
+    ]
+
+CONF = cfg.CONF
+CONF.register_opts(periodic_runner_opts)
+
+LOG = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the duration histogram buckets
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 300, 600)
+
+
+def _bucket_name(bound):
+    return 'le_%s' % bound
+
+
+class PeriodicTaskRunner(object):
+    """Runs the periodic tasks of a manager in a pool of greenthreads."""
+
+    def __init__(self, manager, workers):
+        self.manager = manager
+        self.pool = greenpool.GreenPool(workers)
+        self.running = {}
+        self.delays = {}
+        self.stats = {}
+        self.time_budgets = self._parse_time_budgets()
+
+    @staticmethod
+    def _parse_time_budgets():
+        time_budgets = {}
+        for item in CONF.periodic_task_time_budgets:
+            try:
+                task_name, seconds = item.rsplit(':', 1)
+                time_budgets[task_name] = int(seconds)
+            except ValueError:
+                LOG.warn(_('Ignoring invalid periodic task time budget %s'),
+                         item)
+        return time_budgets
+
+    def _time_budget(self, task_name):
+        return self.time_budgets.get(task_name,
+                                     CONF.periodic_task_time_budget)
+
+    def _delay(self, spacing):
+        if not spacing or CONF.periodic_task_jitter <= 0:
+            return 0
+        return random.uniform(0, spacing * CONF.periodic_task_jitter)
+
+    def run_periodic_tasks(self, context, raise_on_error=False):
+        """Start the due tasks.
+
+        Returns the number of seconds until the next task is due, like
+        PeriodicTasks.run_periodic_tasks.  With raise_on_error, waits for
+        the started tasks and raises the first error one of them hit.
+
+        """
+        idle_for = periodic_task.DEFAULT_INTERVAL
+        errors = []
+        for task_name, task in self.manager._periodic_tasks:
+            spacing = self.manager._periodic_spacing[task_name]
+            if spacing is not None:
+                idle_for = min(idle_for, spacing)
+
+            if task_name in self.running:
+                LOG.debug(_('Periodic task %s is still running'), task_name)
+                continue
+
+            now = timeutils.utcnow()
+            last_run = self.manager._periodic_last_run[task_name]
+
+            # If a periodic task is _nearly_ due, then we'll run it early
+            if spacing is not None and last_run is not None:
+                delay = spacing + self.delays.get(task_name, 0)
+                due = last_run + datetime.timedelta(seconds=delay)
+                if not timeutils.is_soon(due, 0.2):
+                    idle_for = min(idle_for, timeutils.delta_seconds(now, due))
+                    continue
+
+            self.manager._periodic_last_run[task_name] = now
+            self.delays[task_name] = self._delay(spacing)
+            self.running[task_name] = self.pool.spawn(
+                self._run_task, context, task_name, task, errors)
+
+        if raise_on_error:
+            self.pool.waitall()
+            if errors:
+                raise errors[0]
+        return idle_for
+
+    def _run_task(self, context, task_name, task, errors):
+        full_task_name = '.'.join([self.manager.__class__.__name__,
+                                   task_name])
+        LOG.debug(_("Running periodic task %(full_task_name)s"), locals())
+
+        budget = self._time_budget(task_name)
+        timer = timeout.Timeout(budget) if budget > 0 else None
+        start = time.time()
+        outcome = 'runs'
+        try:
+            task(self.manager, context)
+        except timeout.Timeout as e:
+            if e is not timer:
+                raise
+            outcome = 'timeouts'
+            LOG.error(_("Periodic task %(full_task_name)s cancelled after "
+                        "running for %(budget)d seconds"), locals())
+        except Exception as e:
+            outcome = 'failures'
+            errors.append(e)
+            LOG.exception(_("Error during %(full_task_name)s: %(e)s"),
+                          locals())
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self._record(task_name, outcome, time.time() - start)
+            del self.running[task_name]
+
+    def _record(self, task_name, outcome, duration):
+        stats = self.stats.get(task_name)
+        if stats is None:
+            histogram = dict((_bucket_name(bound), 0)
+                             for bound in DURATION_BUCKETS)
+            histogram['le_inf'] = 0
+            stats = self.stats[task_name] = {
+                'runs': 0, 'failures': 0, 'timeouts': 0,
+                'last_duration': 0.0, 'max_duration': 0.0,
+                'total_duration': 0.0, 'histogram': histogram}
+
+        stats[outcome] += 1
+        stats['last_duration'] = duration
+        stats['max_duration'] = max(stats['max_duration'], duration)
+        stats['total_duration'] += duration
+        for bound in DURATION_BUCKETS:
+            if duration <= bound:
+                stats['histogram'][_bucket_name(bound)] += 1
+                break
+        else:
+            stats['histogram']['le_inf'] += 1
+
+    def get_stats(self):
+        """Return the run statistics of each task that ran."""
+        result = {}
+        for task_name, stats in self.stats.iteritems():
+            result[task_name] = dict(stats,
+                                     histogram=dict(stats['histogram']),
+                                     running=task_name in self.running)
+        return result
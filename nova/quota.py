@@ -80,6 +80,11 @@ quota_opts = [
     cfg.StrOpt('quota_driver',
                default='nova.quota.DbQuotaDriver',
                help='default driver to use for quota checks'),
+    cfg.IntOpt('quota_limits_cache_ttl',
+               default=10,
+               help='number of seconds the quota limits of a project are '
+                    'cached for limit checks and reservations, 0 disables '
+                    'the cache'),
     ]
 
 CONF = cfg.CONF
@@ -93,6 +98,10 @@ class DbQuotaDriver(object):
     database.
     """
 
+    def __init__(self):
+        # (project_id, quota_class) -> (expires_at, {resource: limit})
+        self._limits_cache = {}
+
     def get_by_project(self, context, project_id, resource):
         """Get a specific quota by project."""
 
@@ -235,11 +244,54 @@ class DbQuotaDriver(object):
             raise exception.QuotaResourceUnknown(unknown=sorted(unknown))
 
         # Grab and return the quotas (without usages)
-        quotas = self.get_project_quotas(context, sub_resources,
-                                         project_id,
+        limits = self._get_limits(context, resources, project_id)
+
+        return dict((k, limits[k]) for k in sub_resources)
+
+    def _get_limits(self, context, resources, project_id):
+        """
+        Return the limits of all the resources for a project, served
+        from the limits cache while its entry has not expired.
+        """
+
+        if project_id is None:
+            project_id = context.project_id
+
+        ttl = CONF.quota_limits_cache_ttl
+        key = (project_id, context.quota_class)
+        now = timeutils.utcnow_ts()
+        if ttl > 0 and key in self._limits_cache:
+            expires_at, limits = self._limits_cache[key]
+            if now < expires_at and set(resources) <= set(limits):
+                return limits
+
+        quotas = self.get_project_quotas(context, resources, project_id,
                                          context.quota_class, usages=False)
+        limits = dict((k, v['limit']) for k, v in quotas.items())
+        if ttl > 0:
+            self._limits_cache[key] = (now + ttl, limits)
 
-        return dict((k, v['limit']) for k, v in quotas.items())
+        return limits
+
+    def invalidate_limits(self, project_id=None, quota_class=None):
+        """
+        Drop cached limits after quotas were changed.
+
+        :param project_id: Drop the limits cached for this project.
+        :param quota_class: Drop the limits cached for every project
+                            using this quota class.
+
+        If neither is given the whole cache is dropped.
+        """
+
+        if project_id is None and quota_class is None:
+            self._limits_cache.clear()
+            return
+
+        for key in self._limits_cache.keys():
+            if (project_id is not None and key[0] == project_id or
+                    quota_class is not None and key[1] == quota_class):
+                del self._limits_cache[key]
 
     def limit_check(self, context, resources, values, project_id=None):
         """Check simple quota limits.
@@ -424,6 +476,7 @@ class DbQuotaDriver(object):
         """
 
         db.quota_destroy_all_by_project(context, project_id)
+        self.invalidate_limits(project_id=project_id)
 
     def expire(self, context):
         """Expire reservations.
@@ -625,6 +678,16 @@ class NoopQuotaDriver(object):
         """
         pass
 
+    def invalidate_limits(self, project_id=None, quota_class=None):
+        """
+        Drop cached limits after quotas were changed.
+
+        :param project_id: Drop the limits cached for this project.
+        :param quota_class: Drop the limits cached for every project
+                            using this quota class.
+        """
+        pass
+
     def expire(self, context):
         """Expire reservations.
 
@@ -1039,6 +1102,20 @@ class QuotaEngine(object):
 
         self._driver.destroy_all_by_project(context, project_id)
 
+    def invalidate_limits(self, project_id=None, quota_class=None):
+        """
+        Drop cached limits after quotas were changed.
+
+        :param project_id: Drop the limits cached for this project.
+        :param quota_class: Drop the limits cached for every project
+                            using this quota class.
+
+        If neither is given all the cached limits are dropped.
+        """
+
+        self._driver.invalidate_limits(project_id=project_id,
+                                       quota_class=quota_class)
+
     def expire(self, context):
         """Expire reservations.
 
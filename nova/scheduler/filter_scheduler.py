@@ -19,6 +19,7 @@ You can customize this scheduler by specifying your own Host Filters and
 Weighing Functions.
 """
 
+import heapq
 import random
 
 from oslo.config import cfg
@@ -29,6 +30,7 @@ from nova.openstack.common import log as logging
 from nova.openstack.common.notifier import api as notifier
 from nova.scheduler import driver
 from nova.scheduler import scheduler_options
+from nova import weights
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
@@ -73,8 +75,12 @@ class FilterScheduler(driver.Scheduler):
         LOG.debug(_("Attempting to build %(num_instances)d instance(s)"),
                   {'num_instances': len(instance_uuids)})
 
+        db_round_trips = self.host_manager.db_round_trips
         weighed_hosts = self._schedule(context, request_spec,
                                        filter_properties, instance_uuids)
+        db_round_trips = self.host_manager.db_round_trips - db_round_trips
+        LOG.debug(_("Host selection took %(db_round_trips)d DB "
+                    "round-trip(s)"), {'db_round_trips': db_round_trips})
 
         # NOTE(comstud): Make sure we do not pass this through.  It
         # contains an instance of RpcContext that cannot be serialized.
@@ -107,6 +113,7 @@ class FilterScheduler(driver.Scheduler):
             retry = filter_properties.get('retry', {})
             retry['hosts'] = []
 
+        payload['db_round_trips'] = db_round_trips
         notifier.notify(context, notifier.publisher_id("scheduler"),
                         'scheduler.run_instance.end', notifier.INFO, payload)
 
@@ -333,6 +340,13 @@ class FilterScheduler(driver.Scheduler):
             num_instances = len(instance_uuids)
         else:
             num_instances = request_spec.get('num_instances', 1)
+
+        if (num_instances > 1 and not update_group_hosts and
+                self._weighers_are_per_host()):
+            return self._schedule_batch(hosts, num_instances,
+                                        filter_properties,
+                                        instance_properties)
+
         for num in xrange(num_instances):
             # Filter local hosts based on requirements ...
             hosts = self.host_manager.get_filtered_hosts(hosts,
@@ -346,11 +360,8 @@ class FilterScheduler(driver.Scheduler):
             weighed_hosts = self.host_manager.get_weighed_hosts(hosts,
                     filter_properties)
 
-            scheduler_host_subset_size = CONF.scheduler_host_subset_size
-            if scheduler_host_subset_size > len(weighed_hosts):
-                scheduler_host_subset_size = len(weighed_hosts)
-            if scheduler_host_subset_size < 1:
-                scheduler_host_subset_size = 1
+            scheduler_host_subset_size = self._host_subset_size(
+                    len(weighed_hosts))
 
             chosen_host = random.choice(
                 weighed_hosts[0:scheduler_host_subset_size])
@@ -365,6 +376,85 @@ class FilterScheduler(driver.Scheduler):
                 filter_properties['group_hosts'].append(chosen_host.obj.host)
         return selected_hosts
 
+    def _host_subset_size(self, num_hosts):
+        """Return the number of best hosts to randomly choose from."""
+        scheduler_host_subset_size = CONF.scheduler_host_subset_size
+        if scheduler_host_subset_size > num_hosts:
+            scheduler_host_subset_size = num_hosts
+        if scheduler_host_subset_size < 1:
+            scheduler_host_subset_size = 1
+        return scheduler_host_subset_size
+
+    def _weighers_are_per_host(self):
+        """Return True if each host's weight only depends on that host.
+
+        This is the case unless a weigher overrides weigh_objects() to
+        weigh hosts relative to each other.
+        """
+        base_weigh_objects = weights.BaseWeigher.weigh_objects.im_func
+        for weigher_cls in self.host_manager.weight_classes:
+            if weigher_cls.weigh_objects.im_func is not base_weigh_objects:
+                return False
+        return True
+
+    def _schedule_batch(self, hosts, num_instances, filter_properties,
+                        instance_properties):
+        """Select hosts for several instances, filtering and weighing all
+        hosts only once.
+
+        Consuming resources for an instance only changes the filter result
+        and weight of the host it was placed on, so only that host is
+        filtered and weighed again before the next selection.  The
+        weighed hosts are kept in a heap ordered like the sorted list
+        _schedule() would use, so the placements are the same.
+        """
+        hosts = self.host_manager.get_filtered_hosts(hosts,
+                filter_properties)
+        if not hosts:
+            return []
+        LOG.debug(_("Filtered %(hosts)s"), {'hosts': hosts})
+
+        # Equal weights are ordered by the position of the host in the
+        # filtered list, like the stable sort of the weight handler.
+        positions = dict((id(host), pos) for pos, host in enumerate(hosts))
+        heap = [(-weighed_host.weight, positions[id(weighed_host.obj)],
+                 weighed_host)
+                for weighed_host in self.host_manager.get_weighed_hosts(
+                    hosts, filter_properties)]
+        heapq.heapify(heap)
+
+        selected_hosts = []
+        for num in xrange(num_instances):
+            if not heap:
+                # Can't get any more locally.
+                break
+
+            scheduler_host_subset_size = self._host_subset_size(len(heap))
+            best_hosts = [heapq.heappop(heap)
+                          for i in xrange(scheduler_host_subset_size)]
+            chosen = random.choice(best_hosts)
+            for entry in best_hosts:
+                if entry is not chosen:
+                    heapq.heappush(heap, entry)
+
+            chosen_host = chosen[2]
+            LOG.debug(_("Choosing host %(chosen_host)s"),
+                      {'chosen_host': chosen_host})
+            selected_hosts.append(chosen_host)
+
+            # Now consume the resources and re-evaluate the chosen host
+            # for the next instance.
+            chosen_host.obj.consume_from_instance(instance_properties)
+            if num == num_instances - 1:
+                break
+            if self.host_manager.get_filtered_hosts([chosen_host.obj],
+                                                    filter_properties):
+                weighed_host = self.host_manager.get_weighed_hosts(
+                        [chosen_host.obj], filter_properties)[0]
+                heapq.heappush(heap, (-weighed_host.weight, chosen[1],
+                                      weighed_host))
+        return selected_hosts
+
     def _assert_compute_node_has_enough_memory(self, context,
                                               instance_ref, dest):
         """Checks if destination host has enough memory for live migration.
@@ -0,0 +1,36 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Utility methods shared by scheduler host filters."""
+
+from nova import db
+
+
+def aggregate_metadata_get_by_host(context, host_state, key=None):
+    """Return the aggregate metadata for a host as a dict of sets.
+
+    Uses the metadata the HostManager prefetched for the whole scheduling
+    request when it is available, and only falls back to a DB query for
+    HostStates that were built outside of get_all_host_states().
+    """
+    metadata = getattr(host_state, 'aggregate_metadata', None)
+    if metadata is None:
+        return db.aggregate_metadata_get_by_host(context.elevated(),
+                                                 host_state.host, key=key)
+    if key is None:
+        return metadata
+    if key in metadata:
+        return {key: metadata[key]}
+    return {}
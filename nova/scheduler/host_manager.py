@@ -28,6 +28,7 @@ from nova import exception
 from nova.openstack.common import log as logging
 from nova.openstack.common import timeutils
 from nova.scheduler import filters
+from nova.scheduler import vectorized
 from nova.scheduler import weights
 
 host_manager_opts = [
@@ -51,6 +52,22 @@ host_manager_opts = [
     cfg.ListOpt('scheduler_weight_classes',
                 default=['nova.scheduler.weights.all_weighers'],
                 help='Which weight class names to use for weighing hosts'),
+    cfg.BoolOpt('scheduler_incremental_host_sync',
+                default=False,
+                help='Keep host states cached between requests and only '
+                     'load the compute nodes that changed since the last '
+                     'sync, instead of reloading all of them each time'),
+    cfg.IntOpt('scheduler_full_host_sync_interval',
+               default=300,
+               help='Interval in seconds between full reloads of the '
+                    'cached host states when '
+                    'scheduler_incremental_host_sync is enabled'),
+    cfg.BoolOpt('scheduler_vectorized_filters',
+                default=False,
+                help='Run RamFilter, CoreFilter, DiskFilter, '
+                     'NumInstancesFilter, IoOpsFilter and the RAM weigher '
+                     'as batched array operations over all hosts. '
+                     'Requires NumPy'),
     ]
 
 CONF = cfg.CONF
@@ -127,6 +144,11 @@ class HostState(object):
         # Resource oversubscription values for the compute host:
         self.limits = {}
 
+        # Metadata of the aggregates this host belongs to, as a dict of
+        # sets keyed by metadata key.  Prefetched for all hosts by the
+        # HostManager once per request; None means it was not loaded.
+        self.aggregate_metadata = None
+
         self.updated = None
 
     def update_capabilities(self, capabilities=None, service=None):
@@ -266,6 +288,18 @@ class HostManager(object):
         self.weight_handler = weights.HostWeightHandler()
         self.weight_classes = self.weight_handler.get_matching_classes(
                 CONF.scheduler_weight_classes)
+        # Number of DB round-trips made to build host states, for
+        # measuring the cost of a scheduling request.
+        self.db_round_trips = 0
+        # Times of the last host state syncs with the DB.
+        self.last_sync = None
+        self.last_full_sync = None
+        self.use_vectorized = CONF.scheduler_vectorized_filters
+        if self.use_vectorized and not vectorized.is_available():
+            LOG.warn(_("scheduler_vectorized_filters is enabled but NumPy "
+                       "is not available, falling back to regular "
+                       "filtering"))
+            self.use_vectorized = False
 
     def _choose_host_filters(self, filter_cls_names):
         """Since the caller may specify which filters to use we need
@@ -338,11 +372,17 @@ class HostManager(object):
                     return name_to_cls_map.values()
             hosts = name_to_cls_map.itervalues()
 
+        if self.use_vectorized:
+            return vectorized.get_filtered_hosts(self.filter_handler,
+                    filter_classes, hosts, filter_properties)
         return self.filter_handler.get_filtered_objects(filter_classes,
                 hosts, filter_properties)
 
     def get_weighed_hosts(self, hosts, weight_properties):
         """Weigh the hosts."""
+        if self.use_vectorized:
+            return vectorized.get_weighed_hosts(self.weight_handler,
+                    self.weight_classes, hosts, weight_properties)
         return self.weight_handler.get_weighed_objects(self.weight_classes,
                 hosts, weight_properties)
 
@@ -362,14 +402,45 @@ class HostManager(object):
         capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
         self.service_states[state_key] = capab_copy
 
+        # Cached host states may not be reloaded from the db on the next
+        # request, so pick up the new capabilities right away.
+        host_state = self.host_state_map.get(state_key)
+        if host_state:
+            host_state.update_capabilities(capab_copy,
+                                           dict(host_state.service))
+
+    def _full_sync_needed(self):
+        """Return True if all compute nodes have to be reloaded."""
+        if not CONF.scheduler_incremental_host_sync:
+            return True
+        if self.last_full_sync is None:
+            return True
+        return timeutils.is_older_than(self.last_full_sync,
+                                       CONF.scheduler_full_host_sync_interval)
+
     def get_all_host_states(self, context):
         """Returns a list of HostStates that represents all the hosts
         the HostManager knows about. Also, each of the consumable resources
         in HostState are pre-populated and adjusted based on data in the db.
+
+        With scheduler_incremental_host_sync enabled, only compute nodes
+        whose record changed since the last sync are reloaded, and a full
+        reload happens every scheduler_full_host_sync_interval seconds.
         """
 
+        sync_started = timeutils.utcnow()
+        full_sync = self._full_sync_needed()
+
         # Get resource usage across the available compute nodes:
-        compute_nodes = db.compute_node_get_all(context)
+        if full_sync:
+            compute_nodes = db.compute_node_get_all(context)
+        else:
+            compute_nodes = db.compute_node_get_all_changed_since(context,
+                    self.last_sync)
+        # Load aggregate membership and metadata for all hosts at once so
+        # the aggregate filters don't need to query per host:
+        aggregate_metadata = db.aggregate_host_metadata_get_all(context)
+        self.db_round_trips += 2
         seen_nodes = set()
         for compute in compute_nodes:
             service = compute['service']
@@ -392,12 +463,21 @@ class HostManager(object):
             host_state.update_from_compute_node(compute)
             seen_nodes.add(state_key)
 
-        # remove compute nodes from host_state_map if they are not active
-        dead_nodes = set(self.host_state_map.keys()) - seen_nodes
-        for state_key in dead_nodes:
-            host, node = state_key
-            LOG.info(_("Removing dead compute node %(host)s:%(node)s "
-                       "from scheduler") % locals())
-            del self.host_state_map[state_key]
+        # remove compute nodes from host_state_map if they are not active.
+        # NOTE: deleted compute nodes are only noticed by a full sync; until
+        # then their service stops reporting and ComputeFilter skips them.
+        if full_sync:
+            dead_nodes = set(self.host_state_map.keys()) - seen_nodes
+            for state_key in dead_nodes:
+                host, node = state_key
+                LOG.info(_("Removing dead compute node %(host)s:%(node)s "
+                           "from scheduler") % locals())
+                del self.host_state_map[state_key]
+            self.last_full_sync = sync_started
+        self.last_sync = sync_started
+
+        for host_state in self.host_state_map.itervalues():
+            host_state.aggregate_metadata = aggregate_metadata.get(
+                    host_state.host, {})
 
         return self.host_state_map.itervalues()
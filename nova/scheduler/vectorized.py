@@ -0,0 +1,184 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Vectorized resource filtering and weighing.
+
+Loads the resource figures of all candidate hosts into NumPy arrays, so
+that RamFilter, CoreFilter, DiskFilter, NumInstancesFilter, IoOpsFilter
+and the RAMWeigher run as batched array operations instead of once per
+HostState.  The hosts passing and their order are the same as with the
+regular filter and weigher classes.
+"""
+
+import operator
+
+from oslo.config import cfg
+
+from nova.openstack.common import importutils
+from nova.openstack.common import log as logging
+from nova.scheduler.filters import core_filter
+from nova.scheduler.filters import disk_filter
+from nova.scheduler.filters import io_ops_filter
+from nova.scheduler.filters import num_instances_filter
+from nova.scheduler.filters import ram_filter
+from nova.scheduler.weights import ram
+
+numpy = importutils.try_import('numpy')
+
+CONF = cfg.CONF
+
+LOG = logging.getLogger(__name__)
+
+
+def is_available():
+    """Return True if NumPy could be imported."""
+    return numpy is not None
+
+
+class HostColumns(object):
+    """Columnar view of the consumable resources of a list of hosts."""
+
+    columns = ('free_ram_mb', 'total_usable_ram_mb', 'free_disk_mb',
+               'total_usable_disk_gb', 'vcpus_total', 'vcpus_used',
+               'num_instances', 'num_io_ops')
+
+    def __init__(self, host_states):
+        self.host_states = list(host_states)
+        get_columns = operator.attrgetter(*self.columns)
+        table = numpy.array([get_columns(host_state)
+                             for host_state in self.host_states],
+                            dtype=numpy.float64)
+        table = table.reshape((len(self.host_states), len(self.columns)))
+        for index, name in enumerate(self.columns):
+            setattr(self, name, table[:, index])
+
+    def __len__(self):
+        return len(self.host_states)
+
+
+# Each of the following returns a boolean mask of the hosts passing the
+# filter, and a dict of oversubscription limit arrays to store on them.
+
+def _ram_filter(columns, instance_type):
+    total_usable_ram_mb = columns.total_usable_ram_mb
+    memory_mb_limit = total_usable_ram_mb * CONF.ram_allocation_ratio
+    used_ram_mb = total_usable_ram_mb - columns.free_ram_mb
+    usable_ram = memory_mb_limit - used_ram_mb
+    passes = usable_ram >= instance_type['memory_mb']
+    return passes, {'memory_mb': (memory_mb_limit, passes)}
+
+
+def _core_filter(columns, instance_type):
+    vcpus_total = columns.vcpus_total * CONF.cpu_allocation_ratio
+    # Hosts without a VCPU count always pass, see CoreFilter.
+    passes = numpy.logical_or(
+            columns.vcpus_total == 0,
+            (vcpus_total - columns.vcpus_used) >= instance_type['vcpus'])
+    return passes, {'vcpu': (vcpus_total, vcpus_total > 0)}
+
+
+def _disk_filter(columns, instance_type):
+    requested_disk = 1024 * (instance_type['root_gb'] +
+                             instance_type['ephemeral_gb'])
+    total_usable_disk_mb = columns.total_usable_disk_gb * 1024
+    disk_mb_limit = total_usable_disk_mb * CONF.disk_allocation_ratio
+    used_disk_mb = total_usable_disk_mb - columns.free_disk_mb
+    usable_disk_mb = disk_mb_limit - used_disk_mb
+    passes = usable_disk_mb >= requested_disk
+    return passes, {'disk_gb': (disk_mb_limit / 1024, passes)}
+
+
+def _num_instances_filter(columns, instance_type):
+    return columns.num_instances < CONF.max_instances_per_host, {}
+
+
+def _io_ops_filter(columns, instance_type):
+    return columns.num_io_ops < CONF.max_io_ops_per_host, {}
+
+
+VECTORIZED_FILTERS = {
+    ram_filter.RamFilter: _ram_filter,
+    core_filter.CoreFilter: _core_filter,
+    disk_filter.DiskFilter: _disk_filter,
+    num_instances_filter.NumInstancesFilter: _num_instances_filter,
+    io_ops_filter.IoOpsFilter: _io_ops_filter,
+}
+
+
+def get_filtered_hosts(filter_handler, filter_classes, hosts,
+                       filter_properties):
+    """Filter hosts, running the supported filters as array operations.
+
+    The remaining filter classes are then run by the filter handler on
+    the hosts that passed, preserving their relative order.
+    """
+    instance_type = filter_properties.get('instance_type')
+    vectorized = [cls for cls in filter_classes
+                  if cls in VECTORIZED_FILTERS]
+    if not instance_type or not vectorized:
+        return filter_handler.get_filtered_objects(filter_classes, hosts,
+                                                   filter_properties)
+    others = [cls for cls in filter_classes
+              if cls not in VECTORIZED_FILTERS]
+
+    columns = HostColumns(hosts)
+    passes = numpy.ones(len(columns), dtype=bool)
+    limits = {}
+    for filter_cls in vectorized:
+        filter_passes, filter_limits = VECTORIZED_FILTERS[filter_cls](
+                columns, instance_type)
+        LOG.debug(_("%(filter)s rejected %(count)d host(s)"),
+                  {'filter': filter_cls.__name__,
+                   'count': numpy.count_nonzero(passes & ~filter_passes)})
+        passes &= filter_passes
+        limits.update(filter_limits)
+
+    indexes = numpy.flatnonzero(passes)
+    host_states = columns.host_states
+    hosts = [host_states[index] for index in indexes.tolist()]
+    for key, (values, is_set) in limits.iteritems():
+        is_set = is_set[indexes].tolist()
+        for host_state, value, set_limit in zip(hosts,
+                                                values[indexes].tolist(),
+                                                is_set):
+            if set_limit:
+                host_state.limits[key] = value
+
+    return filter_handler.get_filtered_objects(others, hosts,
+                                               filter_properties)
+
+
+def get_weighed_hosts(weight_handler, weigher_classes, hosts,
+                      weight_properties):
+    """Weigh hosts with array operations if only the RAMWeigher is used.
+
+    Otherwise the weight handler weighs the hosts as usual.
+    """
+    if list(weigher_classes) != [ram.RAMWeigher]:
+        return weight_handler.get_weighed_objects(weigher_classes, hosts,
+                                                  weight_properties)
+    columns = HostColumns(hosts)
+    if not len(columns):
+        return []
+    weights = 0.0 + CONF.ram_weight_multiplier * columns.free_ram_mb
+    # A stable sort on the negated weights keeps hosts with equal weights
+    # in their original order, just like sorted(..., reverse=True).
+    order = numpy.argsort(-weights, kind='mergesort')
+    host_states = columns.host_states
+    weighed_obj = weight_handler.object_class
+    return [weighed_obj(host_states[index], weight)
+            for index, weight in zip(order.tolist(),
+                                     weights[order].tolist())]
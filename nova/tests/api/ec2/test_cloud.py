@@ -44,12 +44,14 @@ from nova import exception
 from nova.image import s3
 from nova.network import api as network_api
 from nova.network import quantumv2
+from nova.openstack.common import jsonutils
 from nova.openstack.common import log as logging
 from nova.openstack.common import rpc
 from nova import test
 from nova.tests.api.openstack.compute.contrib import (
     test_quantum_security_groups as test_quantum)
 from nova.tests import fake_network
+from nova.tests import fake_policy
 from nova.tests.image import fake
 from nova.tests import matchers
 from nova import utils
@@ -824,6 +826,33 @@ class CloudTestCase(test.TestCase):
         db.service_destroy(self.context, comp1['id'])
         db.service_destroy(self.context, comp2['id'])
 
+    def test_describe_instances_non_admin(self):
+        # Owners describe their instances under the default policy rule.
+        rules = jsonutils.loads(fake_policy.policy_data)
+        del rules['compute:get_all_instance_metadata']
+        rules['admin_or_owner'] = 'is_admin:True or project_id:%(project_id)s'
+        rules['default'] = 'rule:admin_or_owner'
+        self.policy.set_rules(rules)
+        self._stub_instance_get_with_fixed_ips('get_all')
+
+        ctxt = context.RequestContext(self.user_id, self.project_id)
+        image_uuid = 'cedef40a-ed67-4d10-800e-17455edce175'
+        sys_meta = instance_types.save_instance_type_info(
+            {}, instance_types.get_instance_type(1))
+        inst = db.instance_create(self.context,
+                {'reservation_id': 'a', 'image_ref': image_uuid,
+                 'instance_type_id': 1, 'host': 'host1',
+                 'project_id': self.project_id, 'vm_state': 'active',
+                 'system_metadata': sys_meta, 'metadata': {'foo': 'bar'}})
+
+        result = self.cloud.describe_instances(ctxt)
+        result = result['reservationSet'][0]['instancesSet']
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]['tagSet'], [{'key': 'foo',
+                                                'value': 'bar'}])
+
+        db.instance_destroy(self.context, inst['uuid'])
+
     def test_describe_instances_all_invalid(self):
         # Makes sure describe_instances works and filters results.
         self.flags(use_ipv6=True)
@@ -836,6 +865,62 @@ class CloudTestCase(test.TestCase):
                           self.cloud.describe_instances, self.context,
                           instance_id=[instance_id])
 
+    def test_describe_instances_batched_lookups(self):
+        # Makes sure instances are formatted without per instance lookups.
+        self._stub_instance_get_with_fixed_ips('get_all')
+
+        image_uuid = 'cedef40a-ed67-4d10-800e-17455edce175'
+        sys_meta = instance_types.save_instance_type_info(
+            {}, instance_types.get_instance_type(1))
+        instances = []
+        for host in ('host1', 'host2', 'host2'):
+            instances.append(db.instance_create(self.context,
+                    {'reservation_id': 'a', 'image_ref': image_uuid,
+                     'instance_type_id': 1, 'host': host,
+                     'vm_state': 'active', 'system_metadata': sys_meta,
+                     'metadata': {'host': host}}))
+        agg = db.aggregate_create(self.context,
+                {'name': 'agg1'}, {'availability_zone': 'zone1'})
+        db.aggregate_host_add(self.context, agg['id'], 'host1')
+
+        def fail(*args, **kwargs):
+            self.fail('instances should not be looked up one at a time')
+
+        self.stubs.Set(db, 'block_device_mapping_get_all_by_instance', fail)
+        self.stubs.Set(db, 'get_ec2_instance_id_by_uuid', fail)
+        self.stubs.Set(db, 'aggregate_metadata_get_by_host', fail)
+        self.stubs.Set(self.cloud.compute_api, 'get_instance_metadata', fail)
+        ec2utils.reset_cache()
+
+        get_all = self.cloud.compute_api.get_all
+        joins = []
+
+        def fake_get_all(*args, **kwargs):
+            joins.append(kwargs.get('columns_to_join'))
+            return get_all(*args, **kwargs)
+
+        self.stubs.Set(self.cloud.compute_api, 'get_all', fake_get_all)
+
+        result = self.cloud.describe_instances(self.context)
+        result = result['reservationSet'][0]['instancesSet']
+        self.assertEqual(len(result), 3)
+        self.assertEqual([['info_cache', 'security_groups',
+                           'system_metadata']], joins)
+        for inst, formatted in zip(instances, result):
+            self.assertEqual(formatted['instanceId'],
+                    ec2utils.id_to_ec2_id(
+                        db.get_ec2_instance_ids_by_uuids(
+                            self.context, [inst['uuid']])[inst['uuid']]))
+            zone = 'zone1' if inst['host'] == 'host1' else 'nova'
+            self.assertEqual(formatted['placement']['availabilityZone'],
+                             zone)
+            self.assertEqual(formatted['tagSet'],
+                             [{'key': 'host', 'value': inst['host']}])
+            self.assertEqual(formatted['rootDeviceType'], 'instance-store')
+
+        for inst in instances:
+            db.instance_destroy(self.context, inst['uuid'])
+
     def test_describe_instances_with_filters(self):
         # Makes sure describe_instances works and filters results.
         filters = {'filter': [{'name': 'test',
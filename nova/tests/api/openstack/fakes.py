@@ -423,7 +423,8 @@ def stub_instance(id, user_id=None, project_id=None, host=None,
                   include_fake_metadata=True, config_drive=None,
                   power_state=None, nw_cache=None, metadata=None,
                   security_groups=None, root_device_name=None,
-                  limit=None, marker=None):
+                  limit=None, marker=None, columns_to_join=None,
+                  columns=None):
 
     if user_id is None:
         user_id = 'fake_user'
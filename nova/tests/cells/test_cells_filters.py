@@ -0,0 +1,65 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Unit Tests for cells scheduler filters.
+"""
+
+from nova.cells import filters
+from nova.cells import state
+from nova import test
+
+INSTANCE_TYPE = {'memory_mb': 1024, 'root_gb': 10, 'ephemeral_gb': 0}
+
+
+def _cell(name, ram_units=None, disk_units=None):
+    cell = state.CellState(name)
+    if ram_units is not None:
+        cell.update_capacities(
+                {'ram_free': {'total_mb': 1024 * ram_units,
+                              'units_by_mb': {'1024': ram_units}},
+                 'disk_free': {'total_mb': 10240 * disk_units,
+                               'units_by_mb': {'10240': disk_units}}})
+    return cell
+
+
+class CellsFiltersTestCase(test.TestCase):
+    def setUp(self):
+        super(CellsFiltersTestCase, self).setUp()
+        self.filter_handler = filters.CellFilterHandler()
+        self.filter_classes = self.filter_handler.get_matching_classes(
+                ['nova.cells.filters.all_filters'])
+
+    def _filter(self, cells, request_spec):
+        filter_properties = {'request_spec': request_spec}
+        return self.filter_handler.get_filtered_objects(self.filter_classes,
+                cells, filter_properties)
+
+    def test_all_filters(self):
+        class_names = [cls.__name__ for cls in self.filter_classes]
+        self.assertIn('CapacityFilter', class_names)
+
+    def test_capacity_filter(self):
+        cells = [_cell('full', 1, 10), _cell('no-disk', 10, 1),
+                 _cell('room', 2, 2), _cell('unknown')]
+        request_spec = {'instance_type': INSTANCE_TYPE,
+                        'instance_uuids': ['uuid1', 'uuid2']}
+        self.assertEqual(['room', 'unknown'],
+                         [cell.name for cell in self._filter(cells,
+                                                             request_spec)])
+
+    def test_capacity_filter_without_instance_type(self):
+        cells = [_cell('full', 0, 0)]
+        request_spec = {'instance_uuids': ['uuid1']}
+        self.assertEqual(cells, self._filter(cells, request_spec))
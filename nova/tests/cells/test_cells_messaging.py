@@ -1130,6 +1130,90 @@ class CellsBroadcastMethodsTestCase(test.TestCase):
         self.src_msg_runner.bw_usage_update_at_top(self.ctxt,
                                                    fake_bw_update_info)
 
+    def _stub_batching(self):
+        timers = []
+
+        class FakeTimer(object):
+            def __init__(self):
+                self.cancelled = False
+
+            def cancel(self):
+                self.cancelled = True
+
+        def fake_spawn_after(seconds, func):
+            timers.append(FakeTimer())
+            return timers[-1]
+
+        self.stubs.Set(messaging.greenthread, 'spawn_after',
+                       fake_spawn_after)
+        self.flags(message_batch_window=1, group='cells')
+
+        calls = []
+
+        def _record(method_name):
+            def fake_method(message, **kwargs):
+                calls.append((method_name, kwargs))
+            return fake_method
+
+        for method_name in messaging._BATCHED_METHODS:
+            fakes.stub_bcast_method(self, 'api-cell', method_name,
+                                    _record(method_name))
+        return timers, calls
+
+    def test_batch_at_top(self):
+        timers, calls = self._stub_batching()
+        self.flags(message_compress_threshold=0, group='cells')
+        bw_update_info = {'uuid': 'uuid1', 'mac': 'mac1',
+                          'start_period': 'start_period', 'bw_in': 1}
+        fault = {'instance_uuid': 'uuid1', 'code': 500}
+
+        msg_runner = self.src_msg_runner
+        msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'uuid1', 'vm_state': 'building'})
+        msg_runner.bw_usage_update_at_top(self.ctxt, bw_update_info)
+        msg_runner.instance_update_at_top(self.ctxt,
+                {'uuid': 'uuid1', 'vm_state': 'active'})
+        msg_runner.instance_fault_create_at_top(self.ctxt, fault)
+        msg_runner.instance_destroy_at_top(self.ctxt, {'uuid': 'uuid2'})
+        self.assertEqual(len(timers), 1)
+        self.assertEqual(calls, [])
+
+        msg_runner._flush_batch()
+        self.assertTrue(timers[0].cancelled)
+        self.assertEqual(calls,
+                [('bw_usage_update_at_top',
+                  {'bw_update_info': bw_update_info}),
+                 ('instance_update_at_top',
+                  {'instance': {'uuid': 'uuid1', 'vm_state': 'active'}}),
+                 ('instance_fault_create_at_top', {'instance_fault': fault}),
+                 ('instance_destroy_at_top',
+                  {'instance': {'uuid': 'uuid2'}})])
+        self.assertEqual(msg_runner.batch_stats['messages'], 5)
+        self.assertEqual(msg_runner.batch_stats['deduplicated'], 1)
+        self.assertEqual(msg_runner.batch_stats['batches'], 1)
+        self.assertEqual(msg_runner.batch_stats['bytes'],
+                         msg_runner.batch_stats['bytes_sent'])
+
+    def test_batch_at_top_compressed(self):
+        timers, calls = self._stub_batching()
+        self.flags(message_batch_max_size=2, message_compress_threshold=1,
+                   group='cells')
+        instances = [{'uuid': 'uuid%d' % i, 'display_description': 'x' * 1000}
+                     for i in xrange(2)]
+
+        msg_runner = self.src_msg_runner
+        for instance in instances:
+            msg_runner.instance_update_at_top(self.ctxt, instance)
+
+        # The batch was sent once full
+        self.assertEqual(len(timers), 1)
+        self.assertTrue(timers[0].cancelled)
+        self.assertEqual(calls,
+                [('instance_update_at_top', {'instance': instance})
+                 for instance in instances])
+        self.assertTrue(msg_runner.batch_stats['bytes_sent'] <
+                        msg_runner.batch_stats['bytes'])
+
     def test_sync_instances(self):
         # Reset this, as this is a broadcast down.
         self._setup_attrs(up=False)
@@ -146,6 +146,48 @@ class CellsSchedulerTestCase(test.TestCase):
         self.assertEqual(self.request_spec, call_info['request_spec'])
         self.assertEqual(host_sched_kwargs, call_info['host_sched_kwargs'])
 
+    def test_run_instance_weighs_cells_by_capacity(self):
+        self.request_spec['instance_type'] = {'memory_mb': 1024,
+                                              'root_gb': 10,
+                                              'ephemeral_gb': 0}
+        # Units of RAM and disk free for the instance type by cell
+        units = {'child-cell1': (2, 10),
+                 'child-cell2': (4, 10),
+                 'child-cell3': (10, 1)}
+        for cell in self.state_manager.get_child_cells():
+            cell.capacities = {}
+            if cell.name in units:
+                ram_units, disk_units = units[cell.name]
+                cell.capacities = {
+                        'ram_free': {'total_mb': ram_units * 1024,
+                                     'units_by_mb': {'1024': ram_units}},
+                        'disk_free': {'total_mb': disk_units * 10240,
+                                      'units_by_mb': {'10240': disk_units}}}
+
+        target_cells = []
+        orig_fn = self.msg_runner.schedule_run_instance
+
+        def msg_runner_schedule_run_instance(ctxt, target_cell,
+                host_sched_kwargs):
+            if target_cell.is_me:
+                return orig_fn(ctxt, target_cell, host_sched_kwargs)
+            target_cells.append(target_cell.name)
+
+        self.stubs.Set(self.msg_runner, 'schedule_run_instance',
+                msg_runner_schedule_run_instance)
+
+        host_sched_kwargs = {'request_spec': self.request_spec}
+        for i in xrange(2):
+            self.msg_runner.schedule_run_instance(self.ctxt,
+                    self.my_cell_state, host_sched_kwargs)
+
+        # child-cell1 and child-cell3 can't hold 3 instances, and
+        # child-cell2 can't anymore after the first request
+        self.assertEqual(['child-cell2', 'child-cell4'], target_cells)
+        child_cell2 = self.state_manager.get_child_cell('child-cell2')
+        self.assertEqual(1, child_cell2.get_free_units(
+                self.request_spec['instance_type']))
+
     def test_run_instance_retries_when_no_cells_avail(self):
         self.flags(scheduler_retries=7, group='cells')
 
@@ -126,3 +126,46 @@ class TestCellsStateManager(test.TestCase):
         mgr = state.CellStateManager()
         my_state = mgr.get_my_state()
         return my_state.capacities
+
+    def test_capacity_incremental(self):
+        self.flags(reserve_percent=0.0, incremental_capacity_sync=True,
+                   group='cells')
+        mgr = state.CellStateManager()
+        full_cap = mgr.get_my_state().capacities
+
+        def _changed_since(context, changes_since):
+            nodes = _fake_compute_node_get_all(context)
+            # host3 is full now, and host4 is disabled
+            nodes[2]['free_ram_mb'] = 0
+            nodes[2]['free_disk_gb'] = 0
+            nodes[3]['service']['disabled'] = True
+            return nodes[2:]
+
+        def _not_called(context):
+            self.fail('Only the changed compute nodes should be loaded')
+
+        self.stubs.Set(db, 'compute_node_get_all_changed_since',
+                       _changed_since)
+        self.stubs.Set(db, 'compute_node_get_all', _not_called)
+        self.stubs.Set(db, 'instance_type_get_all', _not_called)
+        mgr._update_our_capacity(None)
+        cap = mgr.get_my_state().capacities
+
+        self.assertEqual(full_cap['ram_free']['total_mb'] - 1024 - 300,
+                         cap['ram_free']['total_mb'])
+        self.assertEqual(full_cap['disk_free']['total_mb'] - 130 * 1024,
+                         cap['disk_free']['total_mb'])
+        self.assertEqual(0, cap['ram_free']['units_by_mb']['50'])
+        self.assertEqual(0, cap['disk_free']['units_by_mb'][str(25 * 1024)])
+
+    def test_consume_capacities(self):
+        self.flags(reserve_percent=0.0, group='cells')
+        my_state = state.CellStateManager().get_my_state()
+        instance_type = {'memory_mb': 50, 'root_gb': 12, 'ephemeral_gb': 13}
+        self.assertEqual(5, my_state.get_free_units(instance_type))
+
+        my_state.consume_capacities(instance_type, 2)
+        cap = my_state.capacities
+        self.assertEqual(3, my_state.get_free_units(instance_type))
+        self.assertEqual(sum(compute[3] for compute in FAKE_COMPUTES) - 100,
+                         cap['ram_free']['total_mb'])
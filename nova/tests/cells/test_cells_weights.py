@@ -0,0 +1,72 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Unit Tests for cells scheduler weights.
+"""
+
+from nova.cells import state
+from nova.cells import weights
+from nova import test
+
+INSTANCE_TYPE = {'memory_mb': 1024, 'root_gb': 10, 'ephemeral_gb': 0}
+
+
+def _cell(name, ram_units, weight_offset=None):
+    cell = state.CellState(name)
+    cell.update_capacities(
+            {'ram_free': {'total_mb': 1024 * ram_units,
+                          'units_by_mb': {'1024': ram_units}}})
+    if weight_offset is not None:
+        cell.update_db_info({'weight_offset': weight_offset})
+    return cell
+
+
+class CellsWeightsTestCase(test.TestCase):
+    def setUp(self):
+        super(CellsWeightsTestCase, self).setUp()
+        self.weight_handler = weights.CellWeightHandler()
+
+    def _get_weighed_cells(self, class_names, cells):
+        weight_classes = self.weight_handler.get_matching_classes(
+                class_names)
+        weight_properties = {'request_spec': {
+                'instance_type': INSTANCE_TYPE}}
+        return self.weight_handler.get_weighed_objects(weight_classes,
+                cells, weight_properties)
+
+    def test_ram_by_instance_type(self):
+        cells = [_cell('small', 5), _cell('large', 50), _cell('none', 0)]
+        weighed_cells = self._get_weighed_cells(
+                ['nova.cells.weights.ram_by_instance_type.'
+                 'RamByInstanceTypeWeigher'], cells)
+        self.assertEqual(['large', 'small', 'none'],
+                         [weighed.obj.name for weighed in weighed_cells])
+        self.assertEqual(500.0, weighed_cells[0].weight)
+
+    def test_ram_by_instance_type_stacking(self):
+        self.flags(ram_weight_multiplier=-1.0, group='cells')
+        cells = [_cell('small', 5), _cell('large', 50)]
+        weighed_cells = self._get_weighed_cells(
+                ['nova.cells.weights.ram_by_instance_type.'
+                 'RamByInstanceTypeWeigher'], cells)
+        self.assertEqual('small', weighed_cells[0].obj.name)
+
+    def test_weight_offset(self):
+        cells = [_cell('large', 50), _cell('muted', 100, -1000000.0),
+                 _cell('preferred', 1, 1000.0)]
+        weighed_cells = self._get_weighed_cells(
+                ['nova.cells.weights.all_weighers'], cells)
+        self.assertEqual(['preferred', 'large', 'muted'],
+                         [weighed.obj.name for weighed in weighed_cells])
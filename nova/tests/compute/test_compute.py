@@ -3661,6 +3661,73 @@ class ComputeTestCase(BaseTestCase):
         self.assertEqual(len(instances), 1)
         self.assertEqual(instances[0]['task_state'], None)
 
+    def _stub_sync_power_states(self, db_instances):
+        synced = []
+
+        def fake_get_all_by_host(context, host, columns_to_join=None):
+            return db_instances
+
+        def fake_sync(context, db_instance, vm_power_state):
+            synced.append((db_instance['name'], vm_power_state))
+
+        self.stubs.Set(self.compute.conductor_api,
+                       'instance_get_all_by_host', fake_get_all_by_host)
+        self.stubs.Set(self.compute, '_sync_instance_power_state', fake_sync)
+        return synced
+
+    def test_sync_power_states_bulk(self):
+        db_instances = [
+            {'name': 'in-sync', 'task_state': None,
+             'vm_state': vm_states.ACTIVE,
+             'power_state': power_state.RUNNING},
+            {'name': 'stopped', 'task_state': None,
+             'vm_state': vm_states.ACTIVE,
+             'power_state': power_state.RUNNING},
+            {'name': 'shutdown', 'task_state': None,
+             'vm_state': vm_states.ACTIVE,
+             'power_state': power_state.SHUTDOWN},
+            {'name': 'gone', 'task_state': None,
+             'vm_state': vm_states.STOPPED,
+             'power_state': power_state.SHUTDOWN},
+            {'name': 'busy', 'task_state': task_states.REBOOTING,
+             'vm_state': vm_states.ACTIVE,
+             'power_state': power_state.RUNNING}]
+        synced = self._stub_sync_power_states(db_instances)
+        self.stubs.Set(self.compute.driver, 'get_power_states',
+                       lambda: {'in-sync': power_state.RUNNING,
+                                'stopped': power_state.SHUTDOWN,
+                                'shutdown': power_state.SHUTDOWN,
+                                'busy': power_state.RUNNING})
+
+        def fail(*args, **kwargs):
+            self.fail('get_info should not be called')
+
+        self.stubs.Set(self.compute.driver, 'get_info', fail)
+
+        self.compute._sync_power_states(context.get_admin_context())
+        self.assertEqual(synced, [('stopped', power_state.SHUTDOWN),
+                                  ('shutdown', power_state.SHUTDOWN),
+                                  ('gone', power_state.NOSTATE)])
+
+    def test_sync_power_states_without_bulk_listing(self):
+        db_instances = [
+            {'name': 'in-sync', 'task_state': None,
+             'vm_state': vm_states.ACTIVE,
+             'power_state': power_state.RUNNING}]
+        synced = self._stub_sync_power_states(db_instances)
+
+        def not_implemented():
+            raise NotImplementedError()
+
+        self.stubs.Set(self.compute.driver, 'get_power_states',
+                       not_implemented)
+        self.stubs.Set(self.compute.driver, 'get_num_instances', lambda: 1)
+        self.stubs.Set(self.compute.driver, 'get_info',
+                       lambda instance: {'state': power_state.RUNNING})
+
+        self.compute._sync_power_states(context.get_admin_context())
+        self.assertEqual(synced, [('in-sync', power_state.RUNNING)])
+
     def test_add_instance_fault(self):
         instance = self._create_fake_instance()
         exc_info = None
@@ -3852,80 +3919,79 @@ class ComputeTestCase(BaseTestCase):
 
     def test_heal_instance_info_cache(self):
         # Update on every call for the test
-        self.flags(heal_instance_info_cache_interval=-1)
+        self.flags(heal_instance_info_cache_interval=-1,
+                   heal_instance_info_cache_batch_size=2,
+                   heal_instance_info_cache_max_per_pass=3)
         ctxt = context.get_admin_context()
 
         instance_map = {}
         instances = []
         for x in xrange(5):
             uuid = 'fake-uuid-%s' % x
-            instance_map[uuid] = {'uuid': uuid, 'host': CONF.host}
+            instance_map[uuid] = {'uuid': uuid, 'host': CONF.host,
+                                  'info_cache': {'network_info': '[{}]'}}
             instances.append(instance_map[uuid])
+        # An instance with an empty cache is healed first
+        instances[4]['info_cache'] = None
 
-        call_info = {'get_all_by_host': 0, 'get_by_uuid': 0,
-                'get_nw_info': 0, 'expected_instance': None}
+        call_info = {'get_all_by_host': 0, 'get_all_by_filters': 0,
+                     'batches': []}
 
         def fake_instance_get_all_by_host(context, host, columns_to_join):
             call_info['get_all_by_host'] += 1
-            self.assertEqual(columns_to_join, [])
+            self.assertEqual(columns_to_join, ['info_cache'])
             return instances[:]
 
-        def fake_instance_get_by_uuid(context, instance_uuid):
-            if instance_uuid not in instance_map:
-                raise exception.InstanceNotFound(instance_id=instance_uuid)
-            call_info['get_by_uuid'] += 1
-            return instance_map[instance_uuid]
-
-        # NOTE(comstud): Override the stub in setUp()
-        def fake_get_instance_nw_info(context, instance):
-            # Note that this exception gets caught in compute/manager
-            # and is ignored.  However, the below increment of
-            # 'get_nw_info' won't happen, and you'll get an assert
-            # failure checking it below.
-            self.assertEqual(call_info['expected_instance'], instance)
-            call_info['get_nw_info'] += 1
+        def fake_instance_get_all_by_filters(context, filters,
+                                             columns_to_join):
+            call_info['get_all_by_filters'] += 1
+            self.assertEqual(filters['host'], self.compute.host)
+            self.assertFalse(filters['deleted'])
+            self.assertEqual(columns_to_join, ['system_metadata'])
+            return [instance_map[uuid] for uuid in filters['uuid']
+                    if uuid in instance_map and
+                    instance_map[uuid]['host'] == filters['host']]
+
+        def fake_get_instance_nw_info_batch(context, instances,
+                                            conductor_api=None):
+            call_info['batches'].append([inst['uuid'] for inst in instances])
+            return {}
 
         self.stubs.Set(self.compute.conductor_api, 'instance_get_all_by_host',
                 fake_instance_get_all_by_host)
-        self.stubs.Set(self.compute.conductor_api, 'instance_get_by_uuid',
-                fake_instance_get_by_uuid)
-        self.stubs.Set(self.compute, '_get_instance_nw_info',
-                fake_get_instance_nw_info)
-
-        call_info['expected_instance'] = instances[0]
-        self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(1, call_info['get_all_by_host'])
-        self.assertEqual(0, call_info['get_by_uuid'])
-        self.assertEqual(1, call_info['get_nw_info'])
+        self.stubs.Set(self.compute.conductor_api,
+                'instance_get_all_by_filters',
+                fake_instance_get_all_by_filters)
+        self.stubs.Set(self.compute.network_api, 'get_instance_nw_info_batch',
+                fake_get_instance_nw_info_batch)
 
-        call_info['expected_instance'] = instances[1]
         self.compute._heal_instance_info_cache(ctxt)
         self.assertEqual(1, call_info['get_all_by_host'])
-        self.assertEqual(1, call_info['get_by_uuid'])
-        self.assertEqual(2, call_info['get_nw_info'])
+        self.assertEqual(1, call_info['get_all_by_filters'])
+        self.assertEqual(call_info['batches'],
+                         [['fake-uuid-4', 'fake-uuid-0'], ['fake-uuid-1']])
 
         # Make an instance switch hosts
         instances[2]['host'] = 'not-me'
-        # Make an instance disappear
-        instance_map.pop(instances[3]['uuid'])
-        # '2' and '3' should be skipped..
-        call_info['expected_instance'] = instances[4]
+        # Make an instance moved here by a migration stale
+        self.compute._mark_info_cache_stale(instances[1])
+        call_info['batches'] = []
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(call_info['get_all_by_host'], 1)
-        # Incremented for '2' and '4'.. '3' caused a raise above.
-        self.assertEqual(call_info['get_by_uuid'], 3)
-        self.assertEqual(call_info['get_nw_info'], 3)
+        self.assertEqual(1, call_info['get_all_by_host'])
+        self.assertEqual(2, call_info['get_all_by_filters'])
+        # '2' is skipped..
+        self.assertEqual(call_info['batches'],
+                         [['fake-uuid-1', 'fake-uuid-3']])
         # Should be no more left.
         self.assertEqual(len(self.compute._instance_uuids_to_heal), 0)
 
-        # This should cause a DB query now so we get first instance
+        # This should cause a DB query now so we get the instances
         # back again
-        call_info['expected_instance'] = instances[0]
+        call_info['batches'] = []
         self.compute._heal_instance_info_cache(ctxt)
-        self.assertEqual(call_info['get_all_by_host'], 2)
-        # Stays the same, because the instance came from the DB
-        self.assertEqual(call_info['get_by_uuid'], 3)
-        self.assertEqual(call_info['get_nw_info'], 4)
+        self.assertEqual(2, call_info['get_all_by_host'])
+        self.assertEqual(call_info['batches'],
+                         [['fake-uuid-4', 'fake-uuid-0'], ['fake-uuid-1']])
 
     def test_poll_rescued_instances(self):
         timed_out_time = timeutils.utcnow() - datetime.timedelta(minutes=5)
@@ -87,6 +87,50 @@ class ConsoleauthTestCase(test.TestCase):
         for token in tokens:
             self.assertFalse(self.manager.check_token(self.context, token))
 
+    def test_instance_tokens_expire(self):
+        self.useFixture(test.TimeOverride())
+        self.flags(console_token_ttl=10)
+        instance = u"12345"
+
+        self.manager.authorize_console(self.context, u"token0", 'novnc',
+                                       '127.0.0.1', '8080', 'host',
+                                       instance)
+        timeutils.advance_time_seconds(5)
+        self.manager.authorize_console(self.context, u"token1", 'novnc',
+                                       '127.0.0.1', '8080', 'host',
+                                       instance)
+        self.assertEqual(2,
+                len(self.manager._get_tokens_for_instance(instance)))
+
+        timeutils.advance_time_seconds(5)
+        self.manager.authorize_console(self.context, u"token2", 'novnc',
+                                       '127.0.0.1', '8080', 'host',
+                                       instance)
+        stored_tokens = self.manager._get_tokens_for_instance(instance)
+        self.assertEqual([u"token1", u"token2"],
+                         [token for (token, _expires) in stored_tokens])
+
+        timeutils.advance_time_seconds(10)
+        self.assertEqual([], self.manager._get_tokens_for_instance(instance))
+
+    def test_tokens_per_instance_limit(self):
+        self.flags(console_tokens_per_instance=3)
+        self._stub_validate_console_port(True)
+        instance = u"12345"
+        tokens = [u"token" + str(i) for i in xrange(5)]
+        for token in tokens:
+            self.manager.authorize_console(self.context, token, 'novnc',
+                                          '127.0.0.1', '8080', 'host',
+                                          instance)
+
+        stored_tokens = self.manager._get_tokens_for_instance(instance)
+        self.assertEqual(tokens[2:],
+                         [token for (token, _expires) in stored_tokens])
+        for token in tokens[:2]:
+            self.assertFalse(self.manager.check_token(self.context, token))
+        for token in tokens[2:]:
+            self.assertTrue(self.manager.check_token(self.context, token))
+
     def test_wrong_token_has_port(self):
         token = u'mytok'
 
@@ -118,7 +162,8 @@ class ControlauthMemcacheEncodingTestCase(test.TestCase):
         self.manager.mc.set(mox.IsA(str), mox.IgnoreArg(), mox.IgnoreArg()
                            ).AndReturn(True)
         self.manager.mc.get(mox.IsA(str)).AndReturn(None)
-        self.manager.mc.set(mox.IsA(str), mox.IgnoreArg()).AndReturn(True)
+        self.manager.mc.set(mox.IsA(str), mox.IgnoreArg(), mox.IgnoreArg()
+                           ).AndReturn(True)
 
         self.mox.ReplayAll()
 
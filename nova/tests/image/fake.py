@@ -161,7 +161,7 @@ class _FakeImageService(object):
         """Return list of detailed image information."""
         return copy.deepcopy(self.images.values())
 
-    def download(self, context, image_id, data):
+    def download(self, context, image_id, data, dst_path=None):
         self.show(context, image_id)
         data.write(self._imagedata.get(image_id, ''))
 
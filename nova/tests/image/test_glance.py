@@ -16,10 +16,12 @@
 #    under the License.
 
 
+import cStringIO
 import datetime
 import filecmp
 import os
 import random
+import shutil
 import tempfile
 import time
 
@@ -33,6 +35,7 @@ from nova import test
 from nova.tests.api.openstack import fakes
 from nova.tests.glance import stubs as glance_stubs
 from nova.tests import matchers
+from nova import utils
 
 CONF = cfg.CONF
 
@@ -512,6 +515,64 @@ class TestGlanceImageService(test.TestCase):
         os.remove(client.s_tmpfname)
         os.remove(tmpfname)
 
+    def _download_file_url_to_path(self, methods, writer=None):
+        class MyGlanceStubClient(glance_stubs.StubGlanceClient):
+            """A client that returns a file url."""
+            def get(self, image_id):
+                return type('GlanceTestDirectUrlMeta', (object,),
+                            {'direct_url': 'file://' + self.s_tmpfname})
+
+        client = MyGlanceStubClient()
+        with utils.tempdir() as tmpdir:
+            client.s_tmpfname = os.path.join(tmpdir, 'src')
+            with open(client.s_tmpfname, 'w') as f:
+                f.write('image data')
+            dst_path = os.path.join(tmpdir, 'dst')
+
+            service = self._create_image_service(client)
+            self.flags(allowed_direct_url_schemes=['file'],
+                       image_file_transfer_methods=methods)
+            service.download(self.context, 1, writer, dst_path=dst_path)
+
+            if writer is not None:
+                return None, None
+            with open(dst_path) as f:
+                data = f.read()
+            linked = (os.stat(dst_path).st_ino ==
+                      os.stat(client.s_tmpfname).st_ino)
+            return data, linked
+
+    def test_download_file_url_hardlink(self):
+        data, linked = self._download_file_url_to_path(['hardlink'])
+        self.assertEqual(data, 'image data')
+        self.assertTrue(linked)
+
+    def test_download_file_url_transfer_fallback(self):
+        executes = []
+
+        def fake_execute(*cmd, **kwargs):
+            executes.append(cmd[:-2])
+            if '--reflink=always' in cmd:
+                raise exception.ProcessExecutionError()
+            shutil.copy(cmd[-2], cmd[-1])
+            return '', ''
+
+        self.stubs.Set(utils, 'execute', fake_execute)
+        data, linked = self._download_file_url_to_path(
+                ['bogus', 'reflink', 'copy'])
+        self.assertEqual(data, 'image data')
+        self.assertFalse(linked)
+        self.assertEqual(executes, [('cp', '--reflink=always'), ('cp',)])
+
+    def test_download_file_url_transfer_fails(self):
+        def fake_execute(*cmd, **kwargs):
+            raise exception.ProcessExecutionError()
+
+        self.stubs.Set(utils, 'execute', fake_execute)
+        writer = cStringIO.StringIO()
+        self._download_file_url_to_path(['reflink'], writer)
+        self.assertEqual(writer.getvalue(), 'image data')
+
     def test_client_forbidden_converts_to_imagenotauthed(self):
         class MyGlanceStubClient(glance_stubs.StubGlanceClient):
             """A client that raises a Forbidden exception."""
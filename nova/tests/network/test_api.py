@@ -89,6 +89,37 @@ class ApiTestCase(test.TestCase):
         self.network_api.allocate_for_instance(
             self.context, instance, 'vpn', 'requested_networks', macs=macs)
 
+    def test_get_instance_nw_info_batch(self):
+        inst_type = instance_types.get_default_instance_type()
+        inst_type['rxtx_factor'] = 2.0
+        sys_meta = utils.dict_to_metadata(
+                instance_types.save_instance_type_info({}, inst_type))
+        instances = [dict(uuid='uuid%d' % i, host='host',
+                          system_metadata=sys_meta) for i in xrange(2)]
+
+        self.mox.StubOutWithMock(self.network_api.network_rpcapi,
+                                 'get_instance_nw_info_batch')
+        self.network_api.network_rpcapi.get_instance_nw_info_batch(
+            self.context,
+            [{'instance_id': 'uuid0', 'rxtx_factor': 2.0, 'host': 'host'},
+             {'instance_id': 'uuid1', 'rxtx_factor': 2.0, 'host': 'host'}]
+            ).AndReturn({'uuid0': [{'id': 'vif0'}],
+                         'uuid1': [{'id': 'vif1'}]})
+        self.mox.ReplayAll()
+
+        updated = []
+
+        def fake_instance_info_cache_update(context, instance_uuid, cache):
+            updated.append(instance_uuid)
+
+        self.stubs.Set(self.network_api.db, 'instance_info_cache_update',
+                       fake_instance_info_cache_update)
+
+        result = self.network_api.get_instance_nw_info_batch(self.context,
+                                                             instances)
+        self.assertEqual(sorted(result.keys()), ['uuid0', 'uuid1'])
+        self.assertEqual(updated, ['uuid0', 'uuid1'])
+
     def _do_test_associate_floating_ip(self, orig_instance_uuid):
         """Test post-association logic."""
 
@@ -235,12 +235,20 @@ class LinuxNetworkTestCase(test.TestCase):
             return [vif for vif in vifs if vif['instance_uuid'] ==
                         instance_uuid]
 
+        def get_vifs_by_uuids(_context, instance_uuids):
+            return [vif for vif in vifs if vif['instance_uuid'] in
+                        instance_uuids]
+
         def get_instance(_context, instance_id):
             return instances[instance_id]
 
         self.stubs.Set(db, 'virtual_interface_get_by_instance', get_vifs)
+        self.stubs.Set(db, 'virtual_interface_get_by_instance_uuids',
+                       get_vifs_by_uuids)
         self.stubs.Set(db, 'instance_get', get_instance)
         self.stubs.Set(db, 'network_get_associated_fixed_ips', get_associated)
+        self.stubs.Set(linux_net, '_dhcp_file_contents', {})
+        self.stubs.Set(linux_net, '_dhcp_hosts', {})
 
     def test_update_dhcp_for_nw00(self):
         self.flags(use_single_default_gateway=True)
@@ -248,6 +256,7 @@ class LinuxNetworkTestCase(test.TestCase):
         self.mox.StubOutWithMock(self.driver, 'write_to_file')
         self.mox.StubOutWithMock(fileutils, 'ensure_tree')
         self.mox.StubOutWithMock(os, 'chmod')
+        self.mox.StubOutWithMock(os, 'rename')
 
         self.driver.write_to_file(mox.IgnoreArg(), mox.IgnoreArg())
         self.driver.write_to_file(mox.IgnoreArg(), mox.IgnoreArg())
@@ -259,6 +268,9 @@ class LinuxNetworkTestCase(test.TestCase):
         fileutils.ensure_tree(mox.IgnoreArg())
         fileutils.ensure_tree(mox.IgnoreArg())
         os.chmod(mox.IgnoreArg(), mox.IgnoreArg())
+        os.rename(mox.IgnoreArg(), mox.IgnoreArg())
+        os.chmod(mox.IgnoreArg(), mox.IgnoreArg())
+        os.rename(mox.IgnoreArg(), mox.IgnoreArg())
         os.chmod(mox.IgnoreArg(), mox.IgnoreArg())
 
         self.mox.ReplayAll()
@@ -271,6 +283,7 @@ class LinuxNetworkTestCase(test.TestCase):
         self.mox.StubOutWithMock(self.driver, 'write_to_file')
         self.mox.StubOutWithMock(fileutils, 'ensure_tree')
         self.mox.StubOutWithMock(os, 'chmod')
+        self.mox.StubOutWithMock(os, 'rename')
 
         self.driver.write_to_file(mox.IgnoreArg(), mox.IgnoreArg())
         self.driver.write_to_file(mox.IgnoreArg(), mox.IgnoreArg())
@@ -282,12 +295,52 @@ class LinuxNetworkTestCase(test.TestCase):
         fileutils.ensure_tree(mox.IgnoreArg())
         fileutils.ensure_tree(mox.IgnoreArg())
         os.chmod(mox.IgnoreArg(), mox.IgnoreArg())
+        os.rename(mox.IgnoreArg(), mox.IgnoreArg())
+        os.chmod(mox.IgnoreArg(), mox.IgnoreArg())
+        os.rename(mox.IgnoreArg(), mox.IgnoreArg())
         os.chmod(mox.IgnoreArg(), mox.IgnoreArg())
 
         self.mox.ReplayAll()
 
         self.driver.update_dhcp(self.context, "eth0", networks[0])
 
+    def test_update_dhcp_unchanged(self):
+        self.flags(use_single_default_gateway=True)
+        written = []
+        restarts = []
+        running = [True]
+
+        self.stubs.Set(linux_net, 'write_to_file',
+                       lambda path, data: written.append(path))
+        self.stubs.Set(os, 'chmod', lambda *args: None)
+        self.stubs.Set(os, 'rename', lambda *args: None)
+        self.stubs.Set(linux_net, '_dnsmasq_running',
+                       lambda dev: running[0])
+        self.stubs.Set(linux_net, 'restart_dhcp',
+                       lambda *args, **kwargs: restarts.append(args))
+
+        self.driver.update_dhcp(self.context, "eth0", networks[0])
+        self.assertEqual(len(written), 2)
+        self.assertEqual(len(restarts), 1)
+
+        # nothing changed, so neither the files nor dnsmasq are touched
+        self.driver.update_dhcp(self.context, "eth0", networks[0])
+        self.assertEqual(len(written), 2)
+        self.assertEqual(len(restarts), 1)
+
+        # unless dnsmasq died in the meantime
+        running[0] = False
+        self.driver.update_dhcp(self.context, "eth0", networks[0])
+        self.assertEqual(len(written), 2)
+        self.assertEqual(len(restarts), 2)
+
+        # a changed host is written out and reloaded
+        running[0] = True
+        self.flags(dhcp_domain='example.org')
+        self.driver.update_dhcp(self.context, "eth0", networks[0])
+        self.assertEqual(len(written), 3)
+        self.assertEqual(len(restarts), 3)
+
     def test_get_dhcp_hosts_for_nw00(self):
         self.flags(use_single_default_gateway=True)
 
@@ -316,6 +369,61 @@ class LinuxNetworkTestCase(test.TestCase):
         actual_hosts = self.driver.get_dhcp_hosts(self.context, networks[1])
         self.assertEquals(actual_hosts, expected)
 
+    def test_dhcp_hosts_updated_without_reload(self):
+        self.flags(use_single_default_gateway=True)
+        queries = []
+
+        def counting_get_associated(context, network_id, host=None):
+            queries.append(network_id)
+            return get_associated(context, network_id, host=host)
+
+        self.stubs.Set(db, 'network_get_associated_fixed_ips',
+                       counting_get_associated)
+
+        expected = [
+                "DE:AD:BE:EF:00:00,fake_instance00.novalocal,"
+                "192.168.0.100,net:NW-0",
+                "DE:AD:BE:EF:00:03,fake_instance01.novalocal,"
+                "192.168.1.101,net:NW-3",
+                "DE:AD:BE:EF:00:04,fake_instance00.novalocal,"
+                "192.168.0.102,net:NW-4"]
+        actual_hosts = self.driver.get_dhcp_hosts(self.context, networks[0])
+        self.assertEquals(actual_hosts, '\n'.join(expected))
+        self.assertEquals(queries, [0])
+
+        # allocations and deallocations are applied to the loaded hosts
+        instance = instances['00000000-0000-0000-0000-0000000000000001']
+        vif = {'id': 6, 'address': 'DE:AD:BE:EF:00:06'}
+        self.driver.add_dhcp_host(networks[0], '192.168.0.103', instance,
+                                  vif)
+        self.driver.remove_dhcp_host(0, '192.168.0.100')
+        expected = expected[1:] + [
+                "DE:AD:BE:EF:00:06,fake_instance01.novalocal,"
+                "192.168.0.103,net:NW-6"]
+        actual_hosts = self.driver.get_dhcp_hosts(self.context, networks[0])
+        self.assertEquals(actual_hosts, '\n'.join(expected))
+        self.assertEquals(self.driver.get_dhcp_opts(self.context,
+                                                    networks[0]),
+                          'NW-3,3\nNW-4,3\nNW-6,3')
+        self.assertEquals(queries, [0])
+
+        # other hosts' instances are left out of multi host networks
+        self.flags(host='fake_instance01')
+        self.driver.get_dhcp_hosts(self.context, networks[1])
+        instance = instances['00000000-0000-0000-0000-0000000000000000']
+        self.driver.add_dhcp_host(networks[1], '192.168.1.103', instance,
+                                  vif)
+        self.assertFalse('192.168.1.103' in
+                         self.driver.get_dhcp_hosts(self.context,
+                                                    networks[1]))
+        self.assertEquals(queries, [0, 1])
+
+        # a resync reads the network from the database again
+        self.driver.clear_dhcp_hosts(0)
+        self.driver.get_dhcp_hosts(self.context, networks[0])
+        self.driver.get_dhcp_hosts(self.context, networks[1])
+        self.assertEquals(queries, [0, 1, 0])
+
     def test_get_dns_hosts_for_nw00(self):
         expected = (
                 "192.168.0.100\tfake_instance00.novalocal\n"
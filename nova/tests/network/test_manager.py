@@ -1234,6 +1234,36 @@ class CommonNetworkTestCase(test.TestCase):
                           manager.get_instance_nw_info,
                           self.context, FAKEUUID, 'fake_rxtx_factor', HOST)
 
+    def test_get_instance_nw_info_batch(self):
+        manager = network_manager.NetworkManager()
+        vifs = [{'uuid': 'vif1', 'instance_uuid': 'uuid1', 'network_id': 1},
+                {'uuid': 'vif2', 'instance_uuid': 'uuid2', 'network_id': 1},
+                {'uuid': 'vif3', 'instance_uuid': 'uuid2',
+                 'network_id': None}]
+        self.mox.StubOutWithMock(manager.db,
+                                 'virtual_interface_get_by_instance_uuids')
+        self.mox.StubOutWithMock(manager, '_get_network_by_id')
+        self.mox.StubOutWithMock(manager, 'build_network_info_model')
+        manager.db.virtual_interface_get_by_instance_uuids(
+                self.context, ['uuid1', 'uuid2', 'uuid3']).AndReturn(vifs)
+        manager._get_network_by_id(self.context, 1).AndReturn('net1')
+        manager.build_network_info_model(self.context, vifs[:1],
+                {'vif1': 'net1'}, 1.0, HOST).AndReturn('nw_info1')
+        manager.build_network_info_model(self.context, vifs[1:],
+                {'vif2': 'net1'}, 2.0, HOST).AndReturn('nw_info2')
+        manager.build_network_info_model(self.context, [], {}, 1.0,
+                HOST).AndReturn('nw_info3')
+        self.mox.ReplayAll()
+
+        instances = [
+            {'instance_id': 'uuid1', 'rxtx_factor': 1.0, 'host': HOST},
+            {'instance_id': 'uuid2', 'rxtx_factor': 2.0, 'host': HOST},
+            {'instance_id': 'uuid3', 'rxtx_factor': 1.0, 'host': HOST}]
+        self.assertEqual(manager.get_instance_nw_info_batch(self.context,
+                                                            instances),
+                         {'uuid1': 'nw_info1', 'uuid2': 'nw_info2',
+                          'uuid3': 'nw_info3'})
+
     def test_deallocate_for_instance_passes_host_info(self):
         manager = fake_network.FakeNetworkManager()
         db = manager.db
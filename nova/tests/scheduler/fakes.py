@@ -141,4 +141,7 @@ class FakeComputeAPI(object):
 def mox_host_manager_db_calls(mock, context):
     mock.StubOutWithMock(db, 'compute_node_get_all')
 
+    mock.StubOutWithMock(db, 'aggregate_host_metadata_get_all')
+
     db.compute_node_get_all(mox.IgnoreArg()).AndReturn(COMPUTE_NODES)
+    db.aggregate_host_metadata_get_all(mox.IgnoreArg()).AndReturn({})
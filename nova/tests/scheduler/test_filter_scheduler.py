@@ -16,6 +16,8 @@
 Tests For Filter Scheduler.
 """
 
+import random
+
 import mox
 
 from nova.compute import instance_types
@@ -659,6 +661,87 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
 
         self.assertEquals(50, hosts[0].weight)
 
+    def _schedule_many(self, batch, subset_size=1):
+        """Schedule 40 instances on a fresh set of hosts, either in a batch
+        or filtering and weighing all hosts for each instance.
+        """
+        self.flags(scheduler_default_filters=['RamFilter', 'CoreFilter',
+                                              'NumInstancesFilter'],
+                   scheduler_host_subset_size=subset_size,
+                   ram_allocation_ratio=1.0, max_instances_per_host=5)
+        sched = fakes.FakeFilterScheduler()
+        rand = random.Random(7)
+        host_states = []
+        for i in xrange(20):
+            host_states.append(fakes.FakeHostState('host%d' % i, 'node',
+                    {'total_usable_ram_mb': 4096,
+                     'free_ram_mb': rand.choice([0, 512, 1024, 1536]),
+                     'vcpus_total': 4, 'vcpus_used': 0,
+                     'num_instances': rand.randint(0, 4)}))
+        self.stubs.Set(sched.host_manager, 'get_all_host_states',
+                       lambda context: iter(host_states))
+        self.stubs.Set(sched, '_weighers_are_per_host', lambda: batch)
+        random.seed(42)
+
+        instance_properties = {'project_id': 1,
+                               'root_gb': 0,
+                               'memory_mb': 512,
+                               'ephemeral_gb': 0,
+                               'vcpus': 1,
+                               'os_type': 'Linux'}
+        request_spec = {'num_instances': 40,
+                        'instance_type': instance_properties,
+                        'instance_properties': instance_properties}
+        weighed_hosts = sched._schedule(self.context, request_spec, {})
+        return [(w.obj.host, w.weight) for w in weighed_hosts]
+
+    def test_schedule_batch_same_placements(self):
+        expected = self._schedule_many(batch=False)
+        self.assertTrue(10 < len(expected) < 40)
+        self.assertEqual(expected, self._schedule_many(batch=True))
+
+    def test_schedule_batch_same_placements_host_pool(self):
+        expected = self._schedule_many(batch=False, subset_size=3)
+        self.assertEqual(expected,
+                         self._schedule_many(batch=True, subset_size=3))
+
+    def test_schedule_batch_filters_all_hosts_once(self):
+        sched = fakes.FakeFilterScheduler()
+        filtered = []
+
+        def _fake_get_filtered_hosts(hosts, filter_properties):
+            hosts = list(hosts)
+            filtered.append(len(hosts))
+            return hosts
+
+        self.stubs.Set(sched.host_manager, 'get_filtered_hosts',
+                       _fake_get_filtered_hosts)
+        fakes.mox_host_manager_db_calls(self.mox, self.context)
+        instance_properties = {'project_id': 1,
+                               'root_gb': 512,
+                               'memory_mb': 512,
+                               'ephemeral_gb': 0,
+                               'vcpus': 1,
+                               'os_type': 'Linux'}
+        request_spec = {'num_instances': 5,
+                        'instance_properties': instance_properties}
+        self.mox.ReplayAll()
+        weighed_hosts = sched._schedule(self.context, request_spec, {})
+        self.assertEqual(5, len(weighed_hosts))
+        # All 4 hosts once, then only the chosen host per instance
+        self.assertEqual([4, 1, 1, 1, 1], filtered)
+
+    def test_weighers_are_per_host(self):
+        sched = fakes.FakeFilterScheduler()
+        self.assertTrue(sched._weighers_are_per_host())
+
+        class RelativeWeigher(weights.BaseHostWeigher):
+            def weigh_objects(self, weighed_obj_list, weight_properties):
+                pass
+
+        sched.host_manager.weight_classes.append(RelativeWeigher)
+        self.assertFalse(sched._weighers_are_per_host())
+
     def test_select_hosts_happy_day(self):
         """select_hosts is basically a wrapper around the _select() method.
         Similar to the _select tests, this just does a happy path test to
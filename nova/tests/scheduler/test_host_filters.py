@@ -1331,6 +1331,17 @@ class HostFiltersTestCase(test.TestCase):
                                    {'service': service})
         self.assertTrue(filt_cls.host_passes(host, request))
 
+    def test_availability_zone_filter_prefetched_metadata(self):
+        filt_cls = self.class_map['AvailabilityZoneFilter']()
+        self.mox.StubOutWithMock(db, 'aggregate_metadata_get_by_host')
+        self.mox.ReplayAll()
+        request = self._make_zone_request('az1')
+        host = fakes.FakeHostState('host1', 'node1',
+                {'aggregate_metadata': {'availability_zone': set(['az1'])}})
+        self.assertTrue(filt_cls.host_passes(host, request))
+        request = self._make_zone_request('az2')
+        self.assertFalse(filt_cls.host_passes(host, request))
+
     def test_availability_zone_filter_different(self):
         filt_cls = self.class_map['AvailabilityZoneFilter']()
         service = {'availability_zone': 'nova'}
@@ -1436,6 +1447,22 @@ class HostFiltersTestCase(test.TestCase):
         host = fakes.FakeHostState('host1', 'compute', {})
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
 
+    def test_aggregate_multi_tenancy_isolation_prefetched_metadata(self):
+        filt_cls = self.class_map['AggregateMultiTenancyIsolation']()
+        self.mox.StubOutWithMock(db, 'aggregate_metadata_get_by_host')
+        self.mox.ReplayAll()
+        filter_properties = {'context': self.context,
+                             'request_spec': {
+                                 'instance_properties': {
+                                     'project_id': 'my_tenantid'}}}
+        host = fakes.FakeHostState('host1', 'compute',
+                {'aggregate_metadata': {
+                    'filter_tenant_id': set(['other_tenantid']),
+                    'availability_zone': set(['az1'])}})
+        self.assertFalse(filt_cls.host_passes(host, filter_properties))
+        host.aggregate_metadata = {'availability_zone': set(['az1'])}
+        self.assertTrue(filt_cls.host_passes(host, filter_properties))
+
     def test_aggregate_multi_tenancy_isolation_no_meta_passes(self):
         self._stub_service_is_up(True)
         filt_cls = self.class_map['AggregateMultiTenancyIsolation']()
@@ -224,9 +224,12 @@ class HostManagerTestCase(test.TestCase):
         context = 'fake_context'
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'aggregate_host_metadata_get_all')
         self.mox.StubOutWithMock(host_manager.LOG, 'warn')
 
         db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.aggregate_host_metadata_get_all(context).AndReturn(
+                {'host1': {'availability_zone': set(['az1'])}})
         # Invalid service
         host_manager.LOG.warn("No service for compute ID 5")
 
@@ -263,6 +266,13 @@ class HostManagerTestCase(test.TestCase):
         # 8191GB
         self.assertEqual(host_states_map[('host4', 'node4')].free_disk_mb,
                          8388608)
+        # Aggregate metadata is attached to each HostState
+        self.assertEqual(
+                host_states_map[('host1', 'node1')].aggregate_metadata,
+                {'availability_zone': set(['az1'])})
+        self.assertEqual(
+                host_states_map[('host3', 'node3')].aggregate_metadata, {})
+        self.assertEqual(self.host_manager.db_round_trips, 2)
 
 
 class HostManagerChangedNodesTestCase(test.TestCase):
@@ -283,7 +293,9 @@ class HostManagerChangedNodesTestCase(test.TestCase):
         context = 'fake_context'
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'aggregate_host_metadata_get_all')
         db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.aggregate_host_metadata_get_all(context).AndReturn({})
         self.mox.ReplayAll()
 
         self.host_manager.get_all_host_states(context)
@@ -294,12 +306,15 @@ class HostManagerChangedNodesTestCase(test.TestCase):
         context = 'fake_context'
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'aggregate_host_metadata_get_all')
         # all nodes active for first call
         db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.aggregate_host_metadata_get_all(context).AndReturn({})
         # remove node4 for second call
         running_nodes = [n for n in fakes.COMPUTE_NODES
                          if n.get('hypervisor_hostname') != 'node4']
         db.compute_node_get_all(context).AndReturn(running_nodes)
+        db.aggregate_host_metadata_get_all(context).AndReturn({})
         self.mox.ReplayAll()
 
         self.host_manager.get_all_host_states(context)
@@ -311,10 +326,13 @@ class HostManagerChangedNodesTestCase(test.TestCase):
         context = 'fake_context'
 
         self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'aggregate_host_metadata_get_all')
         # all nodes active for first call
         db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.aggregate_host_metadata_get_all(context).AndReturn({})
         # remove all nodes for second call
         db.compute_node_get_all(context).AndReturn([])
+        db.aggregate_host_metadata_get_all(context).AndReturn({})
         self.mox.ReplayAll()
 
         self.host_manager.get_all_host_states(context)
@@ -322,6 +340,66 @@ class HostManagerChangedNodesTestCase(test.TestCase):
         host_states_map = self.host_manager.host_state_map
         self.assertEqual(len(host_states_map), 0)
 
+    def test_get_all_host_states_incremental(self):
+        self.flags(scheduler_incremental_host_sync=True,
+                   scheduler_full_host_sync_interval=60)
+        context = 'fake_context'
+        now = timeutils.utcnow()
+        timeutils.set_time_override(now)
+
+        changed_node = dict(fakes.COMPUTE_NODES[0], free_ram_mb=256,
+                            updated_at=now)
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'compute_node_get_all_changed_since')
+        self.mox.StubOutWithMock(db, 'aggregate_host_metadata_get_all')
+        # full sync on first call
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.aggregate_host_metadata_get_all(context).AndReturn({})
+        # only host1 changed for the second call
+        db.compute_node_get_all_changed_since(context, now).AndReturn(
+                [changed_node])
+        db.aggregate_host_metadata_get_all(context).AndReturn({})
+        # full sync again once the interval passed
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES[1:])
+        db.aggregate_host_metadata_get_all(context).AndReturn({})
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual(self.host_manager.last_full_sync, now)
+
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(len(host_states_map), 4)
+        self.assertEqual(host_states_map[('host1', 'node1')].free_ram_mb,
+                         256)
+        self.assertEqual(host_states_map[('host3', 'node3')].free_ram_mb,
+                         3072)
+        self.assertEqual(self.host_manager.last_full_sync, now)
+
+        timeutils.advance_time_seconds(61)
+        self.host_manager.get_all_host_states(context)
+        host_states_map = self.host_manager.host_state_map
+        self.assertEqual(len(host_states_map), 3)
+        self.assertEqual(self.host_manager.last_full_sync,
+                         timeutils.utcnow())
+
+    def test_update_service_capabilities_updates_cached_state(self):
+        context = 'fake_context'
+
+        self.mox.StubOutWithMock(db, 'compute_node_get_all')
+        self.mox.StubOutWithMock(db, 'aggregate_host_metadata_get_all')
+        db.compute_node_get_all(context).AndReturn(fakes.COMPUTE_NODES)
+        db.aggregate_host_metadata_get_all(context).AndReturn({})
+        self.mox.ReplayAll()
+
+        self.host_manager.get_all_host_states(context)
+        self.host_manager.update_service_capabilities('compute', 'host1',
+                {'hypervisor_hostname': 'node1', 'foo': 'bar'})
+        host_state = self.host_manager.host_state_map[('host1', 'node1')]
+        self.assertEqual(host_state.capabilities['foo'], 'bar')
+        self.assertEqual(host_state.service['host'], 'host1')
+
 
 class HostStateTestCase(test.TestCase):
     """Test case for HostState class."""
@@ -0,0 +1,145 @@
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""
+Tests For the vectorized scheduler filters and weigher.
+"""
+
+import random
+
+from nova.scheduler import filters
+from nova.scheduler import host_manager
+from nova.scheduler import vectorized
+from nova.scheduler import weights
+from nova import test
+from nova.tests.scheduler import fakes
+
+
+def _make_host_states(count, seed=42):
+    rand = random.Random(seed)
+    host_states = []
+    for i in xrange(count):
+        total_ram = rand.choice([2048, 4096, 8192])
+        total_disk = rand.choice([20, 40, 80])
+        host_states.append(fakes.FakeHostState('host%d' % i, 'node%d' % i,
+                {'total_usable_ram_mb': total_ram,
+                 'free_ram_mb': rand.randint(-512, total_ram),
+                 'total_usable_disk_gb': total_disk,
+                 'free_disk_mb': rand.randint(0, total_disk * 1024),
+                 'vcpus_total': rand.choice([0, 2, 4]),
+                 'vcpus_used': rand.randint(0, 70),
+                 'num_instances': rand.randint(0, 60),
+                 'num_io_ops': rand.randint(0, 10)}))
+    return host_states
+
+
+class VectorizedFiltersTestCase(test.TestCase):
+    """Test case for the vectorized filters and weigher."""
+
+    filter_names = ['RamFilter', 'CoreFilter', 'DiskFilter',
+                    'NumInstancesFilter', 'IoOpsFilter']
+
+    def setUp(self):
+        super(VectorizedFiltersTestCase, self).setUp()
+        if not vectorized.is_available():
+            self.skipTest("NumPy not available")
+        self.filter_handler = filters.HostFilterHandler()
+        classes = self.filter_handler.get_matching_classes(
+                ['nova.scheduler.filters.all_filters'])
+        self.class_map = dict((cls.__name__, cls) for cls in classes)
+        self.weight_handler = weights.HostWeightHandler()
+        self.filter_properties = {
+            'instance_type': {'memory_mb': 1024, 'vcpus': 2,
+                              'root_gb': 10, 'ephemeral_gb': 5}}
+
+    def _filter(self, filter_names, host_states, use_vectorized):
+        filter_classes = [self.class_map[name] for name in filter_names]
+        if use_vectorized:
+            return vectorized.get_filtered_hosts(self.filter_handler,
+                    filter_classes, host_states, self.filter_properties)
+        return self.filter_handler.get_filtered_objects(filter_classes,
+                host_states, self.filter_properties)
+
+    def _assert_same_hosts(self, filter_names):
+        expected_hosts = _make_host_states(500)
+        expected = self._filter(filter_names, expected_hosts, False)
+        actual_hosts = _make_host_states(500)
+        actual = self._filter(filter_names, actual_hosts, True)
+
+        self.assertTrue(0 < len(expected) < 500)
+        self.assertEqual([h.host for h in expected],
+                         [h.host for h in actual])
+        for exp, act in zip(expected, actual):
+            self.assertEqual(exp.limits, act.limits)
+
+    def test_filters_match_regular_filters(self):
+        self.flags(ram_allocation_ratio=1.5, cpu_allocation_ratio=16.0,
+                   disk_allocation_ratio=1.0, max_instances_per_host=50,
+                   max_io_ops_per_host=8)
+        self._assert_same_hosts(self.filter_names)
+
+    def test_each_filter_matches_regular_filter(self):
+        self.flags(cpu_allocation_ratio=4.0)
+        for filter_name in self.filter_names:
+            self._assert_same_hosts([filter_name])
+
+    def test_mixed_filters_keep_order(self):
+        host_states = _make_host_states(100)
+        filter_properties = dict(self.filter_properties,
+                                 ignore_hosts=[], force_hosts=[],
+                                 retry={'num_attempts': 2,
+                                        'hosts': [['host3', 'node3']]})
+        filter_classes = [self.class_map['RetryFilter'],
+                          self.class_map['RamFilter']]
+        expected = self.filter_handler.get_filtered_objects(filter_classes,
+                host_states, filter_properties)
+        actual = vectorized.get_filtered_hosts(self.filter_handler,
+                filter_classes, host_states, filter_properties)
+        self.assertEqual(expected, actual)
+        self.assertFalse('host3' in [h.host for h in actual])
+
+    def test_no_instance_type_uses_regular_filters(self):
+        host_states = _make_host_states(10)
+        self.mox.StubOutWithMock(vectorized, 'HostColumns')
+        self.mox.ReplayAll()
+        result = vectorized.get_filtered_hosts(self.filter_handler,
+                [self.class_map['NumInstancesFilter']], host_states, {})
+        self.assertEqual(len(result),
+                         len([h for h in host_states
+                              if h.num_instances < 50]))
+
+    def test_ram_weigher_matches_regular_weigher(self):
+        self.flags(ram_weight_multiplier=-1.0)
+        host_states = _make_host_states(300)
+        weigher_classes = self.weight_handler.get_matching_classes(
+                ['nova.scheduler.weights.ram.RAMWeigher'])
+        expected = self.weight_handler.get_weighed_objects(weigher_classes,
+                host_states, {})
+        actual = vectorized.get_weighed_hosts(self.weight_handler,
+                weigher_classes, host_states, {})
+        self.assertEqual([(w.obj.host, w.weight) for w in expected],
+                         [(w.obj.host, w.weight) for w in actual])
+
+    def test_host_manager_uses_vectorized_filters(self):
+        self.flags(scheduler_vectorized_filters=True)
+        manager = host_manager.HostManager()
+        host_states = _make_host_states(50)
+        self.mox.StubOutWithMock(vectorized, 'get_filtered_hosts')
+        vectorized.get_filtered_hosts(manager.filter_handler,
+                [self.class_map['RamFilter']], host_states,
+                self.filter_properties).AndReturn(host_states[:1])
+        self.mox.ReplayAll()
+        result = manager.get_filtered_hosts(host_states,
+                self.filter_properties, filter_class_names=['RamFilter'])
+        self.assertEqual(host_states[:1], result)
@@ -118,6 +118,16 @@ class AvailabilityZoneTestCases(test.TestCase):
         self.assertEquals(self.availability_zone,
                         az.get_host_availability_zone(self.context, self.host))
 
+    def test_get_host_availability_zones(self):
+        """Test get right availability zones for several hosts at once."""
+        service = self._create_service_with_topic('compute', self.host)
+        self._add_to_aggregate(service, self.agg)
+
+        zones = az.get_host_availability_zones(self.context,
+                                               [self.host, 'other'])
+        self.assertEquals({self.host: self.availability_zone,
+                           'other': self.default_az}, zones)
+
     def test_get_availability_zones(self):
         """Test get_availability_zones."""
 
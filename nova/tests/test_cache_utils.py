@@ -0,0 +1,122 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+#    Copyright 2013 OpenStack Foundation
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from nova import cache_utils
+from nova.openstack.common import timeutils
+from nova import test
+
+
+class CacheUtilsTestCase(test.TestCase):
+    def setUp(self):
+        super(CacheUtilsTestCase, self).setUp()
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+        self.client = cache_utils.get_client()
+
+    def _stats(self):
+        return self.client.get_stats()[0][1]
+
+    def test_get_set(self):
+        self.assertTrue(self.client.set('foo', 'bar'))
+        self.assertEqual('bar', self.client.get('foo'))
+        self.assertEqual(None, self.client.get('baz'))
+        stats = self._stats()
+        self.assertEqual(1, stats['get_hits'])
+        self.assertEqual(1, stats['get_misses'])
+        self.assertEqual(1, stats['curr_items'])
+
+    def test_expiry(self):
+        self.client.set('short', 'a', time=10)
+        self.client.set('long', 'b', time=60)
+        self.client.set('forever', 'c')
+        timeutils.advance_time_seconds(10)
+        self.assertEqual(None, self.client.get('short'))
+        self.assertEqual('b', self.client.get('long'))
+        timeutils.advance_time_seconds(50)
+        self.assertEqual(None, self.client.get('long'))
+        self.assertEqual('c', self.client.get('forever'))
+        self.assertEqual(2, self._stats()['expirations'])
+
+    def test_set_again_replaces_expiry(self):
+        self.client.set('foo', 'a', time=10)
+        self.client.set('foo', 'b', time=60)
+        timeutils.advance_time_seconds(30)
+        self.assertEqual('b', self.client.get('foo'))
+        self.client.set('foo', 'c')
+        timeutils.advance_time_seconds(60)
+        self.assertEqual('c', self.client.get('foo'))
+
+    def test_lru_eviction(self):
+        self.flags(memorycache_max_entries=2)
+        client = cache_utils.get_client()
+        client.set('a', 1)
+        client.set('b', 2)
+        client.get('a')
+        client.set('c', 3)
+        self.assertEqual(None, client.get('b'))
+        self.assertEqual(1, client.get('a'))
+        self.assertEqual(3, client.get('c'))
+        self.assertEqual(1, client.get_stats()[0][1]['evictions'])
+
+    def test_lru_eviction_order(self):
+        self.flags(memorycache_max_entries=3)
+        client = cache_utils.get_client()
+        for key in ('a', 'b', 'c'):
+            client.set(key, key)
+        client.get('a')
+        client.set('b', 'B')
+        client.delete('c')
+        client.set('d', 'd')
+        client.set('e', 'e')
+        self.assertEqual(None, client.get('a'))
+        self.assertEqual('B', client.get('b'))
+        self.assertEqual('d', client.get('d'))
+        self.assertEqual('e', client.get('e'))
+
+    def test_add_incr_delete(self):
+        self.assertTrue(self.client.add('foo', '1', time=10))
+        self.assertFalse(self.client.add('foo', '2'))
+        self.assertEqual(3, self.client.incr('foo', 2))
+        self.assertEqual('3', self.client.get('foo'))
+        self.assertEqual(None, self.client.incr('bar'))
+        self.client.delete('foo')
+        self.assertEqual(None, self.client.get('foo'))
+        timeutils.advance_time_seconds(10)
+        self.assertTrue(self.client.add('foo', '4'))
+
+    def test_stale_expiry_entries_are_compacted(self):
+        for i in xrange(1000):
+            self.client.set('foo', i, time=3600)
+        self.assertTrue(len(self.client._expiry) < 100)
+        self.assertEqual(999, self.client.get('foo'))
+
+    def test_invalidate_metadata(self):
+        cache_utils.reset_metadata_client()
+        self.addCleanup(cache_utils.reset_metadata_client)
+        client = cache_utils.get_metadata_client()
+        key = cache_utils.metadata_instance_key('fake-uuid')
+
+        client.set(key, 'md')
+        cache_utils.invalidate_metadata('fake-uuid',
+                                        {'task_state': 'spawning',
+                                         'power_state': 1})
+        self.assertEqual('md', client.get(key))
+        cache_utils.invalidate_metadata('fake-uuid', {'host': 'new-host'})
+        self.assertEqual(None, client.get(key))
+
+        client.set(key, 'md')
+        cache_utils.invalidate_metadata('fake-uuid')
+        self.assertEqual(None, client.get(key))
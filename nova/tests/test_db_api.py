@@ -148,6 +148,13 @@ class DbApiTestCase(DbTestCase):
         check_exc_format(db.get_ec2_instance_id_by_uuid)
         check_exc_format(db.get_instance_uuid_by_ec2_id)
 
+    def test_get_ec2_instance_ids_by_uuids(self):
+        id1 = db.ec2_instance_create(self.context, 'fake-uuid1')['id']
+        id2 = db.ec2_instance_create(self.context, 'fake-uuid2')['id']
+        result = db.get_ec2_instance_ids_by_uuids(self.context,
+                ['fake-uuid1', 'fake-uuid2', 'fake-uuid3'])
+        self.assertEqual(result, {'fake-uuid1': id1, 'fake-uuid2': id2})
+
     def test_instance_get_all_with_meta(self):
         inst = self.create_instances_with_args()
         fake_meta, fake_sys = self.create_metadata_for_instance(inst['uuid'])
@@ -206,6 +213,56 @@ class DbApiTestCase(DbTestCase):
                                                 {'display_name': u'test'})
         self.assertEqual(1, len(result))
 
+    def test_instance_get_all_by_filters_name_prefix(self):
+        self.create_instances_with_args(display_name='web-1')
+        self.create_instances_with_args(display_name='web-10')
+        self.create_instances_with_args(display_name='db-web-1')
+        result = db.instance_get_all_by_filters(self.context,
+                                                {'display_name': '^web-'})
+        self.assertEqual(2, len(result))
+        result = db.instance_get_all_by_filters(self.context,
+                                                {'display_name': '^web-1$'})
+        self.assertEqual(1, len(result))
+        self.assertEqual('web-1', result[0]['display_name'])
+
+    def test_instance_get_all_by_filters_exact_host(self):
+        self.create_instances_with_args(host='host1', task_state='spawning')
+        self.create_instances_with_args(host='host10')
+        result = db.instance_get_all_by_filters(self.context,
+                                                {'host': 'host1'})
+        self.assertEqual(1, len(result))
+        result = db.instance_get_all_by_filters(self.context,
+                                                {'task_state': 'spawning'})
+        self.assertEqual(1, len(result))
+        self.assertEqual('host1', result[0]['host'])
+
+    def test_instance_get_all_by_filters_columns(self):
+        inst = self.create_instances_with_args(display_name='test1')
+        fake_meta, fake_sys = self.create_metadata_for_instance(inst['uuid'])
+        result = db.instance_get_all_by_filters(self.context, {},
+                                                columns=['display_name'])
+        self.assertEqual(1, len(result))
+        self.assertEqual(inst['uuid'], result[0]['uuid'])
+        self.assertEqual('test1', result[0]['display_name'])
+        self.assertFalse('host' in result[0])
+        self.assertEqual([], result[0]['metadata'])
+        self.assertEqual([], result[0]['system_metadata'])
+
+    def test_instance_get_all_by_filters_columns_with_meta(self):
+        inst = self.create_instances_with_args()
+        fake_meta, fake_sys = self.create_metadata_for_instance(inst['uuid'])
+        result = db.instance_get_all_by_filters(self.context, {},
+                columns_to_join=['metadata'], columns=['display_name'])
+        meta = utils.metadata_to_dict(result[0]['metadata'])
+        self.assertEqual(meta, fake_meta)
+        self.assertEqual([], result[0]['system_metadata'])
+
+    def test_instance_get_all_by_filters_columns_bad_join(self):
+        self.assertRaises(exception.InvalidInput,
+                          db.instance_get_all_by_filters,
+                          self.context, {}, columns_to_join=['info_cache'],
+                          columns=['display_name'])
+
     def test_instance_get_by_uuid(self):
         inst = self.create_instances_with_args()
         fake_meta, fake_sys = self.create_metadata_for_instance(inst['uuid'])
@@ -1434,6 +1491,34 @@ class AggregateDBApiTestCase(test.TestCase):
         self.assertEqual(r1, {'foo.openstack.org': set(['value'])})
         self.assertFalse('fake_key1' in r1)
 
+    def test_aggregate_host_get_by_metadata_key_other_keys(self):
+        ctxt = context.get_admin_context()
+        _create_aggregate_with_hosts(context=ctxt,
+                hosts=['foo.openstack.org'],
+                metadata={'a_key': 'a_value', 'good': 'value',
+                          'z_key': 'z_value'})
+        r1 = db.aggregate_host_get_by_metadata_key(ctxt, key='good')
+        self.assertEqual(r1, {'foo.openstack.org': set(['value'])})
+
+    def test_aggregate_host_metadata_get_all(self):
+        ctxt = context.get_admin_context()
+        values = {'name': 'fake_aggregate2'}
+        values2 = {'name': 'fake_aggregate3'}
+        a1 = _create_aggregate_with_hosts(context=ctxt)
+        a2 = _create_aggregate_with_hosts(context=ctxt, values=values,
+                metadata={'fake_key1': 'other_value'})
+        a3 = _create_aggregate_with_hosts(context=ctxt, values=values2,
+                hosts=['bar.openstack.org'], metadata={'good': 'value'})
+        r1 = db.aggregate_host_metadata_get_all(ctxt)
+        self.assertEqual(r1['foo.openstack.org']['fake_key1'],
+                         set(['fake_value1', 'other_value']))
+        self.assertFalse('good' in r1['foo.openstack.org'])
+        self.assertEqual(r1['bar.openstack.org'], {'good': set(['value'])})
+        # Deleted hosts are not reported
+        db.aggregate_host_delete(ctxt, a3['id'], 'bar.openstack.org')
+        r2 = db.aggregate_host_metadata_get_all(ctxt)
+        self.assertFalse('bar.openstack.org' in r2)
+
     def test_aggregate_get_by_host_not_found(self):
         ctxt = context.get_admin_context()
         _create_aggregate_with_hosts(context=ctxt)
@@ -1710,6 +1795,25 @@ class CapacityTestCase(test.TestCase):
         self.assertEqual(2, int(stats['num_proj_12345']))
         self.assertEqual(3, int(stats['num_vm_building']))
 
+    def test_compute_node_get_all_changed_since(self):
+        now = timeutils.utcnow()
+        timeutils.set_time_override(now)
+        self.addCleanup(timeutils.clear_time_override)
+        item = self._create_helper('host1')
+
+        since = now + datetime.timedelta(seconds=10)
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, since)
+        self.assertEqual([], nodes)
+
+        timeutils.advance_time_seconds(20)
+        db.compute_node_update(self.ctxt, item['id'], {'vcpus': 4})
+        nodes = db.compute_node_get_all_changed_since(self.ctxt, since)
+        self.assertEqual(1, len(nodes))
+        self.assertEqual(4, nodes[0]['vcpus'])
+        self.assertEqual(self.service['host'], nodes[0]['service']['host'])
+        stats = self._stats_as_dict(nodes[0]['stats'])
+        self.assertEqual(3, int(stats['num_instances']))
+
     def test_compute_node_update(self):
         item = self._create_helper('host1')
 
@@ -2945,6 +3049,23 @@ class BlockDeviceMappingTestCase(test.TestCase):
         bmd = db.block_device_mapping_get_all_by_instance(self.ctxt, uuid2)
         self.assertEqual(len(bmd), 2)
 
+    def test_block_device_mapping_get_all_by_instance_uuids(self):
+        uuid1 = self.instance['uuid']
+        uuid2 = db.instance_create(self.ctxt, {})['uuid']
+        uuid3 = db.instance_create(self.ctxt, {})['uuid']
+
+        self._create_bdm({'instance_uuid': uuid1, 'device_name': 'first'})
+        self._create_bdm({'instance_uuid': uuid2, 'device_name': 'second'})
+        self._create_bdm({'instance_uuid': uuid3, 'device_name': 'third'})
+
+        bdms = db.block_device_mapping_get_all_by_instance_uuids(
+                self.ctxt, [uuid1, uuid2])
+        self.assertEqual(sorted(bdm['device_name'] for bdm in bdms),
+                         ['first', 'second'])
+        self.assertEqual(
+            db.block_device_mapping_get_all_by_instance_uuids(self.ctxt, []),
+            [])
+
     def test_block_device_mapping_destroy(self):
         bdm = self._create_bdm({})
         db.block_device_mapping_destroy(self.ctxt, bdm['id'])
@@ -3051,6 +3172,22 @@ class VirtualInterfaceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self._assertEqualListsOfObjects(vifs1, vifs1_real)
         self._assertEqualListsOfObjects(vifs2, vifs2_real)
 
+    def test_virtual_interface_get_by_instance_uuids(self):
+        inst_uuid2 = db.instance_create(self.ctxt, {})['uuid']
+        inst_uuid3 = db.instance_create(self.ctxt, {})['uuid']
+        vifs = [self._create_virt_interface({'address': 'fake1'}),
+                self._create_virt_interface({'address': 'fake2',
+                                             'instance_uuid': inst_uuid2}),
+                self._create_virt_interface({'address': 'fake3'})]
+        self._create_virt_interface({'address': 'fake4',
+                                     'instance_uuid': inst_uuid3})
+        real_vifs = db.virtual_interface_get_by_instance_uuids(
+            self.ctxt, [self.instance_uuid, inst_uuid2])
+        self.assertEqual([vif['id'] for vif in vifs],
+                         [vif['id'] for vif in real_vifs])
+        self.assertEqual([], db.virtual_interface_get_by_instance_uuids(
+            self.ctxt, []))
+
     def test_virtual_interface_get_by_instance_and_network(self):
         inst_uuid2 = db.instance_create(self.ctxt, {})['uuid']
         values = {'host': 'localhost', 'project_id': 'project2'}
@@ -15,7 +15,10 @@
 #    under the License.
 
 import os
+import struct
 
+from nova import exception
+from nova.image import glance
 from nova import test
 from nova import utils
 
@@ -236,3 +239,143 @@ ID        TAG                 VM SIZE                DATE       VM CLOCK
         self.assertEquals(67108864, image_info.virtual_size)
         self.assertEquals(98304, image_info.disk_size)
         self.assertEquals(3, len(image_info.snapshots))
+
+    def test_qemu_img_info_from_header(self):
+        def header(version, backing_file_offset):
+            return (images.QCOW_MAGIC +
+                    struct.pack('>IQ', version, backing_file_offset) +
+                    '\0' * 100)
+
+        image_info = images.qemu_img_info_from_header('disk', header(2, 0))
+        self.assertEquals('disk', image_info.image)
+        self.assertEquals('qcow2', image_info.file_format)
+        self.assertEquals(None, image_info.backing_file)
+
+        # qemu-img has to tell the backing file name
+        self.assertEquals(None,
+                          images.qemu_img_info_from_header('disk',
+                                                           header(2, 1024)))
+        # qcow version 1
+        self.assertEquals(None,
+                          images.qemu_img_info_from_header('disk',
+                                                           header(1, 0)))
+        self.assertEquals(None,
+                          images.qemu_img_info_from_header('disk', 'raw'))
+        self.assertEquals(None,
+                          images.qemu_img_info_from_header('disk', None))
+
+    def test_image_file_sparse(self):
+        self.flags(image_fetch_buffer_size=images.WRITE_BLOCK_SIZE)
+        block = images.WRITE_BLOCK_SIZE
+        data = ['header', 'a' * (block - 6), '\0' * block,
+                'b' * (block + 10), '\0' * (2 * block)]
+
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'image.part')
+            image_file = images.ImageFile(path, 'fake-image')
+            for chunk in data:
+                image_file.write(chunk)
+            image_file.close()
+
+            self.assertEquals(''.join(data)[:images.HEADER_SIZE],
+                              image_file.header)
+            self.assertEquals(5 * block + 10, image_file.size)
+            with open(path, 'rb') as f:
+                self.assertEquals(''.join(data), f.read())
+
+    def test_image_file_skips_zeros(self):
+        self.flags(image_fetch_buffer_size=images.WRITE_BLOCK_SIZE)
+        block = images.WRITE_BLOCK_SIZE
+        data = ['header', 'a' * (block - 6), '\0' * block,
+                'b' * (block + 10), '\0' * (2 * block)]
+        calls = []
+
+        class FakeFile(object):
+            def write(self, data):
+                calls.append(('write', len(data)))
+
+            def seek(self, offset, whence):
+                calls.append(('seek', offset, whence))
+
+            def truncate(self, size):
+                calls.append(('truncate', size))
+
+            def close(self):
+                pass
+
+        with utils.tempdir() as tmpdir:
+            image_file = images.ImageFile(os.path.join(tmpdir, 'image.part'),
+                                          'fake-image')
+            image_file._file = FakeFile()
+            for chunk in data:
+                image_file.write(chunk)
+            image_file.close()
+
+        # Blocks are written whole, and the blocks of zeros are skipped
+        self.assertEquals([('write', block),
+                           ('seek', block, os.SEEK_CUR),
+                           ('write', block),
+                           ('write', block),
+                           ('seek', block, os.SEEK_CUR),
+                           ('seek', 10, os.SEEK_CUR),
+                           ('truncate', 5 * block + 10)], calls)
+
+    def test_image_file_put_in_place(self):
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'image.part')
+            image_file = images.ImageFile(path, 'fake-image')
+            # The image service linked the image to path, without writing
+            with open(path, 'wb') as f:
+                f.write('header' + 'a' * images.HEADER_SIZE)
+            image_file.close()
+
+            self.assertEquals('header' + 'a' * (images.HEADER_SIZE - 6),
+                              image_file.header)
+            self.assertEquals(images.HEADER_SIZE + 6, image_file.size)
+
+    def test_fetch_failure_is_not_hidden_by_close(self):
+        class FakeFile(object):
+            def write(self, data):
+                pass
+
+            def close(self):
+                raise IOError(28, 'No space left on device')
+
+        class FakeImageService(object):
+            def download(self, context, image_id, data, dst_path=None):
+                data._file = FakeFile()
+                data.write('header')
+                raise exception.ImageNotFound(image_id=image_id)
+
+        self.stubs.Set(glance, 'get_remote_image_service',
+                       lambda context, href: (FakeImageService(), href))
+        infos = []
+        self.stubs.Set(images.LOG, 'info',
+                       lambda *args, **kwargs: infos.append(args))
+
+        with utils.tempdir() as tmpdir:
+            path = os.path.join(tmpdir, 'image.part')
+            self.assertRaises(exception.ImageNotFound, images.fetch,
+                              None, 'fake-image', path, None, None)
+            self.assertFalse(os.path.exists(path))
+        self.assertEquals([], infos)
+
+    def test_fetch_to_raw_detects_qcow2_from_header(self):
+        header = images.QCOW_MAGIC + struct.pack('>IQ', 2, 0)
+        info_paths = []
+
+        def fake_qemu_img_info(path):
+            info_paths.append(path)
+            image_info = images.QemuImgInfo()
+            image_info.file_format = 'raw'
+            return image_info
+
+        self.stubs.Set(images, 'fetch', lambda *_: header)
+        self.stubs.Set(images, 'qemu_img_info', fake_qemu_img_info)
+        self.stubs.Set(images, 'convert_image', lambda *_: None)
+        self.stubs.Set(os, 'unlink', lambda path: None)
+        self.stubs.Set(os, 'rename', lambda old, new: None)
+
+        images.fetch_to_raw('context', 'image', 't', 'user', 'project')
+        # Only the converted image is checked with qemu-img
+        self.assertEquals(['t.converted'], info_paths)
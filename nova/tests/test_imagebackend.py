@@ -17,9 +17,12 @@
 
 import os
 
+import eventlet
+from eventlet import event
 import fixtures
 from oslo.config import cfg
 
+from nova import exception
 from nova.openstack.common import uuidutils
 from nova import test
 from nova.tests import fake_libvirt_utils
@@ -420,6 +423,65 @@ class LvmTestCase(_ImageTestCase, test.TestCase):
         self.assertEqual(fake_utils.fake_execute_get_log(), [])
 
 
+class ImageFetcherTestCase(test.TestCase):
+    def setUp(self):
+        super(ImageFetcherTestCase, self).setUp()
+        self.fetcher = imagebackend.ImageFetcher()
+        self.calls = []
+        self.release = event.Event()
+
+    def _fetch_func(self, target, fail=False):
+        self.calls.append(target)
+        self.release.wait()
+        if fail:
+            raise test.TestingException()
+
+    def _spawn(self, target, download=True, **kwargs):
+        return eventlet.spawn(self.fetcher.fetch, target, self._fetch_func,
+                              download, **kwargs)
+
+    def test_fetch_once(self):
+        threads = [self._spawn('base') for i in xrange(3)]
+        eventlet.sleep(0)
+        self.assertEqual(self.calls, ['base'])
+
+        self.release.send()
+        for thread in threads:
+            thread.wait()
+        self.assertEqual(self.calls, ['base'])
+
+    def test_fetch_failure_reaches_waiters(self):
+        threads = [self._spawn('base', fail=True) for i in xrange(3)]
+        eventlet.sleep(0)
+
+        self.release.send()
+        for thread in threads:
+            self.assertRaises(test.TestingException, thread.wait)
+        self.assertEqual(self.calls, ['base'])
+
+    def test_wait_timeout(self):
+        self.flags(image_fetch_wait_timeout=1)
+        leader = self._spawn('base')
+        waiter = self._spawn('base')
+
+        self.assertRaises(exception.ImageFetchTimeout, waiter.wait)
+        self.release.send()
+        leader.wait()
+        self.assertEqual(self.calls, ['base'])
+
+    def test_downloads_limited(self):
+        self.flags(image_fetch_max_concurrent=1)
+        threads = [self._spawn('base1'), self._spawn('base2'),
+                   self._spawn('swap', download=False)]
+        eventlet.sleep(0)
+        self.assertEqual(self.calls, ['base1', 'swap'])
+
+        self.release.send()
+        for thread in threads:
+            thread.wait()
+        self.assertEqual(self.calls, ['base1', 'swap', 'base2'])
+
+
 class BackendTestCase(test.TestCase):
     INSTANCE = {'name': 'fake-instance',
                 'uuid': uuidutils.generate_uuid()}
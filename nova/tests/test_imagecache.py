@@ -508,6 +508,98 @@ class ImageCacheManagerTestCase(test.TestCase):
             # side effect of creating the checksum
             self.assertTrue(os.path.exists(info_fname))
 
+    def test_verify_checksum_over_several_passes(self):
+        self.flags(checksum_base_images=True)
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'))
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            csum = hashlib.sha1()
+            csum.update(testdata)
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            image_cache_manager.checksum_chunk_size = 8
+            image_cache_manager.checksum_budget = 20
+
+            # The budget of the pass runs out before the end of the file
+            res = image_cache_manager._verify_checksum('aaa', fname)
+            self.assertEquals(res, None)
+            self.assertFalse(os.path.exists(info_fname))
+            self.assertEquals(
+                image_cache_manager.partial_checksums[fname]['offset'], 20)
+
+            # The next pass carries on where the previous one stopped
+            image_cache_manager._reset_state()
+            image_cache_manager.checksum_budget = len(testdata) - 20
+            res = image_cache_manager._verify_checksum('aaa', fname)
+            self.assertEquals(res, None)
+            self.assertEquals(image_cache_manager.partial_checksums, {})
+            self.assertEquals(imagecache.read_stored_checksum(
+                fname, timestamped=False), csum.hexdigest())
+
+    def test_verify_checksum_skip_unchanged(self):
+        self.flags(checksum_base_images=True, checksum_interval_seconds=-1,
+                   checksum_skip_unchanged=True)
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'))
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            imagecache.write_stored_checksum(fname)
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            hashed = []
+
+            def fake_hash_base_file(base_file):
+                hashed.append(base_file)
+                return 'banana'
+
+            self.stubs.Set(image_cache_manager, '_hash_base_file',
+                           fake_hash_base_file)
+
+            # The file did not change, it is not read again
+            res = image_cache_manager._verify_checksum('aaa', fname)
+            self.assertTrue(res)
+            self.assertEquals(hashed, [])
+
+            # The file changed size, it is read again
+            with open(fname, 'a') as f:
+                f.write('more data')
+            res = image_cache_manager._verify_checksum('aaa', fname)
+            self.assertFalse(res)
+            self.assertEquals(hashed, [fname])
+
+    def test_verify_checksum_skip_unchanged_full_rehash(self):
+        self.flags(checksum_base_images=True, checksum_interval_seconds=-1,
+                   checksum_skip_unchanged=True,
+                   checksum_full_rehash_seconds=-1)
+
+        with utils.tempdir() as tmpdir:
+            self.flags(instances_path=tmpdir)
+            self.flags(image_info_filename_pattern=('$instances_path/'
+                                                    '%(image)s.info'))
+            fname, info_fname, testdata = self._make_checksum(tmpdir)
+            imagecache.write_stored_checksum(fname)
+
+            image_cache_manager = imagecache.ImageCacheManager()
+            hashed = []
+
+            def fake_hash_base_file(base_file):
+                hashed.append(base_file)
+                return 'banana'
+
+            self.stubs.Set(image_cache_manager, '_hash_base_file',
+                           fake_hash_base_file)
+
+            # The file did not change, but its last full read is too old,
+            # so corruption in place is still found
+            res = image_cache_manager._verify_checksum('aaa', fname)
+            self.assertFalse(res)
+            self.assertEquals(hashed, [fname])
+
     @contextlib.contextmanager
     def _make_base_file(self, checksum=True):
         """Make a base file for testing."""
@@ -17,6 +17,7 @@
 #    under the License.
 """Unit Tests for network code."""
 
+from nova import exception
 from nova.network import linux_net
 from nova import test
 
@@ -130,6 +131,21 @@ class IptablesManagerTestCase(test.TestCase):
         new_lines = self.manager._modify_rules(current_lines, table, 'nat')
         self.assertEqual(new_lines, current_lines)
 
+    def test_remove_chain_keeps_jumps_to_similar_chains(self):
+        table = self.manager.ipv4['filter']
+        table.add_chain('inst-1')
+        table.add_chain('inst-10')
+        table.add_rule('local', '-d 10.0.0.1 -j $inst-1')
+        table.add_rule('local', '-d 10.0.0.10 -j $inst-10')
+        table.remove_chain('inst-1')
+        rules = [str(rule) for rule in table.rules]
+        self.assertTrue('[0:0] -A %(bn)s-local -d 10.0.0.10 '
+                        '-j %(bn)s-inst-10' % {'bn': self.binary_name}
+                        in rules)
+        self.assertFalse('[0:0] -A %(bn)s-local -d 10.0.0.1 '
+                         '-j %(bn)s-inst-1' % {'bn': self.binary_name}
+                         in rules)
+
     def test_nat_rules(self):
         current_lines = self.sample_nat
         new_lines = self.manager._modify_rules(current_lines,
@@ -253,3 +269,181 @@ class IptablesManagerTestCase(test.TestCase):
                                                self.manager.ipv4['filter'],
                                                'filter')
         self.assertEqual(current_lines, new_lines)
+
+    def test_top_rule_duplicates_match_exactly(self):
+        # Only exact copies of a top rule, ignoring [packet:byte] counts,
+        # are taken as its duplicates; rules that merely contain it stay.
+        current_lines = list(self.sample_filter)
+        current_lines[12:13] = ['[8:16] -A FORWARD -j nova-filter-top',
+                                '[0:0] -A FORWARD -j nova-filter-top-log']
+        new_lines = self.manager._modify_rules(current_lines,
+                                               self.manager.ipv4['filter'],
+                                               'filter')
+        self.assertTrue('[8:16] -A FORWARD -j nova-filter-top' in new_lines)
+        self.assertFalse('[0:0] -A FORWARD -j nova-filter-top' in new_lines)
+        self.assertTrue('[0:0] -A FORWARD -j nova-filter-top-log'
+                        in new_lines)
+
+    def _fake_apply(self):
+        self.flags(use_ipv6=False)
+        executes = []
+        inputs = []
+
+        def fake_execute(*args, **kwargs):
+            executes.append(args)
+            inputs.append(kwargs.get('process_input'))
+            if args[0] == 'iptables-save':
+                return '\n'.join(self.sample_filter + self.sample_nat), ''
+            return '', ''
+
+        self.manager.execute = fake_execute
+        self.manager.apply()
+        return executes, inputs
+
+    def test_incremental_apply_restores_changed_chains(self):
+        self.flags(iptables_incremental_apply=True)
+        executes, inputs = self._fake_apply()
+        self.assertEqual(executes, [('iptables-save', '-c'),
+                                    ('iptables-restore', '-c')])
+
+        table = self.manager.ipv4['filter']
+        table.add_chain('inst-1')
+        table.add_rule('inst-1', '-s 1.2.3.4/32 -j ACCEPT')
+        table.add_rule('local', '-d 10.0.0.2 -j $inst-1')
+        executes, inputs = self._fake_apply()
+        self.assertEqual(executes, [('iptables-restore', '-c', '--noflush')])
+        self.assertEqual(inputs[0].split('\n'), [
+            '*filter',
+            ':%s-inst-1 - [0:0]' % self.binary_name,
+            ':%s-local - [0:0]' % self.binary_name,
+            '[0:0] -A %s-inst-1 -s 1.2.3.4/32 -j ACCEPT' % self.binary_name,
+            '[0:0] -A %s-local -d 10.0.0.2 -j %s-inst-1' %
+            (self.binary_name, self.binary_name),
+            'COMMIT'])
+
+        executes, inputs = self._fake_apply()
+        self.assertEqual(executes, [])
+
+        table.remove_chain('inst-1')
+        executes, inputs = self._fake_apply()
+        self.assertEqual(executes, [('iptables-restore', '-c', '--noflush')])
+        self.assertEqual(inputs[0].split('\n'), [
+            '*filter',
+            ':%s-local - [0:0]' % self.binary_name,
+            ':%s-inst-1 - [0:0]' % self.binary_name,
+            '-X %s-inst-1' % self.binary_name,
+            'COMMIT'])
+
+    def test_incremental_apply_unwrapped_change_rewrites_tables(self):
+        self.flags(iptables_incremental_apply=True)
+        self._fake_apply()
+        self.manager.ipv4['filter'].add_rule('FORWARD', '-j ACCEPT',
+                                             wrap=False)
+        executes, inputs = self._fake_apply()
+        self.assertEqual(executes, [('iptables-save', '-c'),
+                                    ('iptables-restore', '-c')])
+
+    def test_incremental_apply_restores_flushed_chains(self):
+        self.flags(iptables_incremental_apply=True,
+                   iptables_full_apply_interval=3,
+                   use_ipv6=False)
+        kernel = {'lines': self.sample_filter + self.sample_nat}
+        executes = []
+
+        def fake_execute(*args, **kwargs):
+            executes.append(args)
+            if args[0] == 'iptables-save':
+                return '\n'.join(kernel['lines']), ''
+            if '--noflush' not in args:
+                kernel['lines'] = kwargs['process_input'].split('\n')
+            return '', ''
+
+        self.manager.execute = fake_execute
+        self.manager.apply()
+        self.assertEqual(executes, [('iptables-save', '-c'),
+                                    ('iptables-restore', '-c')])
+
+        # something outside of nova drops all the rules and chains
+        kernel['lines'] = ['# Generated by iptables-save',
+                           '*filter',
+                           ':INPUT ACCEPT [0:0]',
+                           ':FORWARD ACCEPT [0:0]',
+                           ':OUTPUT ACCEPT [0:0]',
+                           'COMMIT',
+                           '# Completed',
+                           '# Generated by iptables-save',
+                           '*nat',
+                           ':PREROUTING ACCEPT [0:0]',
+                           ':OUTPUT ACCEPT [0:0]',
+                           ':POSTROUTING ACCEPT [0:0]',
+                           'COMMIT',
+                           '# Completed']
+
+        del executes[:]
+        self.manager.apply()
+        self.manager.apply()
+        self.assertEqual(executes, [])
+
+        # the third apply rewrites every table
+        self.manager.apply()
+        self.assertEqual(executes, [('iptables-save', '-c'),
+                                    ('iptables-restore', '-c')])
+        for table_name in ('filter', 'nat'):
+            table = self.manager.ipv4[table_name]
+            for chain in table.unwrapped_chains:
+                self.assertTrue(':%s - [0:0]' % chain in kernel['lines'])
+            for chain in table.chains:
+                self.assertTrue(':%s-%s - [0:0]' % (self.binary_name, chain)
+                                in kernel['lines'])
+            for rule in table.rules:
+                self.assertTrue(str(rule) in kernel['lines'])
+
+        # and the count starts over
+        del executes[:]
+        self.manager.apply()
+        self.assertEqual(executes, [])
+
+    def test_incremental_apply_disabled(self):
+        self._fake_apply()
+        self.manager.ipv4['filter'].add_rule('local', '-j ACCEPT')
+        executes, inputs = self._fake_apply()
+        self.assertEqual(executes, [('iptables-save', '-c'),
+                                    ('iptables-restore', '-c')])
+
+    def test_apply_coalesces_changes(self):
+        self.flags(iptables_apply_coalesce_interval=0.5)
+        scheduled = []
+        applied = []
+        self.stubs.Set(linux_net.greenthread, 'spawn_after',
+                       lambda delay, func: scheduled.append(func))
+        self.stubs.Set(self.manager, '_apply', lambda: applied.append(1))
+
+        self.manager.apply()
+        self.manager.apply()
+        self.manager.apply()
+        self.assertEqual(len(scheduled), 1)
+        self.assertEqual(applied, [])
+
+        scheduled[0]()
+        self.assertEqual(applied, [1])
+
+        self.manager.apply()
+        self.assertEqual(len(scheduled), 2)
+
+    def test_apply_coalesced_wait(self):
+        self.flags(iptables_apply_coalesce_interval=0.01)
+        applied = []
+        self.stubs.Set(self.manager, '_apply', lambda: applied.append(1))
+
+        self.manager.apply(wait=True)
+        self.assertEqual(applied, [1])
+
+    def test_apply_coalesced_wait_raises(self):
+        self.flags(iptables_apply_coalesce_interval=0.01)
+
+        def fake_apply():
+            raise exception.ProcessExecutionError()
+
+        self.stubs.Set(self.manager, '_apply', fake_apply)
+        self.assertRaises(exception.ProcessExecutionError,
+                          self.manager.apply, wait=True)
@@ -39,6 +39,7 @@ from nova.compute import vm_states
 from nova import context
 from nova import db
 from nova import exception
+from nova.network import linux_net
 from nova.openstack.common import fileutils
 from nova.openstack.common import importutils
 from nova.openstack.common import jsonutils
@@ -1078,6 +1079,74 @@ class LibvirtConnTestCase(test.TestCase):
         # None should be listed, since we fake deleted the last one
         self.assertEquals(len(instances), 0)
 
+    def _fake_domains(self):
+        class FakeDomain(object):
+            def __init__(self, domain_id, name, state):
+                self.domain_id = domain_id
+                self._name = name
+                self.state = state
+
+            def ID(self):
+                return self.domain_id
+
+            def name(self):
+                return self._name
+
+            def info(self):
+                if self.state is None:
+                    raise libvirt.libvirtError("we deleted an instance!")
+                return [self.state, 2048 * 1024, 1024 * 1024, 1, 10]
+
+        return [FakeDomain(0, 'Domain-0', libvirt.VIR_DOMAIN_RUNNING),
+                FakeDomain(1, 'running', libvirt.VIR_DOMAIN_RUNNING),
+                FakeDomain(2, 'paused', libvirt.VIR_DOMAIN_PAUSED),
+                FakeDomain(3, 'deleted', None),
+                FakeDomain(-1, 'defined', libvirt.VIR_DOMAIN_SHUTOFF)]
+
+    def test_get_power_states(self):
+        domains = self._fake_domains()
+
+        class FakeConn(object):
+            def listAllDomains(self, flags):
+                return domains
+
+        self.stubs.Set(libvirt_driver.LibvirtDriver, '_conn', FakeConn())
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual(conn.get_power_states(),
+                         {'running': power_state.RUNNING,
+                          'paused': power_state.PAUSED,
+                          'defined': power_state.SHUTDOWN})
+
+    def test_get_power_states_without_list_all_domains(self):
+        domains = dict((domain.name(), domain)
+                       for domain in self._fake_domains())
+
+        class FakeConn(object):
+            def numOfDomains(self):
+                return 4
+
+            def listDomainsID(self):
+                return [0, 1, 2, 3, 4]
+
+            def lookupByID(self, domain_id):
+                for domain in domains.values():
+                    if domain.ID() == domain_id:
+                        return domain
+                raise libvirt.libvirtError("we deleted an instance!")
+
+            def listDefinedDomains(self):
+                return ['defined']
+
+            def lookupByName(self, name):
+                return domains[name]
+
+        self.stubs.Set(libvirt_driver.LibvirtDriver, '_conn', FakeConn())
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        self.assertEqual(conn.get_power_states(),
+                         {'running': power_state.RUNNING,
+                          'paused': power_state.PAUSED,
+                          'defined': power_state.SHUTDOWN})
+
     def test_get_all_block_devices(self):
         xml = [
             # NOTE(vish): id 0 is skipped
@@ -3111,13 +3180,39 @@ class LibvirtConnTestCase(test.TestCase):
         # NOTE(vish): verifies destroy doesn't raise if the instance disappears
         conn._destroy(instance)
 
+    def _fake_usage_domains(self, *domains):
+        class UsageFakeDomain(object):
+            def __init__(self, domain_id, name, memory=0, vcpus=0):
+                self.domain_id = domain_id
+                self._name = name
+                self.memory = memory
+                self._vcpus = vcpus
+
+            def ID(self):
+                return self.domain_id
+
+            def name(self):
+                return self._name
+
+            def info(self):
+                if self._vcpus is None:
+                    err = libvirt.libvirtError('domain vanished')
+                    err.get_error_code = lambda: libvirt.VIR_ERR_NO_DOMAIN
+                    raise err
+                return [libvirt.VIR_DOMAIN_RUNNING, self.memory,
+                        self.memory, self._vcpus, 10]
+
+            def XMLDesc(self, flags):
+                return '<domain name="%s"/>' % self._name
+
+        return [UsageFakeDomain(*domain) for domain in domains]
+
     def test_disk_over_committed_size_total(self):
         # Ensure destroy calls managedSaveRemove for saved instance.
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
 
-        def list_instances():
-            return ['fake1', 'fake2']
-        self.stubs.Set(conn, 'list_instances', list_instances)
+        domains = self._fake_usage_domains((1, 'fake1'), (-1, 'fake2'))
+        self.stubs.Set(conn, '_list_domains', lambda: domains)
 
         fake_disks = {'fake1': [{'type': 'qcow2', 'path': '/somepath/disk1',
                                  'virt_disk_size': '10737418240',
@@ -3130,13 +3225,54 @@ class LibvirtConnTestCase(test.TestCase):
                                  'disk_size':'10737418240',
                                  'over_committed_disk_size':'0'}]}
 
-        def get_info(instance_name):
+        def get_info(instance_name, xml=None):
+            self.assertEqual(xml, '<domain name="%s"/>' % instance_name)
             return jsonutils.dumps(fake_disks.get(instance_name))
         self.stubs.Set(conn, 'get_instance_disk_info', get_info)
 
         result = conn.get_disk_over_committed_size_total()
         self.assertEqual(result, 10653532160)
 
+    def test_domain_usage_single_sweep(self):
+        self.flags(libvirt_domain_usage_cache_ttl=60)
+        conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        domains = self._fake_usage_domains((0, 'Domain-0', 4096, 2),
+                                           (1, 'fake1', 1024, 1),
+                                           (2, 'fake2', 2048, 2),
+                                           (3, 'vanished', 0, None),
+                                           (-1, 'defined', 2048, 4))
+        calls = {'list_domains': 0, 'disk_info': []}
+
+        def fake_list_domains():
+            calls['list_domains'] += 1
+            return domains
+
+        def fake_get_instance_disk_info(instance_name, xml=None):
+            calls['disk_info'].append(instance_name)
+            return jsonutils.dumps([{'over_committed_disk_size': 10}])
+
+        self.stubs.Set(conn, '_list_domains', fake_list_domains)
+        self.stubs.Set(conn, 'get_instance_disk_info',
+                       fake_get_instance_disk_info)
+
+        usage = conn._get_domain_usage()
+        self.assertEqual(usage['vcpus_used'], 5)
+        self.assertEqual(usage['memory_kb_used'], 3072)
+        self.assertEqual(usage['dom0_memory_kb'], 4096)
+        self.assertEqual(usage['disk_over_committed_size'], 30)
+        self.assertEqual(usage['domains'], 5)
+        self.assertTrue(usage['duration'] >= 0)
+        self.assertEqual(calls['disk_info'], ['fake1', 'fake2', 'defined'])
+
+        # The sweep is reused until libvirt_domain_usage_cache_ttl expires
+        self.assertEqual(conn.get_vcpu_used(), 5)
+        self.assertEqual(conn.get_disk_over_committed_size_total(), 30)
+        self.assertEqual(calls['list_domains'], 1)
+
+        self.flags(libvirt_domain_usage_cache_ttl=0)
+        conn.get_vcpu_used()
+        self.assertEqual(calls['list_domains'], 2)
+
     def test_cpu_info(self):
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
 
@@ -3572,35 +3708,6 @@ class LibvirtConnTestCase(test.TestCase):
                   }
         self.assertEqual(actual, expect)
 
-    def test_failing_vcpu_count(self):
-        """Domain can fail to return the vcpu description in case it's
-        just starting up or shutting down. Make sure None is handled
-        gracefully.
-        """
-
-        class DiagFakeDomain(object):
-            def __init__(self, vcpus):
-                self._vcpus = vcpus
-
-            def vcpus(self):
-                if self._vcpus is None:
-                    return None
-                else:
-                    return ([1] * self._vcpus, [True] * self._vcpus)
-
-        driver = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
-        conn = driver._conn
-        self.mox.StubOutWithMock(driver, 'list_instance_ids')
-        conn.lookupByID = self.mox.CreateMockAnything()
-
-        driver.list_instance_ids().AndReturn([1, 2])
-        conn.lookupByID(1).AndReturn(DiagFakeDomain(None))
-        conn.lookupByID(2).AndReturn(DiagFakeDomain(5))
-
-        self.mox.ReplayAll()
-
-        self.assertEqual(5, driver.get_vcpu_used())
-
     def test_get_instance_capabilities(self):
         conn = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), True)
 
@@ -4103,6 +4210,71 @@ class IptablesFirewallTestCase(test.TestCase):
         self.fw.instances[instance_ref['id']] = instance_ref
         self.fw.do_refresh_security_group_rules("fake")
 
+    def _stub_shared_security_groups(self):
+        self.flags(iptables_shared_security_group_chains=True)
+        calls = {'rules': 0, 'members': 0}
+        grantee = {'id': 2, 'instances': []}
+
+        def fake_get_by_instance(ctxt, instance):
+            return [{'id': 1}]
+
+        def fake_rule_get(ctxt, security_group):
+            calls['rules'] += 1
+            return [{'cidr': '192.168.10.0/24', 'protocol': 'tcp',
+                     'from_port': 80, 'to_port': 80, 'grantee_group': None},
+                    {'cidr': None, 'protocol': 'tcp', 'from_port': 22,
+                     'to_port': 22, 'grantee_group': grantee}]
+
+        def fake_member_rules(ctxt, security_group):
+            calls['members'] += 1
+            return ['-s 10.11.12.13 -j ACCEPT']
+
+        self.stubs.Set(self.fw._virtapi, 'security_group_get_by_instance',
+                       fake_get_by_instance)
+        self.stubs.Set(self.fw._virtapi,
+                       'security_group_rule_get_by_security_group',
+                       fake_rule_get)
+        self.stubs.Set(self.fw, 'security_group_member_rules',
+                       fake_member_rules)
+        self.stubs.Set(self.fw.nwfilter, 'unfilter_instance',
+                       lambda *args: None)
+        return calls
+
+    def _chain_rules(self, chain):
+        return [rule.rule for rule in self.fw.iptables.ipv4['filter'].rules
+                if rule.chain == chain]
+
+    def test_shared_security_group_chains(self):
+        calls = self._stub_shared_security_groups()
+        network_info = _fake_network_info(self.stubs, 1)
+        instances = [self._create_instance_ref() for i in xrange(3)]
+        for instance_ref in instances:
+            self.fw.prepare_instance_filter(instance_ref, network_info)
+
+        self.assertEqual(calls, {'rules': 1, 'members': 1})
+        binary_name = linux_net.get_binary_name()
+        for instance_ref in instances:
+            inst_rules = self._chain_rules('inst-%s' % instance_ref['id'])
+            self.assertTrue('-j %s-nova-sg-1' % binary_name in inst_rules)
+            self.assertFalse([rule for rule in inst_rules
+                              if '--dport' in rule])
+        self.assertEqual(self._chain_rules('nova-sg-1'),
+                         ['-j ACCEPT -p tcp --dport 80 -s 192.168.10.0/24',
+                          '-p tcp --dport 22 -j %s-sgm-2' % binary_name])
+        self.assertEqual(self._chain_rules('sgm-2'),
+                         ['-s 10.11.12.13 -j ACCEPT'])
+
+        self.fw.refresh_security_group_members(2)
+        self.assertEqual(calls, {'rules': 2, 'members': 2})
+        self.fw.refresh_security_group_members(3)
+        self.assertEqual(calls, {'rules': 2, 'members': 2})
+
+        for instance_ref in instances:
+            self.fw.unfilter_instance(instance_ref, network_info)
+        chains = self.fw.iptables.ipv4['filter'].chains
+        self.assertFalse('nova-sg-1' in chains)
+        self.assertFalse('sgm-2' in chains)
+
     def test_unfilter_instance_undefines_nwfilter(self):
         admin_ctxt = context.get_admin_context()
 
@@ -37,8 +37,11 @@ from nova.api.metadata import base
 from nova.api.metadata import handler
 from nova.api.metadata import password
 from nova import block_device
+from nova import cache_utils
+from nova.compute import api as compute_api
 from nova.compute import instance_types
 from nova.conductor import api as conductor_api
+from nova import context
 from nova import db
 from nova.db.sqlalchemy import api
 from nova import exception
@@ -142,6 +145,8 @@ class MetadataTestCase(test.TestCase):
         # required for memcache backend to work correctly.
         md = fake_InstanceMetadata(self.stubs, copy.copy(self.instance))
         pickle.dumps(md, protocol=0)
+        md.prerender()
+        pickle.dumps(md, protocol=0)
 
     def test_user_data(self):
         inst = copy.copy(self.instance)
@@ -389,6 +394,19 @@ class OpenStackMetadataTestCase(test.TestCase):
         mdjson = mdinst.lookup("/openstack/2012-08-10/meta_data.json")
         self.assertFalse("random_seed" in json.loads(mdjson))
 
+    def test_random_seed_not_cached(self):
+        inst = copy.copy(self.instance)
+        mdinst = fake_InstanceMetadata(self.stubs, inst)
+        mdinst.prerender()
+
+        path = "/openstack/2013-04-04/meta_data.json"
+        first = json.loads(mdinst.lookup(path))
+        second = json.loads(mdinst.lookup(path))
+        self.assertNotEqual(first["random_seed"], second["random_seed"])
+        del first["random_seed"]
+        del second["random_seed"]
+        self.assertEqual(first, second)
+
     def test_no_dashes_in_metadata(self):
         # top level entries in meta_data should not contain '-' in their name
         inst = copy.copy(self.instance)
@@ -411,6 +429,106 @@ class MetadataHandlerTestCase(test.TestCase):
         self.flags(use_local=True, group='conductor')
         self.mdinst = fake_InstanceMetadata(self.stubs, self.instance,
             address=None, sgroups=None)
+        cache_utils.reset_metadata_client()
+        self.addCleanup(cache_utils.reset_metadata_client)
+
+    def _stub_get_metadata_by_address(self):
+        calls = []
+
+        def fake_get_metadata(conductor_api, address):
+            calls.append(address)
+            return self.mdinst
+
+        self.stubs.Set(base, 'get_metadata_by_address', fake_get_metadata)
+        return calls
+
+    def test_metadata_cached_by_address(self):
+        calls = self._stub_get_metadata_by_address()
+        app = handler.MetadataRequestHandler()
+
+        self.assertEqual(self.mdinst,
+                         app.get_metadata_by_remote_address('10.0.0.1'))
+        self.assertEqual(self.mdinst,
+                         app.get_metadata_by_remote_address('10.0.0.1'))
+        self.assertEqual(['10.0.0.1'], calls)
+        self.assertEqual({'hits': 1, 'misses': 1}, app.get_cache_stats())
+
+        cache_utils.invalidate_metadata(self.instance['uuid'],
+                                        {'task_state': None})
+        app.get_metadata_by_remote_address('10.0.0.1')
+        self.assertEqual(['10.0.0.1'], calls)
+
+        cache_utils.invalidate_metadata(self.instance['uuid'],
+                                        {'system_metadata': {}})
+        app.get_metadata_by_remote_address('10.0.0.1')
+        self.assertEqual(['10.0.0.1', '10.0.0.1'], calls)
+
+    def test_metadata_cache_invalidated_by_rebuild_resize_volumes(self):
+        ctxt = context.get_admin_context()
+        inst = db.instance_create(ctxt, {'instance_type_id': 1,
+                                         'image_ref': 'fake-image-1',
+                                         'host': 'fake-host'})
+        self.addCleanup(db.instance_destroy, ctxt, inst['uuid'])
+        rendered = []
+
+        def fake_get_metadata(conductor_api, address):
+            instance = db.instance_get_by_uuid(ctxt, inst['uuid'])
+            mdinst = copy.copy(self.mdinst)
+            mdinst.uuid = instance['uuid']
+            mdinst.image_ref = instance['image_ref']
+            mdinst.instance_type_id = instance['instance_type_id']
+            rendered.append(mdinst)
+            return mdinst
+
+        self.stubs.Set(base, 'get_metadata_by_address', fake_get_metadata)
+        app = handler.MetadataRequestHandler()
+        capi = conductor_api.LocalAPI()
+
+        def lookup():
+            return app.get_metadata_by_remote_address('10.0.0.1')
+
+        lookup()
+        capi.instance_update(ctxt, inst['uuid'], task_state='rebuilding')
+        self.assertEqual(1, len(rendered))
+        self.assertEqual('fake-image-1', lookup().image_ref)
+
+        # Rebuild
+        compute_api.API()._instance_update(ctxt, inst['uuid'],
+                                           image_ref='fake-image-2')
+        self.assertEqual('fake-image-2', lookup().image_ref)
+        self.assertEqual(2, len(rendered))
+
+        # Resize
+        capi.instance_update(ctxt, inst['uuid'], instance_type_id=2)
+        self.assertEqual(2, lookup().instance_type_id)
+        self.assertEqual(3, len(rendered))
+
+        # Volume attach, connection info update and detach
+        capi.block_device_mapping_create(ctxt,
+                {'instance_uuid': inst['uuid'], 'device_name': '/dev/vdb',
+                 'volume_id': 'fake-volume'})
+        lookup()
+        self.assertEqual(4, len(rendered))
+        bdm = db.block_device_mapping_get_all_by_instance(ctxt,
+                                                          inst['uuid'])[0]
+        capi.block_device_mapping_update(ctxt, bdm['id'],
+                                         {'connection_info': '{}'})
+        lookup()
+        self.assertEqual(4, len(rendered))
+        capi.block_device_mapping_destroy_by_instance_and_volume(ctxt,
+                inst, 'fake-volume')
+        lookup()
+        self.assertEqual(5, len(rendered))
+
+    def test_metadata_cache_disabled(self):
+        self.flags(metadata_cache_expiration=0)
+        calls = self._stub_get_metadata_by_address()
+        app = handler.MetadataRequestHandler()
+
+        app.get_metadata_by_remote_address('10.0.0.1')
+        app.get_metadata_by_remote_address('10.0.0.1')
+        self.assertEqual(['10.0.0.1', '10.0.0.1'], calls)
+        self.assertEqual({'hits': 0, 'misses': 2}, app.get_cache_stats())
 
     def test_callable(self):
 
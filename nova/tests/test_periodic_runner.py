@@ -0,0 +1,131 @@
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the concurrent periodic task runner."""
+
+from eventlet import event
+from eventlet import greenthread
+
+from nova import context
+from nova import manager
+from nova.openstack.common import periodic_task
+from nova import periodic_runner
+from nova import test
+
+
+class FakeManager(manager.Manager):
+    def __init__(self):
+        super(FakeManager, self).__init__()
+        self.slow_started = event.Event()
+        self.release_slow = event.Event()
+        self.fast_runs = 0
+
+    @periodic_task.periodic_task
+    def slow_task(self, context):
+        self.slow_started.send()
+        self.release_slow.wait()
+
+    @periodic_task.periodic_task
+    def fast_task(self, context):
+        self.fast_runs += 1
+
+
+class FailingManager(manager.Manager):
+    @periodic_task.periodic_task
+    def failing_task(self, context):
+        raise test.TestingException()
+
+
+class SleepingManager(manager.Manager):
+    @periodic_task.periodic_task
+    def sleeping_task(self, context):
+        greenthread.sleep(10)
+
+
+class PeriodicTaskRunnerTestCase(test.TestCase):
+    def setUp(self):
+        super(PeriodicTaskRunnerTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.flags(periodic_task_workers=4)
+
+    def test_slow_task_does_not_delay_others(self):
+        fake = FakeManager()
+        fake.periodic_tasks(self.context)
+        fake.slow_started.wait()
+        greenthread.sleep(0)
+        self.assertEqual(fake.fast_runs, 1)
+
+        # the slow task is not started again while it is still running
+        fake.periodic_tasks(self.context)
+        greenthread.sleep(0)
+        self.assertEqual(fake.fast_runs, 2)
+        stats = fake.get_periodic_task_stats()
+        self.assertEqual(stats['fast_task']['runs'], 2)
+        self.assertFalse('slow_task' in stats)
+
+        fake.release_slow.send()
+        fake._periodic_runner.pool.waitall()
+        stats = fake.get_periodic_task_stats()
+        self.assertEqual(stats['slow_task']['runs'], 1)
+        self.assertFalse(stats['slow_task']['running'])
+
+    def test_duration_histogram(self):
+        fake = FakeManager()
+        fake.release_slow.send()
+        fake.periodic_tasks(self.context, raise_on_error=True)
+        histogram = fake.get_periodic_task_stats()['fast_task']['histogram']
+        self.assertEqual(histogram['le_0.1'], 1)
+        self.assertEqual(sum(histogram.values()), 1)
+
+    def test_raise_on_error(self):
+        failing = FailingManager()
+        self.assertRaises(test.TestingException, failing.periodic_tasks,
+                          self.context, raise_on_error=True)
+        stats = failing.get_periodic_task_stats()
+        self.assertEqual(stats['failing_task']['failures'], 1)
+
+    def test_time_budget(self):
+        self.stubs.Set(periodic_runner.PeriodicTaskRunner, '_time_budget',
+                       lambda self, task_name: 0.01)
+        sleeping = SleepingManager()
+        sleeping.periodic_tasks(self.context, raise_on_error=True)
+        stats = sleeping.get_periodic_task_stats()
+        self.assertEqual(stats['sleeping_task']['timeouts'], 1)
+        self.assertEqual(stats['sleeping_task']['runs'], 0)
+
+    def test_time_budgets_parsed(self):
+        self.flags(periodic_task_time_budget=60,
+                   periodic_task_time_budgets=['sleeping_task:300', 'bogus'])
+        runner = periodic_runner.PeriodicTaskRunner(SleepingManager(), 1)
+        self.assertEqual(runner._time_budget('sleeping_task'), 300)
+        self.assertEqual(runner._time_budget('other_task'), 60)
+
+    def test_jitter(self):
+        self.flags(periodic_task_jitter=0.5)
+        self.stubs.Set(periodic_runner.random, 'uniform',
+                       lambda low, high: high)
+        runner = periodic_runner.PeriodicTaskRunner(SleepingManager(), 1)
+        self.assertEqual(runner._delay(60), 30)
+        self.assertEqual(runner._delay(None), 0)
+
+    def test_serial_without_workers(self):
+        self.flags(periodic_task_workers=0)
+        fake = FakeManager()
+        fake.release_slow.send()
+        fake.periodic_tasks(self.context)
+        self.assertEqual(fake.fast_runs, 1)
+        self.assertEqual(fake.get_periodic_task_stats(), {})
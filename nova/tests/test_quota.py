@@ -304,6 +304,9 @@ class FakeDriver(object):
     def destroy_all_by_project(self, context, project_id):
         self.called.append(('destroy_all_by_project', context, project_id))
 
+    def invalidate_limits(self, project_id=None, quota_class=None):
+        self.called.append(('invalidate_limits', project_id, quota_class))
+
     def expire(self, context):
         self.called.append(('expire', context))
 
@@ -693,6 +696,17 @@ class QuotaEngineTestCase(test.TestCase):
                 ('destroy_all_by_project', context, 'test_project'),
                 ])
 
+    def test_invalidate_limits(self):
+        driver = FakeDriver()
+        quota_obj = self._make_quota_obj(driver)
+        quota_obj.invalidate_limits(project_id='test_project')
+        quota_obj.invalidate_limits(quota_class='test_class')
+
+        self.assertEqual(driver.called, [
+                ('invalidate_limits', 'test_project', None),
+                ('invalidate_limits', None, 'test_class'),
+                ])
+
     def test_expire(self):
         context = FakeContext(None, None)
         driver = FakeDriver()
@@ -1214,6 +1228,53 @@ class DbQuotaDriverTestCase(test.TestCase):
                 security_group_rules=20,
                 ))
 
+    def test_get_quotas_cached(self):
+        self.flags(quota_limits_cache_ttl=10)
+        self._stub_get_project_quotas()
+        context = FakeContext('test_project', 'test_class')
+        for i in range(2):
+            result = self.driver._get_quotas(context,
+                                             quota.QUOTAS._resources,
+                                             ['instances', 'cores'], True)
+            self.assertEqual(result, dict(instances=10, cores=20))
+        self.assertEqual(self.calls, ['get_project_quotas'])
+
+        self.driver._get_quotas(FakeContext('other_project', 'test_class'),
+                                quota.QUOTAS._resources, ['instances'], True)
+        self.assertEqual(self.calls, ['get_project_quotas'] * 2)
+
+        timeutils.advance_time_seconds(10)
+        self.driver._get_quotas(context, quota.QUOTAS._resources,
+                                ['instances'], True)
+        self.assertEqual(self.calls, ['get_project_quotas'] * 3)
+
+    def test_invalidate_limits(self):
+        self.flags(quota_limits_cache_ttl=10)
+        self._stub_get_project_quotas()
+        context = FakeContext('test_project', 'test_class')
+        other_context = FakeContext('other_project', 'other_class')
+
+        def get_quotas():
+            for ctxt in (context, other_context):
+                self.driver._get_quotas(ctxt, quota.QUOTAS._resources,
+                                        ['instances'], True,
+                                        project_id=ctxt.project_id)
+
+        get_quotas()
+        self.assertEqual(len(self.calls), 2)
+
+        self.driver.invalidate_limits(project_id='test_project')
+        get_quotas()
+        self.assertEqual(len(self.calls), 3)
+
+        self.driver.invalidate_limits(quota_class='other_class')
+        get_quotas()
+        self.assertEqual(len(self.calls), 4)
+
+        self.driver.invalidate_limits()
+        get_quotas()
+        self.assertEqual(len(self.calls), 6)
+
     def test_limit_check_under(self):
         self._stub_get_project_quotas()
         self.assertRaises(exception.InvalidQuotaValue,
@@ -1390,8 +1451,10 @@ class FakeSession(object):
 
 
 class FakeUsage(sqa_models.QuotaUsage):
+    saved = False
+
     def save(self, *args, **kwargs):
-        pass
+        self.saved = True
 
 
 class QuotaReserveSqlAlchemyTestCase(test.TestCase):
@@ -1443,20 +1506,21 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
 
             return quota_usage_ref
 
-        def fake_reservation_create(context, uuid, usage_id, project_id,
-                                    resource, delta, expire, session=None):
-            reservation_ref = self._make_reservation(
-                uuid, usage_id, project_id, resource, delta, expire,
-                timeutils.utcnow(), timeutils.utcnow())
-
-            self.reservations_created[resource] = reservation_ref
+        def fake_reservation_create_all(session, reservations):
+            for values in reservations:
+                reservation_ref = self._make_reservation(
+                    values['uuid'], values['usage_id'], values['project_id'],
+                    values['resource'], values['delta'], values['expire'],
+                    timeutils.utcnow(), timeutils.utcnow())
 
-            return reservation_ref
+                self.reservations_created[values['resource']] = \
+                    reservation_ref
 
         self.stubs.Set(sqa_api, 'get_session', fake_get_session)
         self.stubs.Set(sqa_api, '_get_quota_usages', fake_get_quota_usages)
         self.stubs.Set(sqa_api, '_quota_usage_create', fake_quota_usage_create)
-        self.stubs.Set(sqa_api, 'reservation_create', fake_reservation_create)
+        self.stubs.Set(sqa_api, '_reservation_create_all',
+                       fake_reservation_create_all)
 
         self.useFixture(test.TimeOverride())
 
@@ -1567,15 +1631,15 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
                 ])
         self.compare_reservation(result, [
                 dict(resource='instances',
-                     usage_id=self.usages_created['instances'],
+                     usage_id=self.usages_created['instances'].id,
                      project_id='test_project',
                      delta=2),
                 dict(resource='cores',
-                     usage_id=self.usages_created['cores'],
+                     usage_id=self.usages_created['cores'].id,
                      project_id='test_project',
                      delta=4),
                 dict(resource='ram',
-                     usage_id=self.usages_created['ram'],
+                     usage_id=self.usages_created['ram'].id,
                      delta=2 * 1024),
                 ])
 
@@ -1618,15 +1682,15 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         self.assertEqual(self.usages_created, {})
         self.compare_reservation(result, [
                 dict(resource='instances',
-                     usage_id=self.usages['instances'],
+                     usage_id=self.usages['instances'].id,
                      project_id='test_project',
                      delta=2),
                 dict(resource='cores',
-                     usage_id=self.usages['cores'],
+                     usage_id=self.usages['cores'].id,
                      project_id='test_project',
                      delta=4),
                 dict(resource='ram',
-                     usage_id=self.usages['ram'],
+                     usage_id=self.usages['ram'].id,
                      delta=2 * 1024),
                 ])
 
@@ -1669,15 +1733,15 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         self.assertEqual(self.usages_created, {})
         self.compare_reservation(result, [
                 dict(resource='instances',
-                     usage_id=self.usages['instances'],
+                     usage_id=self.usages['instances'].id,
                      project_id='test_project',
                      delta=2),
                 dict(resource='cores',
-                     usage_id=self.usages['cores'],
+                     usage_id=self.usages['cores'].id,
                      project_id='test_project',
                      delta=4),
                 dict(resource='ram',
-                     usage_id=self.usages['ram'],
+                     usage_id=self.usages['ram'].id,
                      delta=2 * 1024),
                 ])
 
@@ -1726,15 +1790,15 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         self.assertEqual(self.usages_created, {})
         self.compare_reservation(result, [
                 dict(resource='instances',
-                     usage_id=self.usages['instances'],
+                     usage_id=self.usages['instances'].id,
                      project_id='test_project',
                      delta=2),
                 dict(resource='cores',
-                     usage_id=self.usages['cores'],
+                     usage_id=self.usages['cores'].id,
                      project_id='test_project',
                      delta=4),
                 dict(resource='ram',
-                     usage_id=self.usages['ram'],
+                     usage_id=self.usages['ram'].id,
                      delta=2 * 1024),
                 ])
 
@@ -1777,15 +1841,15 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         self.assertEqual(self.usages_created, {})
         self.compare_reservation(result, [
                 dict(resource='instances',
-                     usage_id=self.usages['instances'],
+                     usage_id=self.usages['instances'].id,
                      project_id='test_project',
                      delta=2),
                 dict(resource='cores',
-                     usage_id=self.usages['cores'],
+                     usage_id=self.usages['cores'].id,
                      project_id='test_project',
                      delta=4),
                 dict(resource='ram',
-                     usage_id=self.usages['ram'],
+                     usage_id=self.usages['ram'].id,
                      delta=2 * 1024),
                 ])
 
@@ -1828,15 +1892,15 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         self.assertEqual(self.usages_created, {})
         self.compare_reservation(result, [
                 dict(resource='instances',
-                     usage_id=self.usages['instances'],
+                     usage_id=self.usages['instances'].id,
                      project_id='test_project',
                      delta=-2),
                 dict(resource='cores',
-                     usage_id=self.usages['cores'],
+                     usage_id=self.usages['cores'].id,
                      project_id='test_project',
                      delta=-4),
                 dict(resource='ram',
-                     usage_id=self.usages['ram'],
+                     usage_id=self.usages['ram'].id,
                      delta=-2 * 1024),
                 ])
 
@@ -1920,19 +1984,50 @@ class QuotaReserveSqlAlchemyTestCase(test.TestCase):
         self.assertEqual(self.usages_created, {})
         self.compare_reservation(result, [
                 dict(resource='instances',
-                     usage_id=self.usages['instances'],
+                     usage_id=self.usages['instances'].id,
                      project_id='test_project',
                      delta=-2),
                 dict(resource='cores',
-                     usage_id=self.usages['cores'],
+                     usage_id=self.usages['cores'].id,
                      project_id='test_project',
                      delta=-4),
                 dict(resource='ram',
-                     usage_id=self.usages['ram'],
+                     usage_id=self.usages['ram'].id,
                      project_id='test_project',
                      delta=-2 * 1024),
                 ])
 
+    def test_quota_reserve_saves_changed_usages_only(self):
+        self.init_usage('test_project', 'instances', 2, 0)
+        self.init_usage('test_project', 'cores', 4, 0)
+        self.init_usage('test_project', 'ram', 2 * 1024, 0)
+        context = FakeContext('test_project', 'test_class')
+        quotas = dict(
+            instances=5,
+            cores=10,
+            ram=10 * 1024,
+            )
+        deltas = dict(
+            instances=1,
+            cores=-2,
+            )
+        result = sqa_api.quota_reserve(context, self.resources, quotas,
+                                       deltas, self.expire, 0, 0)
+
+        self.assertTrue(self.usages['instances'].saved)
+        self.assertFalse(self.usages['cores'].saved)
+        self.assertFalse(self.usages['ram'].saved)
+        self.compare_reservation(result, [
+                dict(resource='instances',
+                     usage_id=self.usages['instances'].id,
+                     project_id='test_project',
+                     delta=1),
+                dict(resource='cores',
+                     usage_id=self.usages['cores'].id,
+                     project_id='test_project',
+                     delta=-2),
+                ])
+
 
 class NoopQuotaDriverTestCase(test.TestCase):
     def setUp(self):
@@ -154,6 +154,16 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_power_states(self):
+        """Return the power state of every instance on the hypervisor.
+
+        Returns a dict of instance name to one of the power_state codes,
+        built with as few calls to the hypervisor as possible.  Drivers
+        that cannot do better than one get_info call per instance should
+        leave this unimplemented.
+        """
+        raise NotImplementedError()
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
@@ -38,6 +38,11 @@ firewall_opts = [
     cfg.BoolOpt('allow_same_net_traffic',
                 default=True,
                 help='Whether to allow network traffic from same network'),
+    cfg.BoolOpt('iptables_shared_security_group_chains',
+                default=False,
+                help='Build one iptables chain per security group, shared '
+                     'by all instances in the group, instead of copying the '
+                     'group rules into every instance chain'),
 ]
 
 CONF = cfg.CONF
@@ -149,6 +154,14 @@ class IptablesFirewallDriver(FirewallDriver):
         self.network_infos = {}
         self.basically_filtered = False
 
+        # NOTE: only used with iptables_shared_security_group_chains.
+        # Security group ids used by each instance, the grantee group ids
+        # referenced by each security group chain and the grantee groups
+        # that have a members chain.
+        self.instance_security_groups = {}
+        self.security_group_grantees = {}
+        self.member_chains = set()
+
         # Flags for DHCP request rule
         self.dhcp_create = False
         self.dhcp_created = False
@@ -179,6 +192,7 @@ class IptablesFirewallDriver(FirewallDriver):
             # NOTE(vish): use the passed info instead of the stored info
             self.network_infos.pop(instance['id'])
             self.remove_filters_for_instance(instance)
+            self._forget_instance_security_groups(instance)
             self.iptables.apply()
         else:
             LOG.info(_('Attempted to unfilter instance which is not '
@@ -206,7 +220,8 @@ class IptablesFirewallDriver(FirewallDriver):
                     '-s 0.0.0.0/32 -d 255.255.255.255/32 '
                     '-p udp -m udp --sport 68 --dport 67 -j ACCEPT')
             self.dhcp_created = True
-        self.iptables.apply()
+        # NOTE: the instance must not boot before its filters are in place
+        self.iptables.apply(wait=True)
 
     def _create_filter(self, ips, chain_name):
         return ['-d %s -j $%s' % (ip, chain_name) for ip in ips]
@@ -261,6 +276,10 @@ class IptablesFirewallDriver(FirewallDriver):
     def _security_group_chain_name(security_group_id):
         return 'nova-sg-%s' % (security_group_id,)
 
+    @staticmethod
+    def _security_group_members_chain_name(security_group_id):
+        return 'sgm-%s' % (security_group_id,)
+
     def _instance_chain_name(self, instance):
         return 'inst-%s' % (instance['id'],)
 
@@ -340,6 +359,26 @@ class IptablesFirewallDriver(FirewallDriver):
                     '--dports', '%s:%s' % (rule['from_port'],
                                            rule['to_port'])]
 
+    def _security_group_rule_args(self, rule, version):
+        """Return the protocol and port match of a security group rule."""
+        protocol = rule['protocol']
+
+        if protocol:
+            protocol = rule['protocol'].lower()
+
+        if version == 6 and protocol == 'icmp':
+            protocol = 'icmpv6'
+
+        args = []
+        if protocol:
+            args += ['-p', protocol]
+
+        if protocol in ['udp', 'tcp']:
+            args += self._build_tcp_udp_rule(rule, version)
+        elif protocol == 'icmp':
+            args += self._build_icmp_rule(rule, version)
+        return args
+
     def instance_rules(self, instance, network_info):
         # make sure this is legacy nw_info
         network_info = self._handle_network_info_model(network_info)
@@ -368,6 +407,24 @@ class IptablesFirewallDriver(FirewallDriver):
         security_groups = self._virtapi.security_group_get_by_instance(
             ctxt, instance)
 
+        if CONF.iptables_shared_security_group_chains:
+            security_group_ids = []
+            for security_group in security_groups:
+                security_group_ids.append(security_group['id'])
+                if security_group['id'] not in self.security_group_grantees:
+                    self._refresh_security_group_chain(ctxt,
+                                                       security_group['id'])
+                jump = '-j $%s' % self._security_group_chain_name(
+                    security_group['id'])
+                ipv4_rules.append(jump)
+                ipv6_rules.append(jump)
+            self.instance_security_groups[instance['id']] = security_group_ids
+
+            ipv4_rules += ['-j $sg-fallback']
+            ipv6_rules += ['-j $sg-fallback']
+
+            return ipv4_rules, ipv6_rules
+
         # then, security group chains and rules
         for security_group in security_groups:
             rules = self._virtapi.security_group_rule_get_by_security_group(
@@ -387,22 +444,8 @@ class IptablesFirewallDriver(FirewallDriver):
                 else:
                     fw_rules = ipv6_rules
 
-                protocol = rule['protocol']
-
-                if protocol:
-                    protocol = rule['protocol'].lower()
-
-                if version == 6 and protocol == 'icmp':
-                    protocol = 'icmpv6'
-
                 args = ['-j ACCEPT']
-                if protocol:
-                    args += ['-p', protocol]
-
-                if protocol in ['udp', 'tcp']:
-                    args += self._build_tcp_udp_rule(rule, version)
-                elif protocol == 'icmp':
-                    args += self._build_icmp_rule(rule, version)
+                args += self._security_group_rule_args(rule, version)
                 if rule['cidr']:
                     LOG.debug('Using cidr %r', rule['cidr'], instance=instance)
                     args += ['-s', rule['cidr']]
@@ -438,11 +481,142 @@ class IptablesFirewallDriver(FirewallDriver):
 
         return ipv4_rules, ipv6_rules
 
+    def security_group_rules(self, ctxt, security_group_id):
+        """Rules of the shared chain of a security group.
+
+        Rules granting access to another security group jump to the
+        members chain of that group, which accepts traffic from the
+        addresses of its instances.  Returns the ipv4 and ipv6 rules and
+        a dict of the grantee groups by id.
+
+        """
+        ipv4_rules = []
+        ipv6_rules = []
+        grantees = {}
+
+        rules = self._virtapi.security_group_rule_get_by_security_group(
+            ctxt, {'id': security_group_id})
+        for rule in rules:
+            LOG.debug(_('Adding security group rule: %r'), rule)
+
+            if not rule['cidr']:
+                version = 4
+            else:
+                version = netutils.get_ip_version(rule['cidr'])
+
+            if version == 4:
+                fw_rules = ipv4_rules
+            else:
+                fw_rules = ipv6_rules
+
+            args = self._security_group_rule_args(rule, version)
+            if rule['cidr']:
+                args = ['-j ACCEPT'] + args + ['-s', rule['cidr']]
+                fw_rules.append(' '.join(args))
+            elif rule['grantee_group']:
+                grantee_id = rule['grantee_group']['id']
+                grantees[grantee_id] = rule['grantee_group']
+                args += ['-j $%s' %
+                         self._security_group_members_chain_name(grantee_id)]
+                fw_rules.append(' '.join(args))
+
+        return ipv4_rules, ipv6_rules, grantees
+
+    def security_group_member_rules(self, ctxt, security_group):
+        """Rules of the members chain of a security group."""
+        nw_api = network.API()
+        capi = conductor.API()
+        ipv4_rules = []
+        for instance in security_group['instances']:
+            nw_info = nw_api.get_instance_nw_info(ctxt, instance,
+                                                  conductor_api=capi)
+            ipv4_rules += ['-s %s -j ACCEPT' % ip['address']
+                           for ip in nw_info.fixed_ips()
+                           if ip['version'] == 4]
+        return ipv4_rules
+
+    def _refresh_security_group_chain(self, ctxt, security_group_id,
+                                      refresh_members=()):
+        """Rebuild the shared chain of a security group.
+
+        Members chains are only built for grantee groups that do not have
+        one yet, or that are listed in refresh_members.
+
+        """
+        ipv4_rules, ipv6_rules, grantees = self.security_group_rules(
+            ctxt, security_group_id)
+        member_rules = {}
+        for grantee_id, grantee in grantees.iteritems():
+            if (grantee_id not in self.member_chains or
+                    grantee_id in refresh_members):
+                member_rules[grantee_id] = self.security_group_member_rules(
+                    ctxt, grantee)
+        self._inner_do_refresh_security_group_chain(
+            security_group_id, ipv4_rules, ipv6_rules, grantees.keys(),
+            member_rules)
+
+    @lockutils.synchronized('iptables', 'nova-', external=True)
+    def _inner_do_refresh_security_group_chain(self, security_group_id,
+                                               ipv4_rules, ipv6_rules,
+                                               grantee_ids, member_rules):
+        # NOTE: members chains are filled before the security group chain
+        # jumps to them, and a chain that already exists is only emptied,
+        # so the instance chains jumping to it are left alone.
+        ipv4_table = self.iptables.ipv4['filter']
+        for grantee_id, rules in member_rules.iteritems():
+            chain_name = self._security_group_members_chain_name(grantee_id)
+            ipv4_table.add_chain(chain_name)
+            ipv4_table.empty_chain(chain_name)
+            for rule in rules:
+                ipv4_table.add_rule(chain_name, rule)
+            self.member_chains.add(grantee_id)
+
+        chain_name = self._security_group_chain_name(security_group_id)
+        ipv4_table.add_chain(chain_name)
+        ipv4_table.empty_chain(chain_name)
+        if CONF.use_ipv6:
+            self.iptables.ipv6['filter'].add_chain(chain_name)
+            self.iptables.ipv6['filter'].empty_chain(chain_name)
+        self._add_filters(chain_name, ipv4_rules, ipv6_rules)
+        self.security_group_grantees[security_group_id] = set(grantee_ids)
+
+    def _forget_instance_security_groups(self, instance):
+        if CONF.iptables_shared_security_group_chains:
+            self.instance_security_groups.pop(instance['id'], None)
+            self._purge_security_group_chains()
+
+    @lockutils.synchronized('iptables', 'nova-', external=True)
+    def _purge_security_group_chains(self):
+        """Remove the shared chains no filtered instance uses anymore."""
+        used = set()
+        for instance_id in self.instances:
+            used.update(self.instance_security_groups.get(instance_id, ()))
+
+        for security_group_id in self.security_group_grantees.keys():
+            if security_group_id in used:
+                continue
+            chain_name = self._security_group_chain_name(security_group_id)
+            self.iptables.ipv4['filter'].remove_chain(chain_name)
+            if CONF.use_ipv6:
+                self.iptables.ipv6['filter'].remove_chain(chain_name)
+            del self.security_group_grantees[security_group_id]
+
+        used = set()
+        for grantee_ids in self.security_group_grantees.values():
+            used.update(grantee_ids)
+        for grantee_id in self.member_chains - used:
+            self.iptables.ipv4['filter'].remove_chain(
+                self._security_group_members_chain_name(grantee_id))
+            self.member_chains.remove(grantee_id)
+
     def instance_filter_exists(self, instance, network_info):
         pass
 
     def refresh_security_group_members(self, security_group):
-        self.do_refresh_security_group_rules(security_group)
+        if CONF.iptables_shared_security_group_chains:
+            self.do_refresh_security_group_members(security_group)
+        else:
+            self.do_refresh_security_group_rules(security_group)
         self.iptables.apply()
 
     def refresh_security_group_rules(self, security_group):
@@ -451,6 +625,8 @@ class IptablesFirewallDriver(FirewallDriver):
 
     def refresh_instance_security_rules(self, instance):
         self.do_refresh_instance_rules(instance)
+        if CONF.iptables_shared_security_group_chains:
+            self._purge_security_group_chains()
         self.iptables.apply()
 
     @lockutils.synchronized('iptables', 'nova-', external=True)
@@ -460,12 +636,44 @@ class IptablesFirewallDriver(FirewallDriver):
         self.add_filters_for_instance(instance, ipv4_rules, ipv6_rules)
 
     def do_refresh_security_group_rules(self, security_group):
+        if CONF.iptables_shared_security_group_chains:
+            # NOTE: the instance chains only jump to the shared chain, so
+            # rebuilding it is enough. Groups no instance here uses have
+            # no chain to refresh.
+            if security_group in self.security_group_grantees:
+                self._refresh_security_group_chain(
+                    context.get_admin_context(), security_group)
+                self._purge_security_group_chains()
+            return
+
         for instance in self.instances.values():
             network_info = self.network_infos[instance['id']]
             ipv4_rules, ipv6_rules = self.instance_rules(instance,
                                                          network_info)
             self._inner_do_refresh_rules(instance, ipv4_rules, ipv6_rules)
 
+    def do_refresh_security_group_members(self, security_group):
+        """Rebuild the members chain of a security group.
+
+        The current members are read from the rules of a security group
+        granting access to this one, so the chains of those groups are
+        rebuilt too.
+
+        """
+        if security_group not in self.member_chains:
+            return
+        ctxt = context.get_admin_context()
+        refresh_members = set([security_group])
+        for security_group_id, grantee_ids in \
+                self.security_group_grantees.items():
+            if security_group in grantee_ids:
+                self._refresh_security_group_chain(ctxt, security_group_id,
+                                                   refresh_members)
+                grantee_ids = self.security_group_grantees[security_group_id]
+                if security_group in grantee_ids:
+                    refresh_members = ()
+        self._purge_security_group_chains()
+
     def do_refresh_instance_rules(self, instance):
         network_info = self.network_infos[instance['id']]
         ipv4_rules, ipv6_rules = self.instance_rules(instance, network_info)
@@ -23,11 +23,14 @@ Handling of VM disk images.
 
 import os
 import re
+import struct
+import time
 
 from oslo.config import cfg
 
 from nova import exception
 from nova.image import glance
+from nova.openstack.common import excutils
 from nova.openstack.common import log as logging
 from nova import utils
 
@@ -37,11 +40,31 @@ image_opts = [
     cfg.BoolOpt('force_raw_images',
                 default=True,
                 help='Force backing images to raw format'),
+    cfg.IntOpt('image_fetch_buffer_size',
+               default=4 * 1024 * 1024,
+               help='Number of bytes of a downloaded image gathered in '
+                    'memory before they are written to disk'),
+    cfg.BoolOpt('image_fetch_sparse',
+                default=True,
+                help='Leave holes in downloaded image files instead of '
+                     'writing the blocks which only contain zeros'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(image_opts)
 
+# Downloaded images are written in multiples of this many bytes, and
+# checked for blocks of zeros with this granularity
+WRITE_BLOCK_SIZE = 64 * 1024
+
+# Number of leading bytes of a downloaded image kept for format detection
+HEADER_SIZE = 512
+
+# Seconds between two progress reports of a download
+PROGRESS_INTERVAL = 10
+
+QCOW_MAGIC = 'QFI\xfb'
+
 
 class QemuImgInfo(object):
     BACKING_FILE_RE = re.compile((r"^(.*?)\s*\(actual\s+path\s*:"
@@ -190,7 +213,132 @@ def convert_image(source, dest, out_format, run_as_root=False):
     utils.execute(*cmd, run_as_root=run_as_root)
 
 
+def qemu_img_info_from_header(path, header):
+    """Return an object like the one of qemu_img_info for an image, from the
+    first bytes of the image, or None if they are not enough to tell its
+    format and backing file.
+    """
+    if not header or len(header) < 16 or header[:4] != QCOW_MAGIC:
+        return None
+
+    version, backing_file_offset = struct.unpack('>IQ', header[4:16])
+    if version not in (2, 3) or backing_file_offset:
+        # NOTE: qemu-img reports the backing file name
+        return None
+
+    data = QemuImgInfo()
+    data.image = path
+    data.file_format = 'qcow2'
+    return data
+
+
+class ImageFile(object):
+    """File object in which a downloaded image is written.
+
+    The data is gathered in memory and written in large blocks, blocks
+    which only contain zeros are skipped to leave holes in the file, and
+    the progress of the download is logged.
+    """
+
+    def __init__(self, path, image_href):
+        self.path = path
+        self.image_href = image_href
+        self.size = 0
+        self.header = ''
+        # NOTE: The file is only created when data comes, so that the image
+        # service can put the image in place at path by itself instead.
+        self._file = None
+        self._buffer = []
+        self._buffered = 0
+        self._start = self._last_report = time.time()
+        self._first_byte = None
+
+    def write(self, data):
+        if self._file is None:
+            self._first_byte = time.time()
+            self._file = open(self.path, 'wb')
+        if len(self.header) < HEADER_SIZE:
+            self.header += data[:HEADER_SIZE - len(self.header)]
+        self._buffer.append(data)
+        self._buffered += len(data)
+        self.size += len(data)
+        if self._buffered >= CONF.image_fetch_buffer_size:
+            self._flush()
+
+    def _flush(self, final=False):
+        data = ''.join(self._buffer)
+        length = len(data)
+        if not final:
+            # Keep the tail which does not fill a block for the next write
+            length -= length % WRITE_BLOCK_SIZE
+        self._buffer = [data[length:]]
+        self._buffered = len(data) - length
+
+        if not CONF.image_fetch_sparse:
+            self._file.write(data[:length])
+        else:
+            for offset in xrange(0, length, WRITE_BLOCK_SIZE):
+                block = data[offset:min(offset + WRITE_BLOCK_SIZE, length)]
+                if block.count('\0') == len(block):
+                    self._file.seek(len(block), os.SEEK_CUR)
+                else:
+                    self._file.write(block)
+
+        now = time.time()
+        if now - self._last_report >= PROGRESS_INTERVAL:
+            self._last_report = now
+            LOG.debug(_("Fetched %(size)d bytes of image %(image)s, "
+                        "%(rate).1f MB/s"),
+                      {'size': self.size, 'image': self.image_href,
+                       'rate': self._rate(now)})
+
+    def _rate(self, now):
+        return self.size / max(now - self._start, 0.001) / (1024 * 1024)
+
+    def abort(self):
+        """Closes the file after a failed download.
+
+        Errors are only logged, so that they do not hide the one which
+        made the download fail.
+        """
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        except (IOError, OSError) as e:
+            LOG.warn(_("Failed to close %(path)s after fetching image "
+                       "%(image)s failed: %(error)s"),
+                     {'path': self.path, 'image': self.image_href,
+                      'error': e})
+
+    def close(self):
+        if self._file is None:
+            if os.path.exists(self.path):
+                # The image service put the image in place by itself
+                self.size = os.path.getsize(self.path)
+                with open(self.path, 'rb') as f:
+                    self.header = f.read(HEADER_SIZE)
+                return
+            self._file = open(self.path, 'wb')
+        self._flush(final=True)
+        # The file ends with a hole if the image ends with zeros
+        self._file.truncate(self.size)
+        self._file.close()
+        now = time.time()
+        first_byte = (self._first_byte or now) - self._start
+        LOG.info(_("Fetched image %(image)s, %(size)d bytes in "
+                   "%(duration).1f seconds, %(rate).1f MB/s, first byte "
+                   "after %(first_byte).1f seconds"),
+                 {'image': self.image_href, 'size': self.size,
+                  'duration': now - self._start, 'rate': self._rate(now),
+                  'first_byte': first_byte})
+
+
 def fetch(context, image_href, path, _user_id, _project_id):
+    """Download an image to path.
+
+    Returns the first bytes of the image, for qemu_img_info_from_header.
+    """
     # TODO(vish): Improve context handling and add owner and auth data
     #             when it is added to glance.  Right now there is no
     #             auth checking in glance, so we assume that access was
@@ -198,16 +346,26 @@ def fetch(context, image_href, path, _user_id, _project_id):
     (image_service, image_id) = glance.get_remote_image_service(context,
                                                                 image_href)
     with utils.remove_path_on_error(path):
-        with open(path, "wb") as image_file:
-            image_service.download(context, image_id, image_file)
+        image_file = ImageFile(path, image_href)
+        try:
+            image_service.download(context, image_id, image_file,
+                                   dst_path=path)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                image_file.abort()
+        image_file.close()
+    return image_file.header
 
 
 def fetch_to_raw(context, image_href, path, user_id, project_id):
     path_tmp = "%s.part" % path
-    fetch(context, image_href, path_tmp, user_id, project_id)
+    header = fetch(context, image_href, path_tmp, user_id, project_id)
 
     with utils.remove_path_on_error(path_tmp):
-        data = qemu_img_info(path_tmp)
+        # NOTE: qemu-img info is only needed when the first bytes of the
+        # image are not enough to tell its format
+        data = (qemu_img_info_from_header(path_tmp, header) or
+                qemu_img_info(path_tmp))
 
         fmt = data.file_format
         if fmt is None:
@@ -210,6 +210,11 @@ libvirt_opts = [
                  default=[],
                  help='Specific cachemodes to use for different disk types '
                       'e.g: ["file=directsync","block=none"]'),
+    cfg.IntOpt('libvirt_domain_usage_cache_ttl',
+               default=10,
+               help='Number of seconds the vcpu, memory and disk usage '
+                    'gathered from all the domains is reused by the '
+                    'resource reports, 0 to gather it for every report'),
     ]
 
 CONF = cfg.CONF
@@ -318,6 +323,7 @@ class LibvirtDriver(driver.ComputeDriver):
 
         self._host_state = None
         self._event_queue = None
+        self._domain_usage = None
 
         self._disk_cachemode = None
         self.image_cache_manager = imagecache.ImageCacheManager()
@@ -681,6 +687,39 @@ class LibvirtDriver(driver.ComputeDriver):
         return [self._conn.lookupByName(name).UUIDString()
                 for name in self.list_instances()]
 
+    def _list_domains(self):
+        """Return the domain objects of all running and defined domains."""
+        # NOTE: listAllDomains needs libvirt 0.9.13 or newer
+        if hasattr(self._conn, 'listAllDomains'):
+            return self._conn.listAllDomains(0)
+
+        domains = []
+        for domain_id in self.list_instance_ids():
+            try:
+                domains.append(self._conn.lookupByID(domain_id))
+            except libvirt.libvirtError:
+                # Instance was deleted while listing... ignore it
+                pass
+        for name in self._conn.listDefinedDomains():
+            try:
+                domains.append(self._conn.lookupByName(name))
+            except libvirt.libvirtError:
+                pass
+        return domains
+
+    def get_power_states(self):
+        states = {}
+        for domain in self._list_domains():
+            try:
+                # We skip domains with ID 0 (hypervisors).
+                if domain.ID() == 0:
+                    continue
+                states[domain.name()] = LIBVIRT_POWER_STATE[domain.info()[0]]
+            except libvirt.libvirtError:
+                # Instance was deleted while listing... ignore it
+                pass
+        return states
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         for (network, mapping) in network_info:
@@ -2560,6 +2599,81 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return info
 
+    def _get_domain_usage(self):
+        """Get the resource usage of all the domains in a single sweep.
+
+        The domains are listed once, and each domain is asked once for
+        its vcpus and memory, and for its disks.  The result is reused
+        for libvirt_domain_usage_cache_ttl seconds.
+
+        :returns: dict with the vcpus_used, the memory_kb_used by the
+                  domains other than dom0, the dom0_memory_kb (None
+                  if there is no dom0), the disk_over_committed_size
+                  of the domains, the number of domains and the
+                  duration of the sweep in seconds.
+
+        """
+        start = time.time()
+        usage = self._domain_usage
+        if (usage is not None and
+                start - usage['collected_at'] <
+                CONF.libvirt_domain_usage_cache_ttl):
+            return usage
+
+        usage = {'vcpus_used': 0,
+                 'memory_kb_used': 0,
+                 'dom0_memory_kb': None,
+                 'disk_over_committed_size': 0,
+                 'domains': 0}
+        for dom in self._list_domains():
+            try:
+                self._add_domain_usage(usage, dom)
+            except libvirt.libvirtError as err:
+                if err.get_error_code() != libvirt.VIR_ERR_NO_DOMAIN:
+                    raise
+                # Instance was deleted while collecting... ignore it
+                LOG.debug(_("Domain vanished while gathering its resource "
+                            "usage: %s") % err)
+            # NOTE(gtt116): give change to do other task.
+            greenthread.sleep(0)
+
+        usage['collected_at'] = time.time()
+        usage['duration'] = usage['collected_at'] - start
+        LOG.debug(_("Gathered the resource usage of %(domains)d domains "
+                    "in %(duration).3f seconds") % usage)
+        self._domain_usage = usage
+        return usage
+
+    def _add_domain_usage(self, usage, dom):
+        dom_id = dom.ID()
+        usage['domains'] += 1
+        if dom_id != -1:
+            # NOTE: info() returns the state, max memory, memory,
+            #       number of vcpus and cpu time of the domain.
+            dom_info = dom.info()
+            usage['vcpus_used'] += dom_info[3]
+            if dom_id == 0:
+                usage['dom0_memory_kb'] = int(dom_info[2])
+            else:
+                usage['memory_kb_used'] += int(dom_info[2])
+
+        if dom_id == 0:
+            # We skip domains with ID 0 (hypervisors).
+            return
+        name = dom.name()
+        try:
+            disk_infos = jsonutils.loads(
+                    self.get_instance_disk_info(name, xml=dom.XMLDesc(0)))
+            for info in disk_infos:
+                usage['disk_over_committed_size'] += int(
+                    info['over_committed_disk_size'])
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                LOG.error(_("Getting disk size of %(name)s: %(e)s") %
+                          locals())
+            else:
+                raise
+
     def get_vcpu_used(self):
         """Get vcpu usage number of physical computer.
 
@@ -2571,27 +2685,7 @@ class LibvirtDriver(driver.ComputeDriver):
         if CONF.libvirt_type == 'lxc':
             return total + 1
 
-        dom_ids = self.list_instance_ids()
-        for dom_id in dom_ids:
-            try:
-                dom = self._conn.lookupByID(dom_id)
-                vcpus = dom.vcpus()
-                if vcpus is None:
-                    LOG.debug(_("couldn't obtain the vpu count from domain id:"
-                                " %s") % dom_id)
-                else:
-                    total += len(vcpus[1])
-            except libvirt.libvirtError as err:
-                if err.get_error_code() == libvirt.VIR_ERR_NO_DOMAIN:
-                    LOG.debug(_("List of domains returned by libVirt: %s")
-                              % dom_ids)
-                    LOG.warn(_("libVirt can't find a domain with id: %s")
-                             % dom_id)
-                    continue
-                raise
-            # NOTE(gtt116): give change to do other task.
-            greenthread.sleep(0)
-        return total
+        return self._get_domain_usage()['vcpus_used']
 
     def get_memory_mb_used(self):
         """Get the free memory size(MB) of physical computer.
@@ -2608,19 +2702,15 @@ class LibvirtDriver(driver.ComputeDriver):
         idx2 = m.index('Buffers:')
         idx3 = m.index('Cached:')
         if CONF.libvirt_type == 'xen':
-            used = 0
-            for domain_id in self.list_instance_ids():
-                # skip dom0
-                dom_mem = int(self._conn.lookupByID(domain_id).info()[2])
-                if domain_id != 0:
-                    used += dom_mem
-                else:
-                    # the mem reported by dom0 is be greater of what
-                    # it is being used
-                    used += (dom_mem -
-                             (int(m[idx1 + 1]) +
-                              int(m[idx2 + 1]) +
-                              int(m[idx3 + 1])))
+            usage = self._get_domain_usage()
+            used = usage['memory_kb_used']
+            if usage['dom0_memory_kb'] is not None:
+                # the mem reported by dom0 is be greater of what
+                # it is being used
+                used += (usage['dom0_memory_kb'] -
+                         (int(m[idx1 + 1]) +
+                          int(m[idx2 + 1]) +
+                          int(m[idx3 + 1])))
             # Convert it to MB
             return used / 1024
         else:
@@ -3395,27 +3485,7 @@ class LibvirtDriver(driver.ComputeDriver):
     def get_disk_over_committed_size_total(self):
         """Return total over committed disk size for all instances."""
         # Disk size that all instance uses : virtual_size - disk_size
-        instances_name = self.list_instances()
-        disk_over_committed_size = 0
-        for i_name in instances_name:
-            try:
-                disk_infos = jsonutils.loads(
-                        self.get_instance_disk_info(i_name))
-                for info in disk_infos:
-                    disk_over_committed_size += int(
-                        info['over_committed_disk_size'])
-            except OSError as e:
-                if e.errno == errno.ENOENT:
-                    LOG.error(_("Getting disk size of %(i_name)s: %(e)s") %
-                              locals())
-                else:
-                    raise
-            except exception.InstanceNotFound:
-                # Instance was deleted during the check so ignore it
-                pass
-            # NOTE(gtt116): give change to do other task.
-            greenthread.sleep(0)
-        return disk_over_committed_size
+        return self._get_domain_usage()['disk_over_committed_size']
 
     def unfilter_instance(self, instance_ref, network_info):
         """See comments of same method in firewall_driver."""
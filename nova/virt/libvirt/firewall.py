@@ -299,6 +299,7 @@ class IptablesFirewallDriver(base_firewall.IptablesFirewallDriver):
             # NOTE(vish): use the passed info instead of the stored info
             self.network_infos.pop(instance['id'])
             self.remove_filters_for_instance(instance)
+            self._forget_instance_security_groups(instance)
             self.iptables.apply()
             self.nwfilter.unfilter_instance(instance, network_info)
         else:
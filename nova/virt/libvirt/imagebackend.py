@@ -18,9 +18,15 @@
 import abc
 import contextlib
 import os
+import sys
+import time
 
+import eventlet
+from eventlet import event
+from eventlet import semaphore
 from oslo.config import cfg
 
+from nova import exception
 from nova.openstack.common import excutils
 from nova.openstack.common import fileutils
 from nova.openstack.common import lockutils
@@ -49,6 +55,15 @@ __imagebackend_opts = [
                default=1000,
                help='The amount of storage (in megabytes) to allocate for LVM'
                     ' snapshot copy-on-write blocks.'),
+    cfg.IntOpt('image_fetch_max_concurrent',
+               default=0,
+               help='Number of different images which can be downloaded at'
+                    ' the same time to the image cache. 0 means no limit.'),
+    cfg.IntOpt('image_fetch_wait_timeout',
+               default=0,
+               help='Number of seconds to wait for an image which is being'
+                    ' downloaded for another instance before failing. 0'
+                    ' means wait forever.'),
         ]
 
 CONF = cfg.CONF
@@ -59,6 +74,109 @@ CONF.import_opt('preallocate_images', 'nova.virt.driver')
 LOG = logging.getLogger(__name__)
 
 
+class _Fetch(object):
+    """A fetch of a base image in progress."""
+
+    def __init__(self, target):
+        self.target = target
+        self.done = event.Event()
+        self.waiters = 0
+
+    def progress(self):
+        """Returns the number of bytes fetched so far."""
+        for path in ('%s.part' % self.target, self.target):
+            try:
+                return os.path.getsize(path)
+            except OSError:
+                pass
+        return 0
+
+
+class ImageFetcher(object):
+    """Runs a single fetch of each base image at a time on this host.
+
+    Requests for a base image which is already being fetched wait for
+    that fetch instead of starting their own, report its progress while
+    they wait, and get its error if it fails.  Downloads of different
+    images are limited to image_fetch_max_concurrent at a time.
+    """
+
+    def __init__(self):
+        self._fetches = {}
+        self._slots = None
+
+    def _get_slots(self):
+        if self._slots is None and CONF.image_fetch_max_concurrent > 0:
+            self._slots = semaphore.Semaphore(
+                    CONF.image_fetch_max_concurrent)
+        return self._slots
+
+    def fetch(self, target, fetch_func, download, *args, **kwargs):
+        """Calls fetch_func(target=target, ...) unless a fetch of target
+        is already running, in which case waits for that one instead.
+
+        :download: Whether fetch_func downloads an image, and so has to
+                   wait for a download slot
+        """
+        fetch = self._fetches.get(target)
+        if fetch is not None:
+            return self._wait(fetch)
+
+        fetch = self._fetches[target] = _Fetch(target)
+        start = time.time()
+        try:
+            slots = download and self._get_slots()
+            if slots:
+                with slots:
+                    queued = time.time() - start
+                    fetch_func(target=target, *args, **kwargs)
+            else:
+                queued = 0
+                fetch_func(target=target, *args, **kwargs)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                fetch.done.send_exception(*sys.exc_info())
+        else:
+            fetch.done.send()
+        finally:
+            del self._fetches[target]
+
+        if download:
+            LOG.info(_("Fetched base image %(target)s in %(duration).1f "
+                       "seconds, %(queued).1f of them waiting for a "
+                       "download slot, for %(requests)d requests"),
+                     {'target': target, 'duration': time.time() - start,
+                      'queued': queued, 'requests': fetch.waiters + 1})
+
+    def _wait(self, fetch):
+        fetch.waiters += 1
+        LOG.info(_("Waiting for base image %s which is already being "
+                   "fetched"), fetch.target)
+        start = time.time()
+        while True:
+            interval = images.PROGRESS_INTERVAL
+            if CONF.image_fetch_wait_timeout > 0:
+                left = start + CONF.image_fetch_wait_timeout - time.time()
+                if left <= 0:
+                    raise exception.ImageFetchTimeout(
+                            target=fetch.target,
+                            timeout=CONF.image_fetch_wait_timeout)
+                interval = min(interval, left)
+
+            # NOTE: The error of a failed fetch is raised here as well
+            with eventlet.Timeout(interval, False):
+                return fetch.done.wait()
+
+            LOG.info(_("Still waiting for base image %(target)s after "
+                       "%(duration)d seconds, %(size)d bytes fetched"),
+                     {'target': fetch.target,
+                      'duration': time.time() - start,
+                      'size': fetch.progress()})
+
+
+_fetcher = ImageFetcher()
+
+
 class Image(object):
     __metaclass__ = abc.ABCMeta
 
@@ -131,7 +249,8 @@ class Image(object):
 
         Ensures that template and image not already exists.
         Ensures that base directory exists.
-        Synchronizes on template fetching.
+        Synchronizes on template fetching, and only fetches each template
+        once at a time on this host.
 
         :fetch_func: Function that creates the base image
                      Should accept `target` argument.
@@ -140,13 +259,19 @@ class Image(object):
         """
         @lockutils.synchronized(filename, 'nova-', external=True,
                                 lock_path=self.lock_path)
-        def call_if_not_exists(target, *args, **kwargs):
+        def fetch_if_not_exists(target, *args, **kwargs):
             if not os.path.exists(target):
                 fetch_func(target=target, *args, **kwargs)
             elif CONF.libvirt_images_type == "lvm" and \
                     'ephemeral_size' in kwargs:
                 fetch_func(target=target, *args, **kwargs)
 
+        def call_if_not_exists(target, *args, **kwargs):
+            # NOTE: Templates fetched from glance are given an image_id,
+            # the others are generated locally
+            _fetcher.fetch(target, fetch_if_not_exists,
+                           'image_id' in kwargs, *args, **kwargs)
+
         base_dir = os.path.join(CONF.instances_path, CONF.base_dir_name)
         if not os.path.exists(base_dir):
             fileutils.ensure_tree(base_dir)
@@ -74,6 +74,29 @@ imagecache_opts = [
     cfg.IntOpt('checksum_interval_seconds',
                default=3600,
                help='How frequently to checksum base images'),
+    cfg.IntOpt('checksum_pass_budget_mb',
+               default=0,
+               help='Maximum number of megabytes of base images read to '
+                    'compute checksums during each image cache manager '
+                    'pass, 0 for no limit. Files that do not fit are '
+                    'hashed over several passes'),
+    cfg.IntOpt('checksum_max_read_rate_mb',
+               default=0,
+               help='Maximum rate, in megabytes per second, at which base '
+                    'images are read to compute checksums, 0 for no limit'),
+    cfg.BoolOpt('checksum_skip_unchanged',
+                default=False,
+                help='Reuse the stored checksum of a base image without '
+                     'reading it again when its size and inode have not '
+                     'changed since it was computed. This saves most of '
+                     'the reads, but corruption of the file in place goes '
+                     'unnoticed until the next full read, see '
+                     'checksum_full_rehash_seconds'),
+    cfg.IntOpt('checksum_full_rehash_seconds',
+               default=(24 * 3600),
+               help='With checksum_skip_unchanged, the longest time a base '
+                    'image goes without being read in full to verify its '
+                    'checksum'),
     ]
 
 CONF = cfg.CONF
@@ -237,11 +260,29 @@ def write_stored_checksum(target):
     with open(target, 'r') as img_file:
         checksum = utils.hash_file(img_file)
     write_stored_info(target, field='sha1', value=checksum)
+    write_stored_info(target, field='sha1-fingerprint',
+                      value=get_file_fingerprint(target))
+
+
+def get_file_fingerprint(target):
+    """Return a string which changes when a file in _base is replaced or
+    changes size.
+
+    The modification time is not part of it, because the cache manager
+    touches the base files that are in use on every pass.
+    """
+    stat = os.stat(target)
+    return '%d:%d' % (stat.st_ino, stat.st_size)
 
 
 class ImageCacheManager(object):
+    # Number of bytes read at a time when checksumming a base image
+    checksum_chunk_size = 1024 * 1024
+
     def __init__(self):
         self.lock_path = os.path.join(CONF.instances_path, 'locks')
+        # Checksums which are partially computed, by base file
+        self.partial_checksums = {}
         self._reset_state()
 
     def _reset_state(self):
@@ -257,6 +298,10 @@ class ImageCacheManager(object):
         self.removable_base_files = []
         self.unexplained_images = []
 
+        self.checksum_budget = None
+        if CONF.checksum_pass_budget_mb > 0:
+            self.checksum_budget = CONF.checksum_pass_budget_mb * 1024 * 1024
+
     def _store_image(self, base_dir, ent, original=False):
         """Store a base image for later examination."""
         entpath = os.path.join(base_dir, ent)
@@ -384,6 +429,62 @@ class ImageCacheManager(object):
             if m:
                 yield img, False, True
 
+    def _hash_base_file(self, base_file):
+        """Compute the checksum of a base image, within the budget.
+
+        The part of the file which has been read is remembered, so that
+        the next passes carry on from there. Reads are paced to respect
+        checksum_max_read_rate_mb.
+
+        Returns the checksum (as hex), or None if the budget of this pass
+        was exhausted before the end of the file.
+        """
+        fingerprint = get_file_fingerprint(base_file)
+        partial = self.partial_checksums.pop(base_file, None)
+        if partial is None or partial['fingerprint'] != fingerprint:
+            partial = {'fingerprint': fingerprint,
+                       'offset': 0,
+                       'checksum': hashlib.sha1()}
+
+        read_rate = CONF.checksum_max_read_rate_mb * 1024 * 1024
+        with open(base_file, 'r') as f:
+            size = os.fstat(f.fileno()).st_size
+            f.seek(partial['offset'])
+            while True:
+                chunk_size = self.checksum_chunk_size
+                if (self.checksum_budget is not None and
+                    partial['offset'] < size):
+                    if self.checksum_budget <= 0:
+                        LOG.debug(_('Checksum of %(base_file)s paused at '
+                                    '%(offset)d bytes, the budget of this '
+                                    'pass is exhausted'),
+                                  {'base_file': base_file,
+                                   'offset': partial['offset']})
+                        self.partial_checksums[base_file] = partial
+                        return None
+                    chunk_size = min(chunk_size, self.checksum_budget)
+
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return partial['checksum'].hexdigest()
+
+                partial['checksum'].update(chunk)
+                partial['offset'] += len(chunk)
+                if self.checksum_budget is not None:
+                    self.checksum_budget -= len(chunk)
+
+                if read_rate > 0:
+                    time.sleep(float(len(chunk)) / read_rate)
+                else:
+                    # Give other threads a chance to run
+                    time.sleep(0)
+
+    def _write_checksum(self, base_file, checksum):
+        """Store a verified checksum along with the file fingerprint."""
+        write_stored_info(base_file, field='sha1', value=checksum)
+        write_stored_info(base_file, field='sha1-fingerprint',
+                          value=get_file_fingerprint(base_file))
+
     def _verify_checksum(self, img_id, base_file, create_if_missing=True):
         """Compare the checksum stored on disk with the current file.
 
@@ -419,8 +520,26 @@ class ImageCacheManager(object):
                     write_stored_info(base_file, field='sha1',
                                       value=stored_checksum)
 
-                with open(base_file, 'r') as f:
-                    current_checksum = utils.hash_file(f)
+                # NOTE: A file which has not been replaced or resized since
+                # it was last read in full keeps its checksum, without being
+                # read again until checksum_full_rehash_seconds have passed.
+                # The fingerprint is only stored after a full read, so its
+                # timestamp tells when that was.
+                if CONF.checksum_skip_unchanged:
+                    (fingerprint, hashed_at) = read_stored_info(
+                        base_file, field='sha1-fingerprint', timestamped=True)
+                    if (hashed_at and
+                        time.time() - hashed_at <
+                        CONF.checksum_full_rehash_seconds and
+                        fingerprint == get_file_fingerprint(base_file)):
+                        write_stored_info(base_file, field='sha1',
+                                          value=stored_checksum)
+                        return True
+
+                current_checksum = self._hash_base_file(base_file)
+                if current_checksum is None:
+                    # Verification carries on in the next passes
+                    return None
 
                 if current_checksum != stored_checksum:
                     LOG.error(_('image %(id)s at (%(base_file)s): image '
@@ -430,6 +549,7 @@ class ImageCacheManager(object):
                     return False
 
                 else:
+                    self._write_checksum(base_file, current_checksum)
                     return True
 
             else:
@@ -445,7 +565,9 @@ class ImageCacheManager(object):
                     LOG.info(_('%(id)s (%(base_file)s): generating checksum'),
                              {'id': img_id,
                               'base_file': base_file})
-                    write_stored_checksum(base_file)
+                    current_checksum = self._hash_base_file(base_file)
+                    if current_checksum is not None:
+                        self._write_checksum(base_file, current_checksum)
 
                 return None
 
@@ -475,6 +597,7 @@ class ImageCacheManager(object):
             LOG.info(_('Removing base file: %s'), base_file)
             try:
                 os.remove(base_file)
+                self.partial_checksums.pop(base_file, None)
                 signature = get_info_filename(base_file)
                 if os.path.exists(signature):
                     os.remove(signature)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark putting an image with a file direct_url in place.
+
+Writes an image of the given size in megabytes next to the destination,
+then times the copyfileobj loop used before against each of the
+image_file_transfer_methods.  Methods the filesystem does not support
+are reported as failed.  The page cache is not dropped between runs, so
+run it on images larger than memory to see the cost of cold reads.
+
+Usage: python tools/benchmarks/image_transfer.py [-d dir] [size_mb ...]
+"""
+
+import gettext
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from oslo.config import cfg
+
+from nova import config
+from nova.image import glance
+from nova import utils
+
+CONF = cfg.CONF
+METHODS = ['copyfileobj', 'hardlink', 'reflink', 'copy']
+
+
+def write_image(path, size_mb):
+    chunk = os.urandom(1024 * 1024)
+    with open(path, 'wb') as f:
+        for i in xrange(size_mb):
+            f.write(chunk)
+
+
+def copyfileobj(src, dst):
+    with open(src, 'rb') as f:
+        with open(dst, 'wb') as g:
+            shutil.copyfileobj(f, g)
+    return True
+
+
+def transfer(method, src, dst):
+    if method == 'copyfileobj':
+        return copyfileobj(src, dst)
+    CONF.set_override('image_file_transfer_methods', [method])
+    return glance._transfer_file(src, dst)
+
+
+def bench(tmpdir, size_mb):
+    src = os.path.join(tmpdir, 'image')
+    dst = os.path.join(tmpdir, 'instance')
+    write_image(src, size_mb)
+    results = []
+    for method in METHODS:
+        start = time.time()
+        done = transfer(method, src, dst)
+        results.append((method, time.time() - start, done))
+        utils.delete_if_exists(dst)
+    os.unlink(src)
+    return results
+
+
+def main(argv):
+    args = argv[1:]
+    tmpdir = None
+    if args[:1] == ['-d']:
+        tmpdir = args[1]
+        args = args[2:]
+    config.parse_args([argv[0]])
+    sizes = [int(arg) for arg in args] or [64, 1024]
+
+    tmpdir = tempfile.mkdtemp(dir=tmpdir)
+    try:
+        print '%8s %12s %10s %8s' % ('size MB', 'method', 'time (s)',
+                                     'MB/s')
+        for size_mb in sizes:
+            for method, elapsed, done in bench(tmpdir, size_mb):
+                if not done:
+                    print '%8d %12s %10s %8s' % (size_mb, method,
+                                                 'failed', '-')
+                    continue
+                print '%8d %12s %10.3f %8.0f' % (
+                    size_mb, method, elapsed, size_mb / max(elapsed, 1e-6))
+    finally:
+        shutil.rmtree(tmpdir)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the database side of listing the instances of a tenant.
+
+Creates a number of instances with metadata, system metadata and an info
+cache in one project, then times db.instance_get_all_by_filters the way
+the servers API detail and index views and a filtered listing call it.
+The schema is created and the instances are added when the database has
+none for the benchmark project.
+
+Usage: python tools/benchmarks/instance_list.py [connection [instances
+       [repeat]]]
+"""
+
+import gettext
+import os
+import sys
+import tempfile
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from oslo.config import cfg
+
+from nova import config
+from nova import context
+from nova import db
+from nova.db import migration
+
+CONF = cfg.CONF
+PROJECT_ID = 'list-benchmark'
+
+
+def create_instances(ctxt, count):
+    for i in xrange(count):
+        db.instance_create(ctxt, {
+            'project_id': PROJECT_ID,
+            'user_id': 'fake',
+            'display_name': 'server-%05d' % i,
+            'host': 'host%d' % (i % 100),
+            'vm_state': 'active',
+            'image_ref': 'fake-image',
+            'metadata': {'index': str(i), 'role': 'web'},
+            'system_metadata': {'instance_type_name': 'm1.small',
+                                'instance_type_memory_mb': '2048'}})
+
+
+def bench(ctxt, repeat, filters, **kwargs):
+    filters = dict(filters, project_id=PROJECT_ID, deleted=False)
+    start = time.time()
+    for i in xrange(repeat):
+        instances = db.instance_get_all_by_filters(ctxt, filters,
+                                                   'created_at', 'desc',
+                                                   **kwargs)
+    return (time.time() - start) / repeat, len(instances)
+
+
+def main(argv):
+    config.parse_args([argv[0]])
+    if len(argv) > 1:
+        connection = argv[1]
+    else:
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        connection = 'sqlite:///%s' % path
+    count = int(argv[2]) if len(argv) > 2 else 2000
+    repeat = int(argv[3]) if len(argv) > 3 else 5
+
+    CONF.set_override('sql_connection', connection)
+    migration.db_sync()
+
+    ctxt = context.get_admin_context()
+    if not db.instance_get_all_by_filters(ctxt, {'project_id': PROJECT_ID},
+                                          limit=1):
+        create_instances(ctxt, count)
+
+    cases = [
+        ('detail', {}, {}),
+        ('index', {}, {'columns_to_join': [],
+                       'columns': ['uuid', 'display_name']}),
+        ('detail, page of 100', {}, {'limit': 100}),
+        ('detail, host', {'host': 'host7'}, {}),
+        ('detail, name prefix', {'display_name': '^server-001'}, {}),
+        ('detail, name regex', {'display_name': 'server-001'}, {}),
+    ]
+    print '%-22s %10s %10s' % ('listing', 'instances', 'time (s)')
+    for name, filters, kwargs in cases:
+        elapsed, found = bench(ctxt, repeat, filters, **kwargs)
+        print '%-22s %10d %10.3f' % (name, found, elapsed)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
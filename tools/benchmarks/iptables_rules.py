@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark IptablesManager.apply with many rules.
+
+Fills the filter table with a chain per instance holding the given
+number of rules in total, then times a full apply, which saves, rebuilds
+and restores every table, and an incremental apply after one instance
+chain changed.  iptables itself is not run: iptables-save returns what
+the previous full restore wrote, so only nova's side is measured.
+
+Usage: python tools/benchmarks/iptables_rules.py [rules ...]
+"""
+
+import gettext
+import os
+import sys
+import tempfile
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from oslo.config import cfg
+
+from nova import config
+from nova.network import linux_net
+
+CONF = cfg.CONF
+RULES_PER_CHAIN = 50
+
+
+class FakeIptables(object):
+    def __init__(self):
+        self.saved = {}
+        self.restored_lines = 0
+
+    def execute(self, *cmd, **kwargs):
+        process_input = kwargs.get('process_input')
+        if cmd[0].endswith('-save'):
+            return self.saved.get(cmd[0][:-len('-save')], ''), ''
+        self.restored_lines += process_input.count('\n') + 1
+        if '--noflush' not in cmd:
+            self.saved[cmd[0][:-len('-restore')]] = process_input
+        return '', ''
+
+
+def build_manager(rules):
+    fake = FakeIptables()
+    manager = linux_net.IptablesManager(execute=fake.execute)
+    table = manager.ipv4['filter']
+    for i in xrange(rules / RULES_PER_CHAIN):
+        chain = 'inst-%d' % i
+        table.add_chain(chain)
+        table.add_rule('local', '-d 10.%d.%d.%d -j $%s' %
+                       (i >> 16, (i >> 8) & 255, i & 255, chain))
+        for j in xrange(RULES_PER_CHAIN - 1):
+            table.add_rule(chain, '-s 172.16.%d.%d -p tcp --dport %d '
+                           '-j ACCEPT' % (j >> 8, j & 255, 1000 + j))
+    return manager, fake
+
+
+def timed_apply(manager, fake):
+    fake.restored_lines = 0
+    start = time.time()
+    manager.apply()
+    return time.time() - start, fake.restored_lines
+
+
+def bench(rules):
+    manager, fake = build_manager(rules)
+    table = manager.ipv4['filter']
+    results = []
+
+    CONF.set_override('iptables_incremental_apply', False)
+    timed_apply(manager, fake)
+    table.add_rule('inst-0', '-s 192.168.0.1 -j ACCEPT')
+    results.append(('full',) + timed_apply(manager, fake))
+
+    CONF.set_override('iptables_incremental_apply', True)
+    timed_apply(manager, fake)
+    table.add_rule('inst-0', '-s 192.168.0.2 -j ACCEPT')
+    results.append(('incremental',) + timed_apply(manager, fake))
+    return results
+
+
+def main(argv):
+    config.parse_args([argv[0]])
+    CONF.set_override('lock_path', tempfile.mkdtemp())
+    CONF.set_override('use_ipv6', False)
+    sizes = [int(arg) for arg in argv[1:]] or [10000, 100000]
+
+    print '%10s %12s %10s %14s' % ('rules', 'apply', 'time (s)',
+                                   'lines restored')
+    for rules in sizes:
+        for name, elapsed, lines in bench(rules):
+            print '%10d %12s %10.3f %14d' % (rules, name, elapsed, lines)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark contention on the quota usages of a single project.
+
+Starts a number of threads that all reserve and commit instances, cores
+and ram for the same project, which is what a burst of boots in one
+tenant does, and reports the reservation throughput and the number of
+failed attempts.  SQLite serializes the writers on its database lock;
+pass a MySQL connection to measure the SELECT ... FOR UPDATE locking on
+the quota_usages rows instead.  The schema is created when the database
+is empty.
+
+Usage: python tools/benchmarks/quota_reserve.py [connection [threads
+       [iterations]]]
+"""
+
+import gettext
+import os
+import sys
+import tempfile
+import threading
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from oslo.config import cfg
+
+from nova import config
+from nova import context
+from nova import db
+from nova.db import migration
+from nova import exception
+from nova import quota
+
+CONF = cfg.CONF
+PROJECT_ID = 'quota-benchmark'
+DELTAS = {'instances': 1, 'cores': 2, 'ram': 2048}
+
+
+def setup_project(ctxt):
+    for resource in DELTAS:
+        try:
+            db.quota_update(ctxt, PROJECT_ID, resource, -1)
+        except exception.ProjectQuotaNotFound:
+            db.quota_create(ctxt, PROJECT_ID, resource, -1)
+
+
+def worker(ctxt, iterations, stats, lock):
+    done = failed = 0
+    for i in xrange(iterations):
+        try:
+            reservations = quota.QUOTAS.reserve(ctxt, project_id=PROJECT_ID,
+                                                **DELTAS)
+            quota.QUOTAS.commit(ctxt, reservations, project_id=PROJECT_ID)
+            done += 1
+        except Exception:
+            failed += 1
+    with lock:
+        stats['done'] += done
+        stats['failed'] += failed
+
+
+def bench(ctxt, threads, iterations):
+    stats = {'done': 0, 'failed': 0}
+    lock = threading.Lock()
+    workers = [threading.Thread(target=worker,
+                                args=(ctxt, iterations, stats, lock))
+               for i in xrange(threads)]
+    start = time.time()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.time() - start, stats
+
+
+def main(argv):
+    config.parse_args([argv[0]])
+    if len(argv) > 1:
+        connection = argv[1]
+    else:
+        fd, path = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        connection = 'sqlite:///%s' % path
+    threads = int(argv[2]) if len(argv) > 2 else 8
+    iterations = int(argv[3]) if len(argv) > 3 else 50
+
+    CONF.set_override('sql_connection', connection)
+    migration.db_sync()
+
+    ctxt = context.get_admin_context()
+    setup_project(ctxt)
+
+    elapsed, stats = bench(ctxt, threads, iterations)
+    usages = db.quota_usage_get_all_by_project(ctxt, PROJECT_ID)
+    print '%8s %10s %8s %8s %12s' % ('threads', 'reserved', 'failed',
+                                     'time (s)', 'reserves/s')
+    print '%8d %10d %8d %8.2f %12.1f' % (threads, stats['done'],
+                                         stats['failed'], elapsed,
+                                         stats['done'] / elapsed)
+    print 'in use: %s' % ', '.join('%s=%s' % (resource,
+                                             usages[resource]['in_use'])
+                                   for resource in sorted(DELTAS))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
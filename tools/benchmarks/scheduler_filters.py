@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# vim: tabstop=4 shiftwidth=4 softtabstop=4
+
+# Copyright (c) 2013 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the regular and the vectorized resource filters.
+
+Runs RamFilter, CoreFilter, DiskFilter, NumInstancesFilter, IoOpsFilter
+and the RAM weigher over synthetic host states, once through the regular
+filter handler and once through nova.scheduler.vectorized, and checks
+that both select the same hosts in the same order.
+
+Usage: python tools/benchmarks/scheduler_filters.py [num_hosts ...]
+"""
+
+import gettext
+import os
+import random
+import sys
+import time
+
+possible_topdir = os.path.normpath(os.path.join(os.path.abspath(__file__),
+                                                os.pardir, os.pardir,
+                                                os.pardir))
+if os.path.exists(os.path.join(possible_topdir, 'nova', '__init__.py')):
+    sys.path.insert(0, possible_topdir)
+
+gettext.install('nova', unicode=1)
+
+from nova import config
+from nova.scheduler import filters
+from nova.scheduler import host_manager
+from nova.scheduler import vectorized
+from nova.scheduler import weights
+
+FILTERS = ['nova.scheduler.filters.ram_filter.RamFilter',
+           'nova.scheduler.filters.core_filter.CoreFilter',
+           'nova.scheduler.filters.disk_filter.DiskFilter',
+           'nova.scheduler.filters.num_instances_filter.NumInstancesFilter',
+           'nova.scheduler.filters.io_ops_filter.IoOpsFilter']
+WEIGHERS = ['nova.scheduler.weights.ram.RAMWeigher']
+REPEAT = 5
+
+
+def make_host_states(count):
+    rand = random.Random(count)
+    host_states = []
+    for i in xrange(count):
+        host_state = host_manager.HostState('host%d' % i, 'node%d' % i)
+        total_ram_mb = rand.choice([32768, 65536, 131072])
+        host_state.total_usable_ram_mb = total_ram_mb
+        host_state.free_ram_mb = rand.randint(0, total_ram_mb)
+        host_state.total_usable_disk_gb = rand.choice([500, 1000, 2000])
+        host_state.free_disk_mb = rand.randint(
+                0, host_state.total_usable_disk_gb * 1024)
+        host_state.vcpus_total = rand.choice([8, 16, 32])
+        host_state.vcpus_used = rand.randint(0, 300)
+        host_state.num_instances = rand.randint(0, 60)
+        host_state.num_io_ops = rand.randint(0, 10)
+        host_states.append(host_state)
+    return host_states
+
+
+def run(host_states, use_vectorized):
+    filter_handler = filters.HostFilterHandler()
+    filter_classes = filter_handler.get_matching_classes(FILTERS)
+    weight_handler = weights.HostWeightHandler()
+    weigher_classes = weight_handler.get_matching_classes(WEIGHERS)
+    filter_properties = {'instance_type': {'memory_mb': 4096, 'vcpus': 2,
+                                           'root_gb': 40,
+                                           'ephemeral_gb': 0}}
+    if use_vectorized:
+        hosts = vectorized.get_filtered_hosts(filter_handler,
+                filter_classes, host_states, filter_properties)
+        return vectorized.get_weighed_hosts(weight_handler,
+                weigher_classes, hosts, filter_properties)
+    hosts = filter_handler.get_filtered_objects(filter_classes,
+            host_states, filter_properties)
+    return weight_handler.get_weighed_objects(weigher_classes, hosts,
+                                              filter_properties)
+
+
+def bench(host_states, use_vectorized):
+    best = None
+    for i in xrange(REPEAT):
+        start = time.time()
+        result = run(host_states, use_vectorized)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, [(w.obj.host, w.weight) for w in result]
+
+
+def main(argv):
+    config.parse_args([argv[0]])
+    if not vectorized.is_available():
+        print 'NumPy is not available, cannot run the vectorized filters.'
+        return 1
+    counts = [int(arg) for arg in argv[1:]] or [10000, 50000]
+    print '%10s %12s %12s %8s %8s' % ('hosts', 'regular (s)',
+                                      'vectorized (s)', 'speedup', 'passed')
+    for count in counts:
+        host_states = make_host_states(count)
+        regular, expected = bench(host_states, False)
+        fast, actual = bench(host_states, True)
+        if expected != actual:
+            print 'Results differ for %d hosts!' % count
+            return 1
+        print '%10d %12.4f %14.4f %8.1f %8d' % (count, regular, fast,
+                                                regular / fast, len(actual))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))